@@ -3,11 +3,12 @@
 Character Manager – хранение и изменение персонажей.
 """
 
-import json
 import os
 import uuid
 from datetime import datetime
 
+import json_codec
+
 
 class CharacterManager:
     """Управление данными персонажей."""
@@ -24,9 +25,8 @@ class CharacterManager:
             return []
 
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data.get(username, [])
+            data = json_codec.load_file(self.filename)
+            return data.get(username, [])
         except Exception:
             return []
 
@@ -39,8 +39,7 @@ class CharacterManager:
         # загрузить текущие данные
         if os.path.isfile(self.filename):
             try:
-                with open(self.filename, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                data = json_codec.load_file(self.filename)
             except Exception:
                 data = {}
         else:
@@ -58,8 +57,7 @@ class CharacterManager:
             data[username].append(character)
 
         try:
-            with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            json_codec.dump_file(data, self.filename)
             return True
         except Exception:
             return False
@@ -79,8 +77,7 @@ class CharacterManager:
             return False
 
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = json_codec.load_file(self.filename)
         except Exception:
             data = {}
 
@@ -89,8 +86,7 @@ class CharacterManager:
                 if char.get("id") == character_id:
                     data[username][i]["position"] = position
                     try:
-                        with open(self.filename, "w", encoding="utf-8") as f:
-                            json.dump(data, f, indent=2, ensure_ascii=False)
+                        json_codec.dump_file(data, self.filename)
                         return True
                     except Exception:
                         return False
@@ -126,8 +122,7 @@ class CharacterManager:
             return False
 
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = json_codec.load_file(self.filename)
 
             if username in data:
                 before = len(data[username])
@@ -135,8 +130,7 @@ class CharacterManager:
                     c for c in data[username] if c.get("id") != character_id
                 ]
                 if len(data[username]) != before:
-                    with open(self.filename, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
+                    json_codec.dump_file(data, self.filename)
                     return True
         except Exception:
             pass
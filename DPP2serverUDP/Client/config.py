@@ -49,6 +49,10 @@ class Config:
                 "udp_max_packet_size": 1400,
                 "udp_heartbeat_interval": 1.0,
                 "udp_position_update_rate": 0.016,
+                "interpolation_delay": 0.1,
+                "max_extrapolation": 1.0,
+                "movement_error_threshold": 0.1,
+                "movement_max_silence": 1.0,
             },
             "game": {
                 "movement_speed": 200.0,
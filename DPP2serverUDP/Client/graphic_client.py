@@ -17,6 +17,7 @@ from datetime import datetime
 #   Локальные модули
 # ----------------------------------------------------------------------
 from animated_character import AnimatedCharacter, CharacterSelector
+from snapshot_buffer import SnapshotBuffer
 
 
 # ----------------------------------------------------------------------
@@ -102,62 +103,17 @@ class Camera:
         self.target_zoom = 1.2
 
 
-# ----------------------------------------------------------------------
-#   Плавное интерполированное движение (для других игроков)
-# ----------------------------------------------------------------------
-class SmoothMovement:
-    def __init__(self):
-        self.position = {'x': 0, 'y': 0, 'z': 0}
-        self.target_position = {'x': 0, 'y': 0, 'z': 0}
-        self.velocity = {'x': 0, 'y': 0, 'z': 0}
-        self.last_update = time.time()
-        self.smooth_factor = 0.25
-        self.max_interpolation_time = 0.5
-
-    def update_target(self, new_position, timestamp=None):
-        """Устанавливаем новую цель и считаем «скорость»."""
-        self.target_position = new_position.copy()
-        self.last_update = time.time()
-
-        dx = new_position['x'] - self.position['x']
-        dy = new_position['y'] - self.position['y']
-        dz = new_position['z'] - self.position['z']
-
-        self.velocity['x'] = dx * 0.5 + self.velocity['x'] * 0.5
-        self.velocity['y'] = dy * 0.5 + self.velocity['y'] * 0.5
-        self.velocity['z'] = dz * 0.5 + self.velocity['z'] * 0.5
-
-    def update(self, delta_time: float):
-        """Интерполяция позиции."""
-        dx = self.target_position['x'] - self.position['x']
-        dy = self.target_position['y'] - self.position['y']
-        dz = self.target_position['z'] - self.position['z']
-
-        dx += self.velocity['x'] * 0.1
-        dy += self.velocity['y'] * 0.1
-        dz += self.velocity['z'] * 0.1
-
-        self.position['x'] += dx * self.smooth_factor * delta_time * 60
-        self.position['y'] += dy * self.smooth_factor * delta_time * 60
-        self.position['z'] += dz * self.smooth_factor * delta_time * 60
-
-        if abs(dx) < 0.001 and abs(dy) < 0.001 and abs(dz) < 0.001:
-            self.position = self.target_position.copy()
-            self.velocity = {'x': 0, 'y': 0, 'z': 0}
-
-
 # ----------------------------------------------------------------------
 #   Другой игрок (получаем данные по сети, интерполируем, анимируем)
 # ----------------------------------------------------------------------
 class OtherPlayer:
-    def __init__(self, player_data):
+    def __init__(self, player_data, interpolation_delay: float = 0.1, max_extrapolation: float = 1.0):
         self.id = player_data.get('id', '')
         self.name = player_data.get('name', 'Player')
         self.character_type = player_data.get('character_type', 'default')
-        self.smooth_movement = SmoothMovement()
+        self.snapshots = SnapshotBuffer(interpolation_delay, max_extrapolation=max_extrapolation)
         self.position = player_data.get('position', {'x': 0, 'y': 0, 'z': 0})
-        self.smooth_movement.position = self.position.copy()
-        self.smooth_movement.target_position = self.position.copy()
+        self.snapshots.reset(self.position)
 
         self.last_update_time = time.time()
         self.last_animation_update = time.time()
@@ -280,9 +236,9 @@ class OtherPlayer:
     # --------------------------------------------------------------
     #   Обновление позиции от сервера
     # --------------------------------------------------------------
-    def update_position(self, new_position, timestamp=None):
+    def update_position(self, new_position, timestamp=None, server_tick=None, velocity=None):
         self.position = new_position.copy()
-        self.smooth_movement.update_target(new_position, timestamp)
+        self.snapshots.add_snapshot(new_position, timestamp, server_tick, velocity)
         self.last_update_time = time.time()
 
     # --------------------------------------------------------------
@@ -292,9 +248,8 @@ class OtherPlayer:
         if not self.is_active:
             return
 
-        prev = self.smooth_movement.position.copy()
-        self.smooth_movement.update(delta_time)
-        cur = self.smooth_movement.position
+        prev = self.snapshots.position
+        cur = self.snapshots.update(delta_time)
 
         # определяем, двигается ли игрок
         dx = cur['x'] - prev['x']
@@ -325,7 +280,7 @@ class OtherPlayer:
             self.last_animation_update = now
 
     def get_position(self):
-        return self.smooth_movement.position
+        return self.snapshots.position
 
 
 # ----------------------------------------------------------------------
@@ -502,6 +457,13 @@ class DPP2GraphicClient:
         self.last_position_update = 0
         self.last_heartbeat = 0
         self.heartbeat_interval = self.config.get('network.udp_heartbeat_interval', 1.0)
+        self.interpolation_delay = self.config.get('network.interpolation_delay', 0.1)
+        self.max_extrapolation = self.config.get('network.max_extrapolation', 1.0)
+
+        # ---------- модель движения (dead reckoning) ----------
+        self.movement_error_threshold = self.config.get('network.movement_error_threshold', 0.1)
+        self.movement_max_silence = self.config.get('network.movement_max_silence', 1.0)
+        self.last_sent_movement = None  # (время, позиция, скорость, ввод)
 
         # ---------- статистика ----------
         self.stats = {
@@ -1113,8 +1075,12 @@ class DPP2GraphicClient:
     #   Движение собственного персонажа (WASD + Space/Shift)
     # --------------------------------------------------------------
     def update_player_position(self, delta_time: float):
-        if not (self.in_world and self.character and not self.chat_active
-                and not self.show_esc_menu and not self.show_settings_menu and not self.show_character_select):
+        if not (self.in_world and self.character):
+            return
+        if (self.chat_active or self.show_esc_menu or self.show_settings_menu
+                or self.show_character_select):
+            # ввод перехвачен чатом или меню – персонаж стоит, иначе другие его экстраполируют
+            self.send_stop_if_moving()
             return
 
         dx = dy = dz = 0
@@ -1139,8 +1105,8 @@ class DPP2GraphicClient:
             elif dx > 0:
                 self.player_animation.set_direction("right")
 
+        pos = self.character.get('position', {'x': 0, 'y': 0, 'z': 0})
         if dx != 0 or dy != 0 or dz != 0:
-            pos = self.character.get('position', {'x': 0, 'y': 0, 'z': 0})
             pos['x'] += dx
             pos['y'] += dy
             pos['z'] += dz
@@ -1150,10 +1116,51 @@ class DPP2GraphicClient:
             self.character['position'] = pos
             cm.save_character(self.character)
 
-            now = time.time()
-            if now - self.last_position_update >= self.position_update_rate:
-                self.send_position_update(pos)
-                self.last_position_update = now
+        # скорость в единицах/с и состояние ввода для экстраполяции на сервере
+        velocity = {'x': dx / delta_time, 'y': dy / delta_time, 'z': dz / delta_time} if delta_time > 0 \
+            else {'x': 0.0, 'y': 0.0, 'z': 0.0}
+        input_state = {'x': (dx > 0) - (dx < 0), 'y': (dy > 0) - (dy < 0), 'z': (dz > 0) - (dz < 0)}
+
+        now = time.time()
+        if (now - self.last_position_update >= self.position_update_rate
+                and self.should_send_movement(pos, velocity, input_state, now)):
+            self.send_position_update(pos, velocity, input_state)
+            self.last_position_update = now
+            self.last_sent_movement = (now, dict(pos), velocity, input_state)
+
+    def send_stop_if_moving(self):
+        """Один раз отправить остановку, если последнее отправленное движение не нулевое"""
+        if self.last_sent_movement is None:
+            return
+        stop_input = {'x': 0, 'y': 0, 'z': 0}
+        if self.last_sent_movement[3] == stop_input:
+            return
+
+        pos = self.character.get('position', {'x': 0, 'y': 0, 'z': 0})
+        velocity = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+        now = time.time()
+        self.send_position_update(pos, velocity, stop_input)
+        self.last_position_update = now
+        self.last_sent_movement = (now, dict(pos), velocity, stop_input)
+
+    def should_send_movement(self, pos, velocity, input_state, now):
+        """Отправлять ли позицию: смена ввода, ошибка экстраполяции или долгая пауза"""
+        if self.last_sent_movement is None:
+            return input_state != {'x': 0, 'y': 0, 'z': 0}
+
+        sent_time, sent_pos, sent_velocity, sent_input = self.last_sent_movement
+        if input_state != sent_input:
+            return True
+        if input_state == {'x': 0, 'y': 0, 'z': 0}:
+            return False  # стоим – сервер уже знает
+
+        if now - sent_time >= self.movement_max_silence:
+            return True
+
+        dt = now - sent_time
+        error = math.sqrt(sum((pos.get(axis, 0) - (sent_pos.get(axis, 0) + sent_velocity[axis] * dt)) ** 2
+                              for axis in ('x', 'y', 'z')))
+        return error > self.movement_error_threshold
 
     # --------------------------------------------------------------
     #   Чат (очистка, отправка, вывод)
@@ -1291,7 +1298,8 @@ class DPP2GraphicClient:
                     ctype = 'TwilightSparkle'
 
             if cid in self.other_players:
-                self.other_players[cid].update_position(pos)
+                self.other_players[cid].update_position(pos, data.get('timestamp'), data.get('server_tick'),
+                                                        data.get('velocity'))
                 self.other_players_data[cid]['position'] = pos
                 self.other_players_data[cid]['timestamp'] = time.time()
 
@@ -1306,7 +1314,9 @@ class DPP2GraphicClient:
                     'position': pos,
                     'timestamp': time.time()
                 }
-                self.other_players[cid] = OtherPlayer(pdata)
+                self.other_players[cid] = OtherPlayer(pdata, self.interpolation_delay, self.max_extrapolation)
+                self.other_players[cid].update_position(pos, data.get('timestamp'), data.get('server_tick'),
+                                                        data.get('velocity'))
                 self.other_players_data[cid] = pdata
                 print(f"[DEBUG] New player: {cname} ({ctype})")
 
@@ -1332,9 +1342,11 @@ class DPP2GraphicClient:
                 'name': pname,
                 'character_type': ctype,
                 'position': pos,
+                'skin_hash': data.get('skin_hash'),
                 'timestamp': time.time()
             }
-            self.other_players[pid] = OtherPlayer(pdata)
+            self.other_players[pid] = OtherPlayer(pdata, self.interpolation_delay, self.max_extrapolation)
+            self.other_players[pid].update_position(pos, data.get('timestamp'), data.get('server_tick'))
             self.other_players_data[pid] = pdata
             self.add_chat_message(f"[SYSTEM] {pname} joined as {ctype}")
             print(f"[DEBUG] Player joined: {pname} ({ctype})")
@@ -1353,6 +1365,12 @@ class DPP2GraphicClient:
             self.game_state = GameState.IN_GAME
             self.world_data = data.get('world_info', {})
 
+            # Равномерное движение сервер пересылает раз в max_silence - экстраполяция должна перекрывать паузу
+            max_silence = data.get('max_silence')
+            if isinstance(max_silence, (int, float)):
+                self.max_extrapolation = max(self.config.get('network.max_extrapolation', 1.0),
+                                             max_silence + self.interpolation_delay)
+
             self.other_players.clear()
             self.other_players_data.clear()
             for player in data.get('players', []):
@@ -1377,9 +1395,12 @@ class DPP2GraphicClient:
                     'name': pname,
                     'character_type': ctype,
                     'position': player.get('position', {'x': 0, 'y': 0, 'z': 0}),
+                    'skin_hash': player.get('skin_hash'),
                     'timestamp': time.time()
                 }
-                self.other_players[pid] = OtherPlayer(pdata)
+                self.other_players[pid] = OtherPlayer(pdata, self.interpolation_delay, self.max_extrapolation)
+                self.other_players[pid].update_position(pdata['position'], data.get('timestamp'),
+                                                        data.get('server_tick'), player.get('velocity'))
                 self.other_players_data[pid] = pdata
 
             self.add_chat_message("[SYSTEM] Entered game world (UDP)!")
@@ -2298,6 +2319,7 @@ class DPP2GraphicClient:
             'character_data': self.character,
             'timestamp': datetime.now().isoformat()
         }
+        self.last_sent_movement = None
         self.network.safe_send(data)
 
     def quit_game(self):
@@ -2340,7 +2362,7 @@ class DPP2GraphicClient:
     # ------------------------------------------------------------------
     #   Отправка позиции и чата
     # ------------------------------------------------------------------
-    def send_position_update(self, position):
+    def send_position_update(self, position, velocity=None, input_state=None):
         if not self.connected or not self.character:
             return
         data = {
@@ -2352,6 +2374,9 @@ class DPP2GraphicClient:
             'position': position,
             'timestamp': datetime.now().isoformat()
         }
+        if velocity is not None:
+            data['velocity'] = velocity
+            data['input'] = input_state
         self.stats['udp_packets_sent'] += 1
         self.network.safe_send(data)
 
@@ -0,0 +1,60 @@
+"""
+Кодек JSON для сети и файлов: orjson, если установлен, иначе стандартный json.
+Кодирование возвращает bytes (UTF-8), декодирование принимает bytes или str.
+
+Одинаковая копия лежит в Server/ и Client/ (проверяет Server/tests/test_shared_modules.py).
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # без orjson - стандартная библиотека
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# orjson.JSONDecodeError - подкласс json.JSONDecodeError, одного исключения хватает
+DecodeError = json.JSONDecodeError
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj, indent=False, sort_keys=False) -> bytes:
+        """Объект -> JSON в UTF-8"""
+        options = _OPTIONS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=options)
+
+    def loads(data):
+        """JSON (bytes или str) -> объект"""
+        return orjson.loads(data)
+
+else:
+    def dumps(obj, indent=False, sort_keys=False) -> bytes:
+        """Объект -> JSON в UTF-8"""
+        if indent:
+            text = json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys)
+        return text.encode('utf-8')
+
+    def loads(data):
+        """JSON (bytes или str) -> объект"""
+        return json.loads(data)
+
+
+def dump_file(obj, path, indent=True):
+    """Запись JSON в файл одним вызовом write"""
+    data = dumps(obj, indent=indent)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def load_file(path):
+    """Чтение JSON из файла"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -3,21 +3,28 @@
 Network client – простая UDP‑реализация.
 """
 
-import json
 import socket
 import time
 from datetime import datetime
 
+import json_codec
+from packet_codec import PacketEncoder, PacketReassembler
+from transport import UDPTransport
+
 
 class NetworkClient:
     """Клиент UDP‑соединения."""
 
-    def __init__(self, host: str = "147.185.221.27", port: int = 22153):
+    def __init__(self, host: str = "147.185.221.27", port: int = 22153, transport_factory=None):
         self.host = host
         self.port = port
-        self.socket: socket.socket | None = None
+        # Транспорт: UDP сокет или петля в памяти (transport.LoopbackNetwork.endpoint)
+        self.transport_factory = transport_factory or UDPTransport
+        self.transport = None
+        self.receive_timeout = 1.0
         self.connected = False
         self.client_id: str | None = None
+        self.session_token: str | None = None
 
         # Параметры надёжности (имитация)
         self.packet_counter = 0
@@ -25,6 +32,10 @@ class NetworkClient:
         self.packet_timeout = 2.0
         self.max_packet_size = 1400
 
+        # Сжатие и фрагментация больших сообщений
+        self.encoder = PacketEncoder(self.max_packet_size)
+        self.reassembler = PacketReassembler()
+
     # ------------------------------------------------------------------
     # Connection handling
     # ------------------------------------------------------------------
@@ -32,8 +43,7 @@ class NetworkClient:
         """Инициализировать UDP‑сокет."""
         try:
             print(f"🔄 Подключение к {self.host}:{self.port} через UDP…")
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.socket.settimeout(1.0)
+            self.transport = self.transport_factory()
 
             self.server_address = (self.host, self.port)
             self.connected = True
@@ -49,14 +59,14 @@ class NetworkClient:
 
     def is_connected(self) -> bool:
         """Проверить состояние соединения."""
-        return self.connected and self.socket is not None
+        return self.connected and self.transport is not None
 
     # ------------------------------------------------------------------
     # Sending data
     # ------------------------------------------------------------------
     def send(self, data: dict) -> bool:
         """Отправить JSON‑сообщение через UDP."""
-        if not self.is_connected() or not self.socket:
+        if not self.is_connected():
             print("⚠️ Нет подключения")
             return False
 
@@ -64,16 +74,20 @@ class NetworkClient:
             # Автоматически добавить client_id, packet_id и timestamp
             if self.client_id and "client_id" not in data:
                 data["client_id"] = self.client_id
+            if self.session_token:
+                data["session_token"] = self.session_token
             self.packet_counter += 1
             data["packet_id"] = self.packet_counter
             data["timestamp"] = datetime.now().isoformat()
 
-            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
-            if len(payload) > self.max_packet_size:
-                print(f"⚠️ Пакет слишком большой ({len(payload)} байт)")
-                payload = payload[:500] + b'..."}'
+            payload = json_codec.dumps(data)
+            packets = self.encoder.encode(payload)
+            if not packets:
+                print(f"⚠️ Сообщение слишком большое ({len(payload)} байт)")
+                return False
 
-            self.socket.sendto(payload, self.server_address)
+            for packet in packets:
+                self.transport.sendto(packet, self.server_address)
             self.last_packet_time = time.time()
 
             typ = data.get("type", "unknown")
@@ -106,25 +120,35 @@ class NetworkClient:
     # ------------------------------------------------------------------
     def receive(self) -> dict | None:
         """Получить и декодировать JSON‑сообщение."""
-        if not self.is_connected() or not self.socket:
+        if not self.is_connected():
             return None
 
         try:
-            data, addr = self.socket.recvfrom(4096)
+            packet = self.transport.recvfrom(4096, timeout=self.receive_timeout)
+            if packet is None:
+                return None
+            data, addr = packet
             if addr != self.server_address:
                 print(f"⚠️ Пакет от неизвестного адреса: {addr}")
                 return None
 
-            decoded = data.decode("utf-8", errors="ignore").strip()
-            if not decoded:
+            self.reassembler.cleanup()
+            payload = self.reassembler.feed(data, addr)
+            if payload is None:
+                return None
+
+            if not payload.strip():
                 return None
 
             try:
-                parsed = json.loads(decoded)
+                parsed = json_codec.loads(payload)
                 print(f"📥 UDP получено: {parsed.get('type', 'unknown')[:20]}…")
+                if parsed.get("type") == "welcome" and parsed.get("session_token"):
+                    # токен позволяет серверу узнать нас после смены адреса
+                    self.session_token = parsed["session_token"]
                 return parsed
-            except json.JSONDecodeError:
-                print(f"⚠️ Некорректный JSON в UDP: {decoded[:50]}…")
+            except json_codec.DecodeError:
+                print(f"⚠️ Некорректный JSON в UDP: {payload[:50]!r}…")
                 return None
         except socket.timeout:
             return None
@@ -170,7 +194,7 @@ class NetworkClient:
     # ------------------------------------------------------------------
     def disconnect(self) -> None:
         """Корректно закрыть UDP‑соединение."""
-        if self.socket:
+        if self.transport:
             try:
                 if self.connected:
                     exit_msg = {
@@ -182,7 +206,8 @@ class NetworkClient:
                     self.send(exit_msg)
                     time.sleep(0.1)
             finally:
-                self.socket.close()
+                self.transport.close()
         self.connected = False
-        self.socket = None
+        self.transport = None
+        self.session_token = None
         print("📡 UDP отключено")
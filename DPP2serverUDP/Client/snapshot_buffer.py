@@ -0,0 +1,88 @@
+"""
+Буфер снимков позиций других игроков: интерполяция с задержкой и экстраполяция по скорости
+"""
+
+import time
+from collections import deque
+
+
+class SnapshotBuffer:
+    """Снимки позиций с серверным временем; отрисовка с фиксированной задержкой."""
+
+    def __init__(self, interpolation_delay: float = 0.1, max_snapshots: int = 32,
+                 max_extrapolation: float = 1.0, clock=time.time):
+        self.clock = clock
+        self.position = {'x': 0, 'y': 0, 'z': 0}
+        self.snapshots = deque(maxlen=max_snapshots)  # (server_time, server_tick, position)
+        self.interpolation_delay = interpolation_delay
+        self.max_extrapolation = max_extrapolation
+        self.velocity = None  # скорость из последнего снимка
+        self.clock_offset = None  # локальное время − серверное
+        self.offset_drift = 0.02
+
+    def reset(self, position):
+        """Сбросить буфер на известную позицию."""
+        self.position = dict(position)
+        self.snapshots.clear()
+        self.velocity = None
+
+    def add_snapshot(self, new_position, server_time=None, server_tick=None, velocity=None):
+        """Добавить снимок; устаревшие (по тику сервера) отбрасываются."""
+        now = self.clock()
+        if not isinstance(server_time, (int, float)):
+            # старый сервер без серверного времени – время прихода
+            server_time = now - (self.clock_offset or 0.0)
+
+        if self.snapshots:
+            last_time, last_tick, _ = self.snapshots[-1]
+            if server_tick is not None and last_tick is not None and server_tick < last_tick:
+                return
+            if server_time <= last_time:
+                return
+
+        # смещение часов: минимум задержки, медленный дрейф вверх
+        sample = now - server_time
+        if self.clock_offset is None or sample < self.clock_offset:
+            self.clock_offset = sample
+        else:
+            self.clock_offset += (sample - self.clock_offset) * self.offset_drift
+
+        self.snapshots.append((server_time, server_tick, dict(new_position)))
+        self.velocity = velocity
+
+    def update(self, delta_time: float = 0.0):
+        """Позиция на момент «серверное время − задержка интерполяции»."""
+        if not self.snapshots:
+            return self.position
+
+        render_time = self.clock() - self.clock_offset - self.interpolation_delay
+
+        # убираем снимки, которые уже полностью позади
+        while len(self.snapshots) >= 2 and self.snapshots[1][0] <= render_time:
+            self.snapshots.popleft()
+
+        first_time, _, first = self.snapshots[0]
+        if len(self.snapshots) == 1 and render_time > first_time and self.velocity:
+            # новых снимков нет – продолжаем движение по последней скорости
+            dt = min(render_time - first_time, self.max_extrapolation)
+            self.position = {
+                **first,
+                'x': first.get('x', 0) + self.velocity.get('x', 0) * dt,
+                'y': first.get('y', 0) + self.velocity.get('y', 0) * dt,
+                'z': first.get('z', 0) + self.velocity.get('z', 0) * dt,
+            }
+            return self.position
+
+        if render_time <= first_time or len(self.snapshots) == 1:
+            self.position = dict(first)
+            return self.position
+
+        second_time, _, second = self.snapshots[1]
+        t = (render_time - first_time) / (second_time - first_time)
+        self.position = {
+            **second,
+            'x': first.get('x', 0) + (second.get('x', 0) - first.get('x', 0)) * t,
+            'y': first.get('y', 0) + (second.get('y', 0) - first.get('y', 0)) * t,
+            'z': first.get('z', 0) + (second.get('z', 0) - first.get('z', 0)) * t,
+        }
+        return self.position
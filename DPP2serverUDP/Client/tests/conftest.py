@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули клиента импортируются как в main.py - из каталога Client
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
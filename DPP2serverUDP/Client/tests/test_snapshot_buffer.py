@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from snapshot_buffer import SnapshotBuffer
+
+SERVER_CONFIG = os.path.join(os.path.dirname(__file__), '..', '..', 'Server', 'config.json')
+
+SPEED = 5.0  # единиц в секунду
+FRAME = 1 / 60
+LATENCY = 0.03
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def server_max_silence():
+    with open(SERVER_CONFIG, 'r', encoding='utf-8') as f:
+        return json.load(f)['game']['dead_reckoning']['max_silence']
+
+
+def walk(buffer, clock, send_interval, duration=10.0):
+    """Игрок идет по прямой, сервер пересылает его раз в send_interval; кадры по 1/60 с"""
+    positions = []
+    next_send = 0.0
+    elapsed = 0.0
+    while elapsed < duration:
+        if elapsed >= next_send:
+            # Снимок отправлен в момент next_send и пришел через LATENCY
+            clock.now = 1000.0 + next_send + LATENCY
+            buffer.add_snapshot({'x': SPEED * next_send, 'y': 0.0, 'z': 0.0},
+                                server_time=next_send, velocity={'x': SPEED, 'y': 0.0, 'z': 0.0})
+            next_send += send_interval
+        clock.now = 1000.0 + elapsed
+        positions.append(buffer.update()['x'])
+        elapsed += FRAME
+    return positions[30:]  # после первой полусекунды
+
+
+def assert_smooth(positions):
+    steps = [b - a for a, b in zip(positions, positions[1:])]
+    expected = SPEED * FRAME
+    assert min(steps) > expected * 0.5, "позиция замирает"
+    assert max(steps) < expected * 2.0, "позиция прыгает"
+
+
+def test_steady_walk_with_server_max_silence():
+    clock = FakeClock()
+    buffer = SnapshotBuffer(interpolation_delay=0.1, max_extrapolation=1.0, clock=clock)
+    assert_smooth(walk(buffer, clock, server_max_silence()))
+
+
+@pytest.mark.parametrize('max_silence', [0.5, 2.0, 3.0])
+def test_steady_walk_with_extrapolation_from_max_silence(max_silence):
+    # Так клиент выставляет max_extrapolation по max_silence из world_joined
+    clock = FakeClock()
+    buffer = SnapshotBuffer(interpolation_delay=0.1, max_extrapolation=max(1.0, max_silence + 0.1),
+                            clock=clock)
+    assert_smooth(walk(buffer, clock, max_silence))
+
+
+def test_steady_walk_freezes_when_silence_exceeds_extrapolation():
+    clock = FakeClock()
+    buffer = SnapshotBuffer(interpolation_delay=0.1, max_extrapolation=1.0, clock=clock)
+    with pytest.raises(AssertionError):
+        assert_smooth(walk(buffer, clock, 2.0))
@@ -0,0 +1,56 @@
+"""
+Пул потоков для медленных операций с аккаунтами (регистрация, вход, аутентификация)
+"""
+
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AccountWorkerPool:
+    """Выполняет работу с базой вне тика; результаты забирает поток тика через drain()"""
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='account')
+        self.completed = queue.Queue()
+        self.in_flight = 0  # меняется только в потоке тика
+
+    def submit(self, client_id, msg_type, message, payload, work):
+        """Запуск work(payload) в пуле; message - исходное сообщение для статистики"""
+        self.in_flight += 1
+        self.executor.submit(self._run, client_id, msg_type, message, payload, work)
+
+    def _run(self, client_id, msg_type, message, payload, work):
+        started = time.perf_counter()
+        try:
+            result, error = work(payload), None
+        except Exception as e:
+            result, error = None, e
+        self.completed.put((client_id, msg_type, message, payload, result, error,
+                            time.perf_counter() - started))
+
+    def drain(self):
+        """Завершенные операции: (client_id, тип, сообщение, нагрузка, результат, ошибка, длительность)"""
+        completions = []
+        while True:
+            try:
+                completions.append(self.completed.get_nowait())
+            except queue.Empty:
+                break
+        self.in_flight -= len(completions)
+        return completions
+
+    def wait_idle(self, timeout=5.0):
+        """Ожидание завершения всех операций (при остановке сервера)"""
+        completions = []
+        deadline = time.time() + timeout
+        while self.in_flight > 0 and time.time() < deadline:
+            try:
+                completions.append(self.completed.get(timeout=0.1))
+                self.in_flight -= 1
+            except queue.Empty:
+                pass
+        return completions
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
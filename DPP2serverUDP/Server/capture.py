@@ -0,0 +1,63 @@
+"""
+Запись входящих сообщений UDP сервера в файл для последующего воспроизведения.
+
+Формат: gzip, JSON по строке на запись.
+  Первая строка - заголовок: {"capture": 1, "started": <time.time()>}
+  Далее записи: [<секунды от начала записи>, <сообщение>]
+"""
+
+import gzip
+import threading
+import time
+
+import json_codec
+
+CAPTURE_VERSION = 1
+
+
+class CaptureWriter:
+    """Потокобезопасная запись сообщений в сжатый файл"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.count = 0
+        self.file = gzip.open(path, 'wb')
+        self._write_line({'capture': CAPTURE_VERSION, 'started': self.started})
+
+    def _write_line(self, record):
+        self.file.write(json_codec.dumps(record) + b'\n')
+
+    def write(self, message, received_at=None):
+        """Запись одного сообщения с временем приема"""
+        received_at = received_at if received_at is not None else time.time()
+        with self.lock:
+            if self.file is None:
+                return
+            self._write_line([round(received_at - self.started, 6), message])
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_capture(path):
+    """Заголовок и итератор записей (время от начала, сообщение)"""
+    file = gzip.open(path, 'rb')
+    header = json_codec.loads(file.readline())
+    if header.get('capture') != CAPTURE_VERSION:
+        file.close()
+        raise ValueError(f"Неподдерживаемый формат записи: {header.get('capture')}")
+
+    def records():
+        with file:
+            for line in file:
+                if line.strip():
+                    offset, message = json_codec.loads(line)
+                    yield offset, message
+
+    return header, records()
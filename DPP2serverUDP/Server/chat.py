@@ -0,0 +1,59 @@
+"""
+Каналы чата с подписчиками
+"""
+
+GLOBAL_CHANNEL = 'global'
+ZONE_PREFIX = 'zone:'
+PARTY_PREFIX = 'party:'
+
+
+class ChatChannels:
+    """Подписки клиентов на каналы чата"""
+
+    def __init__(self):
+        self.channels = {}  # канал -> set(client_id)
+        self.client_channels = {}  # client_id -> set(канал)
+        self.client_zones = {}  # client_id -> канал зоны
+
+    def subscribe(self, client_id, channel):
+        self.channels.setdefault(channel, set()).add(client_id)
+        self.client_channels.setdefault(client_id, set()).add(channel)
+
+    def unsubscribe(self, client_id, channel):
+        members = self.channels.get(channel)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.channels[channel]
+        channels = self.client_channels.get(client_id)
+        if channels is not None:
+            channels.discard(channel)
+
+    def members(self, channel):
+        return self.channels.get(channel, ())
+
+    def is_member(self, client_id, channel):
+        return client_id in self.channels.get(channel, ())
+
+    def move(self, client_id, map_name):
+        """Карта игрока: подписка на канал зоны"""
+        zone_channel = ZONE_PREFIX + map_name
+        old_channel = self.client_zones.get(client_id)
+        if old_channel != zone_channel:
+            if old_channel:
+                self.unsubscribe(client_id, old_channel)
+            self.subscribe(client_id, zone_channel)
+            self.client_zones[client_id] = zone_channel
+
+    def zone_channel(self, client_id):
+        return self.client_zones.get(client_id)
+
+    def remove_client(self, client_id):
+        """Отписка от всех каналов"""
+        for channel in list(self.client_channels.pop(client_id, ())):
+            members = self.channels.get(channel)
+            if members is not None:
+                members.discard(client_id)
+                if not members:
+                    del self.channels[channel]
+        self.client_zones.pop(client_id, None)
@@ -64,6 +64,10 @@ class PlayerSkinManager:
             'end_time': time.time() + effect_data.get('duration', 5)
         }
 
+    def remove_effect(self, effect_id):
+        """Удаление эффекта по сообщению сервера"""
+        return self.active_effects.pop(effect_id, None) is not None
+
     def remove_expired_effects(self):
         """Удаление истекших эффектов"""
         current_time = time.time()
@@ -844,6 +848,9 @@ class UDPTestClient:
         elif msg_type == 'effect_spawn':
             self.handle_effect_spawn(message)
 
+        elif msg_type == 'effect_expired':
+            self.skin_manager.remove_effect(message.get('effect_id'))
+
         elif msg_type == 'world_update':
             self.handle_world_update(message)
 
@@ -937,8 +944,8 @@ class UDPTestClient:
         character_name = response.get('character_name')
         effect_type = effect_data.get('gifct_name', 'default')
 
-        # Создаем уникальный ID для эффекта
-        effect_id = f"{effect_data.get('character_id', 'unknown')}_{int(time.time() * 1000)}"
+        # ID эффекта назначает сервер; он же сообщает об истечении (effect_expired)
+        effect_id = response.get('effect_id') or effect_data.get('id')
 
         self.skin_manager.add_effect(effect_id, effect_data)
         print(f"[CLIENT] ✨ {character_name} использует {effect_type}")
@@ -0,0 +1,21 @@
+"""
+Общие средства многопоточности сервера: проверка GIL и блокировка методов
+"""
+
+import functools
+import sys
+
+
+def gil_enabled():
+    """False на free-threaded сборке CPython (python3.13t), когда GIL выключен"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+def locked(method):
+    """Метод под блокировкой self.lock (вызовы из тика, GUI и пула аккаунтов)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -1,21 +1,29 @@
-import json
 import threading
 import time
 from datetime import datetime
 from pathlib import Path
+
+from concurrency import locked
+import json_codec
+from db_loader import stream_database
 import uuid
 import hashlib
 
 
 class Database:
-    def __init__(self, db_path='game_server_db.json'):
+    def __init__(self, db_path='game_server_db.json', metrics=None):
         self.db_path = db_path
-        self.save_lock = threading.Lock()
+        self.metrics = metrics
+        self.lock = threading.RLock()  # данные и файл
         self.save_interval = 30
         self.last_save = time.time()
+        self.dirty = False  # изменения в памяти, которые сохранит автосохранение
 
         # Инициализация структуры данных
         self.data = self._init_data_structure()
+        # Индексы поиска по имени в нижнем регистре, строятся при загрузке
+        self.player_names = {}  # username -> player_id
+        self.character_names = {}  # имя персонажа -> character_id
         self.load()
 
         # Автосохранение
@@ -65,34 +73,91 @@ class Database:
         }
 
     def load(self):
-        """Загрузка данных из файла"""
+        """Потоковая загрузка данных из файла: записи по одной, индексы строятся сразу"""
+        if not Path(self.db_path).exists():
+            return
+
+        started = time.perf_counter()
+        self.load_progress_step = 0
+        data = self._init_data_structure()
         try:
-            if Path(self.db_path).exists():
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    loaded_data = json.load(f)
-                    self._merge_data(loaded_data)
-                print(f"[DATABASE] UDP Данные загружены из {self.db_path}")
+            for section, key, value in stream_database(self.db_path, progress=self._report_load_progress):
+                if section not in data:
+                    continue
+                if key is not None:
+                    # Запись игрока или персонажа
+                    data[section][key] = value
+                    if section == 'players':
+                        self._index_name(self.player_names, value.get('username'), key)
+                    elif section == 'characters':
+                        self._index_name(self.character_names, value.get('name'), key)
+                elif isinstance(data[section], dict) and isinstance(value, dict):
+                    data[section].update(value)  # поверх значений по умолчанию
+                else:
+                    data[section] = value
         except Exception as e:
             print(f"[DATABASE] Ошибка загрузки: {e}")
-
-    def _merge_data(self, loaded_data):
-        """Объединение загруженных данных с дефолтными"""
-        for key in self.data:
-            if key in loaded_data:
-                if isinstance(self.data[key], dict):
-                    self.data[key].update(loaded_data[key])
-                else:
-                    self.data[key] = loaded_data[key]
+            self.player_names.clear()
+            self.character_names.clear()
+            return
+
+        self.data = data
+        duration = time.perf_counter() - started
+        if self.metrics:
+            self.metrics.observe('db_load_duration_seconds', duration)
+        print(f"[DATABASE] UDP Данные загружены из {self.db_path}: игроков {len(data['players'])}, "
+              f"персонажей {len(data['characters'])} за {duration:.2f} с")
+
+    def _report_load_progress(self, bytes_read, total_bytes):
+        """Ход загрузки каждые 10% (файлы меньше одного блока читаются сразу)"""
+        if not total_bytes or bytes_read >= total_bytes:
+            return
+        step = bytes_read * 10 // total_bytes
+        if step > self.load_progress_step:
+            self.load_progress_step = step
+            print(f"[DATABASE] Загрузка {self.db_path}: {step * 10}% "
+                  f"({bytes_read / 1048576:.1f} из {total_bytes / 1048576:.1f} МБ)")
+
+    # === ИНДЕКСЫ ===
+    @staticmethod
+    def _index_name(index, name, record_id):
+        """Добавление имени в индекс; при совпадении имен остается первая запись, как при переборе"""
+        if isinstance(name, str):
+            index.setdefault(name.lower(), record_id)
+
+    @staticmethod
+    def _unindex_name(index, records, field, name, record_id):
+        """Удаление имени из индекса; индекс переходит к другой записи с тем же именем, если она есть"""
+        if not isinstance(name, str) or index.get(name.lower()) != record_id:
+            return
+        key = name.lower()
+        del index[key]
+        for other_id, record in records.items():
+            other_name = record.get(field)
+            if other_id != record_id and isinstance(other_name, str) and other_name.lower() == key:
+                index[key] = other_id
+                break
 
     def save(self):
         """Сохранение данных в файл"""
-        with self.save_lock:
+        with self.lock:
             try:
-                with open(self.db_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.data, f, indent=2, ensure_ascii=False)
+                started = time.perf_counter()
+                self.dirty = False
+                json_codec.dump_file(self.data, self.db_path)
                 self.last_save = time.time()
+
+                if self.metrics:
+                    self.metrics.observe('db_flush_duration_seconds', time.perf_counter() - started)
             except Exception as e:
                 print(f"[DATABASE] Ошибка сохранения: {e}")
+                if self.metrics:
+                    self.metrics.inc('db_flush_errors_total')
+
+    def flush(self):
+        """Сохранение, если есть несохраненные изменения"""
+        if self.dirty:
+            self.save()
 
     def autosave(self):
         """Автоматическое сохранение"""
@@ -102,6 +167,7 @@ class Database:
                 self.save()
 
     # === ИГРОКИ ===
+    @locked
     def register_player(self, username, password, email=None):
         """Регистрация нового игрока"""
         # Проверка уникальности имени
@@ -112,15 +178,16 @@ class Database:
         player_data = self._create_player_data(player_id, username, password, email)
 
         self.data['players'][player_id] = player_data
+        self._index_name(self.player_names, username, player_id)
         self.data['server_stats']['total_players'] += 1
-        self.save()
+        # Из пула аккаунтов: полная запись файла под блокировкой задержала бы тик
+        self.dirty = True
 
         return player_id, player_data
 
     def _username_exists(self, username):
         """Проверка существования имени пользователя"""
-        return any(p['username'].lower() == username.lower()
-                   for p in self.data['players'].values())
+        return username.lower() in self.player_names
 
     def _create_player_data(self, player_id, username, password, email):
         """Создание данных игрока"""
@@ -141,40 +208,50 @@ class Database:
             }
         }
 
+    @locked
     def authenticate_player(self, username, password):
         """Аутентификация игрока"""
         password_hash = hashlib.sha256(password.encode()).hexdigest()
 
-        for player_id, player in self.data['players'].items():
-            if player['username'].lower() == username.lower():
-                if player['password_hash'] == password_hash:
-                    player['last_login'] = datetime.now().isoformat()
-                    self.save()
-                    return player_id, player
-                else:
-                    return None, "Неверный пароль"
+        player_id = self.player_names.get(username.lower())
+        player = self.data['players'].get(player_id)
+        if player is None:
+            return None, "Пользователь не найден"
+
+        if player['password_hash'] != password_hash:
+            return None, "Неверный пароль"
 
-        return None, "Пользователь не найден"
+        player['last_login'] = datetime.now().isoformat()
+        self.dirty = True  # сохранит автосохранение
+        return player_id, player
 
     def get_player(self, player_id):
         """Получение данных игрока"""
         return self.data['players'].get(player_id)
 
+    @locked
     def update_player(self, player_id, updates):
         """Обновление данных игрока"""
         if player_id in self.data['players']:
-            self.data['players'][player_id].update(updates)
+            player = self.data['players'][player_id]
+            if 'username' in updates and updates['username'] != player.get('username'):
+                self._unindex_name(self.player_names, self.data['players'], 'username',
+                                   player.get('username'), player_id)
+                self._index_name(self.player_names, updates['username'], player_id)
+            player.update(updates)
             self.save()
             return True
         return False
 
     # === ПЕРСОНАЖИ ===
+    @locked
     def create_character(self, player_id, character_data):
         """Создание нового персонажа"""
         character_id = str(uuid.uuid4())
         character = self._create_character_data(character_id, player_id, character_data)
 
         self.data['characters'][character_id] = character
+        self._index_name(self.character_names, character['name'], character_id)
         self._add_character_to_player(player_id, character_id)
         self.data['server_stats']['total_characters'] += 1
         self.save()
@@ -264,6 +341,7 @@ class Database:
         """Получение данных персонажа"""
         return self.data['characters'].get(character_id)
 
+    @locked
     def get_player_characters(self, player_id):
         """Получение всех персонажей игрока"""
         if player_id not in self.data['players']:
@@ -275,25 +353,46 @@ class Database:
 
     def update_character(self, character_id, updates):
         """Обновление данных персонажа"""
-        if character_id in self.data['characters']:
-            character = self.data['characters'][character_id]
+        if self._apply_character_updates(character_id, updates):
+            self.save()
+            return True
+        return False
 
-            # Обновление общего времени игры
-            if 'playtime' in updates:
-                old_playtime = character.get('playtime', 0)
-                self.data['server_stats']['total_playtime'] += (updates['playtime'] - old_playtime)
+    @locked
+    def update_characters(self, batch):
+        """Обновление нескольких персонажей одним сохранением: {character_id: updates}"""
+        updated = sum(1 for character_id, updates in batch.items()
+                      if self._apply_character_updates(character_id, updates))
+        if updated:
+            self.save()
+        return updated
 
-            character.update(updates)
-            character['last_played'] = datetime.now().isoformat()
+    @locked
+    def _apply_character_updates(self, character_id, updates):
+        """Изменение персонажа в памяти без сохранения"""
+        if character_id not in self.data['characters']:
+            return False
+        character = self.data['characters'][character_id]
 
-            # Для UDP обновляем время активности
-            if 'position' in updates or 'last_activity' not in updates:
-                character['last_activity'] = datetime.now().isoformat()
+        # Обновление общего времени игры
+        if 'playtime' in updates:
+            old_playtime = character.get('playtime', 0)
+            self.data['server_stats']['total_playtime'] += (updates['playtime'] - old_playtime)
 
-            self.save()
-            return True
-        return False
+        if 'name' in updates and updates['name'] != character.get('name'):
+            self._unindex_name(self.character_names, self.data['characters'], 'name',
+                               character.get('name'), character_id)
+            self._index_name(self.character_names, updates['name'], character_id)
+
+        character.update(updates)
+        character['last_played'] = datetime.now().isoformat()
 
+        # Время активности - текущее, если вызывающий не передал свое (время последнего пакета)
+        if 'last_activity' not in updates:
+            character['last_activity'] = datetime.now().isoformat()
+        return True
+
+    @locked
     def delete_character(self, character_id):
         """Удаление персонажа"""
         if character_id in self.data['characters']:
@@ -308,12 +407,15 @@ class Database:
 
             # Удаляем персонажа
             del self.data['characters'][character_id]
+            self._unindex_name(self.character_names, self.data['characters'], 'name',
+                               character.get('name'), character_id)
             self.data['server_stats']['total_characters'] -= 1
             self.save()
             return True
         return False
 
     # === GIFCT НАСТРОЙКИ ===
+    @locked
     def get_gifct_settings(self):
         """Получение текущих настроек Gifct"""
         if 'gifct_settings' not in self.data:
@@ -321,6 +423,7 @@ class Database:
             self.save()
         return self.data['gifct_settings']
 
+    @locked
     def update_gifct_settings(self, gifct_enabled=None, gifct_configs=None):
         """Обновление настроек Gifct"""
         if 'gifct_settings' not in self.data:
@@ -350,6 +453,7 @@ class Database:
         """Получение данных мира"""
         return self.data['world_data']
 
+    @locked
     def update_world_data(self, updates):
         """Обновление данных мира"""
         self.data['world_data'].update(updates)
@@ -360,28 +464,26 @@ class Database:
         """Получение статистики сервера"""
         return self.data['server_stats']
 
+    @locked
     def increment_online_players(self):
         """Увеличение счетчика онлайн игроков"""
         self.data['world_data']['online_players'] += 1
-        self.save()
+        self.dirty = True  # сохранит автосохранение
 
+    @locked
     def decrement_online_players(self):
         """Уменьшение счетчика онлайн игроков"""
         if self.data['world_data']['online_players'] > 0:
             self.data['world_data']['online_players'] -= 1
-            self.save()
+            self.dirty = True  # сохранит автосохранение
 
     # === ПОИСК ===
+    @locked
     def find_character_by_name(self, character_name):
         """Поиск персонажа по имени"""
-        for character in self.data['characters'].values():
-            if character['name'].lower() == character_name.lower():
-                return character
-        return None
+        return self.data['characters'].get(self.character_names.get(character_name.lower()))
 
+    @locked
     def find_player_by_username(self, username):
         """Поиск игрока по имени пользователя"""
-        for player in self.data['players'].values():
-            if player['username'].lower() == username.lower():
-                return player
-        return None
\ No newline at end of file
+        return self.data['players'].get(self.player_names.get(username.lower()))
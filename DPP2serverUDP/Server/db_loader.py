@@ -0,0 +1,157 @@
+"""
+Потоковая загрузка файла базы данных: файл читается блоками, разделы с записями
+(игроки, персонажи) выдаются по записям. Весь текст файла и полная копия данных
+в памяти не держатся - пик памяти близок к размеру загруженных данных.
+
+Каждая запись разбирается стандартным JSONDecoder.raw_decode с позиции в буфере;
+если значение не поместилось в прочитанный блок, дочитывается следующий блок.
+Разметка файла (отступы, переводы строк) не важна.
+"""
+
+import codecs
+import json
+import os
+import re
+
+CHUNK_SIZE = 1 << 20  # байт за одно чтение
+
+# Разделы-словари, которые выдаются по записям
+RECORD_SECTIONS = ('players', 'characters')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Ключ члена объекта с двоеточием и пробелами вокруг
+_MEMBER_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*')
+# Символы, которыми может продолжаться число
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+class StreamReader:
+    """Разбор JSON из файла блоками"""
+
+    def __init__(self, f, total_bytes=0, chunk_size=CHUNK_SIZE, progress=None):
+        self.file = f
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self.progress = progress
+        # Одинаковые ключи всех записей - один объект строки (как при разборе файла целиком)
+        self.keys = {}
+        self.decoder = json.JSONDecoder(object_pairs_hook=self._make_object)
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.bytes_read = 0
+        self.eof = False
+
+    def _fill(self):
+        """Чтение следующего блока; разобранная часть буфера отбрасывается"""
+        chunk = self.file.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        if self.progress and chunk:
+            self.progress(self.bytes_read, self.total_bytes)
+
+    def _make_object(self, pairs):
+        keys = self.keys
+        return {keys.setdefault(key, key): value for key, value in pairs}
+
+    def peek(self):
+        """Следующий значимый символ ('' в конце файла)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Ожидался '{char}', найдено '{found}' (байт ~{self.bytes_read})")
+        self.pos += 1
+
+    def value(self):
+        """Следующее значение целиком"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise ValueError(f"Ошибка разбора JSON (байт ~{self.bytes_read})") from None
+                self._fill()  # значение не поместилось в буфер
+                continue
+            # Число у конца буфера могло оборваться ('12345.' из '12345.5') - дочитываем
+            if not self.eof and self._number_may_continue(value, end):
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def _number_may_continue(self, value, end):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return end >= len(self.buffer) or self.buffer[end] in _NUMBER_CHARS
+
+    def _member_key(self):
+        """Ключ члена объекта вместе с двоеточием"""
+        while True:
+            match = _MEMBER_KEY.match(self.buffer, self.pos)
+            if match and (match.end() < len(self.buffer) or self.eof):
+                break
+            if self.eof:
+                raise ValueError(f"Ожидался ключ объекта (байт ~{self.bytes_read})")
+            self._fill()
+        self.pos = match.end()
+        key = match.group(1)
+        return json.loads(f'"{key}"') if '\\' in key else key
+
+    def items(self):
+        """Пары ключ-значение объекта по одной"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            yield self._member_key(), self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+
+def stream_database(path, record_sections=RECORD_SECTIONS, chunk_size=CHUNK_SIZE, progress=None):
+    """Генератор (раздел, ключ, значение): записи разделов record_sections по одной,
+    остальные разделы (и пустые разделы с записями) - целиком с ключом None.
+    progress(прочитано байт, всего байт)"""
+    total_bytes = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        reader = StreamReader(f, total_bytes, chunk_size, progress)
+        yield from _sections(reader, record_sections)
+        if reader.peek():
+            raise ValueError(f"Лишние данные после JSON (байт ~{reader.bytes_read})")
+
+
+def _sections(reader, record_sections):
+    """Разделы верхнего уровня; разделы-словари из record_sections - по записям"""
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        section = reader._member_key()
+        if section in record_sections and reader.peek() == '{':
+            empty = True
+            for key, record in reader.items():
+                empty = False
+                yield section, key, record
+            if empty:
+                yield section, None, {}
+        else:
+            yield section, None, reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect('}')
+        return
@@ -0,0 +1,83 @@
+"""
+Эффекты способностей (Gifct) на сервере: появление, длительность, область и истечение по куче
+"""
+
+import heapq
+import itertools
+
+
+class EffectStore:
+    """Активные эффекты мира; истечение - по куче, без обхода всех эффектов"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.effects = {}  # effect_id -> эффект
+        self.heap = []  # (время истечения, effect_id)
+        self.counter = itertools.count(1)
+
+    def __len__(self):
+        return len(self.effects)
+
+    def spawn(self, owner_client_id, character_id, gifct_id, map_name, position,
+              duration, radius, **visual):
+        """Новый эффект; visual - данные только для отрисовки (gif_url, scale, ...)"""
+        now = self.clock()
+        effect_id = f"fx_{next(self.counter)}"
+        effect = {
+            'id': effect_id,
+            'owner_client_id': owner_client_id,
+            'character_id': character_id,
+            'gifct_id': gifct_id,
+            'map': map_name,
+            'position': position,
+            'radius': radius,
+            'duration': duration,
+            'started_at': now,
+            'expires_at': now + duration,
+            **visual
+        }
+        self.effects[effect_id] = effect
+        heapq.heappush(self.heap, (effect['expires_at'], effect_id))
+        return effect
+
+    def get(self, effect_id):
+        return self.effects.get(effect_id)
+
+    def remove(self, effect_id):
+        """Удаление эффекта досрочно (запись в куче удаляется лениво)"""
+        return self.effects.pop(effect_id, None)
+
+    def next_expiry(self):
+        """Время ближайшего истечения или None"""
+        while self.heap:
+            expires_at, effect_id = self.heap[0]
+            if effect_id in self.effects:
+                return expires_at
+            heapq.heappop(self.heap)
+        return None
+
+    def seconds_until_next(self):
+        expires_at = self.next_expiry()
+        if expires_at is None:
+            return None
+        return max(0.0, expires_at - self.clock())
+
+    def pop_expired(self):
+        """Истекшие эффекты; удаляются из хранилища"""
+        now = self.clock()
+        expired = []
+        while True:
+            expires_at = self.next_expiry()
+            if expires_at is None or expires_at > now:
+                return expired
+            _, effect_id = heapq.heappop(self.heap)
+            expired.append(self.effects.pop(effect_id))
+
+    def on_map(self, map_name):
+        """Активные эффекты карты (для снимка мира при входе)"""
+        return [effect for effect in self.effects.values() if effect['map'] == map_name]
+
+    @staticmethod
+    def public(effect):
+        """Данные эффекта для клиента"""
+        return {key: value for key, value in effect.items() if key != 'owner_client_id'}
@@ -0,0 +1,124 @@
+"""
+Хранилище горячих полей активных персонажей в массивах по плотным слотам
+"""
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy - списки и циклы на Python
+    np = None
+
+# Поле -> (тип NumPy, значение свободного слота)
+_FIELDS = {
+    'x': ('float64', 0.0),
+    'y': ('float64', 0.0),
+    'z': ('float64', 0.0),
+    'map_id': ('int32', -1),
+}
+
+
+class EntityStore:
+    """Координаты и карта сущностей; слоты переиспользуются"""
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.slots = {}  # client_id -> слот
+        self.client_ids = []  # слот -> client_id
+        self.free = []  # свободные слоты
+        self.map_ids = {}  # карта -> номер
+        for name in _FIELDS:
+            setattr(self, name, self._new_array(name, 0))
+        self._grow(max(1, capacity))
+
+    @staticmethod
+    def _new_array(name, size):
+        dtype, fill = _FIELDS[name]
+        if np is not None:
+            return np.full(size, fill, dtype=dtype)
+        return [fill] * size
+
+    def _grow(self, new_capacity):
+        """Увеличение массивов; новые слоты попадают в список свободных"""
+        old_capacity = self.capacity
+        for name in _FIELDS:
+            extra = self._new_array(name, new_capacity - old_capacity)
+            old = getattr(self, name)
+            setattr(self, name, np.concatenate((old, extra)) if np is not None else old + extra)
+
+        self.client_ids.extend([None] * (new_capacity - old_capacity))
+        self.free.extend(range(new_capacity - 1, old_capacity - 1, -1))
+        self.capacity = new_capacity
+
+    def _map_id(self, map_name):
+        map_id = self.map_ids.get(map_name)
+        if map_id is None:
+            map_id = self.map_ids[map_name] = len(self.map_ids)
+        return map_id
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, client_id):
+        return client_id in self.slots
+
+    # Изменение сущностей
+    def add(self, client_id, x, y, z, map_name):
+        """Добавление сущности (или обновление, если она уже есть)"""
+        if client_id in self.slots:
+            self.update(client_id, x, y, z, map_name)
+            return self.slots[client_id]
+
+        if not self.free:
+            self._grow(self.capacity * 2)
+        slot = self.free.pop()
+        self.slots[client_id] = slot
+        self.client_ids[slot] = client_id
+        self._write(slot, x, y, z, map_name)
+        return slot
+
+    def update(self, client_id, x, y, z, map_name):
+        slot = self.slots.get(client_id)
+        if slot is not None:
+            self._write(slot, x, y, z, map_name)
+
+    def _write(self, slot, x, y, z, map_name):
+        self.x[slot] = x
+        self.y[slot] = y
+        self.z[slot] = z
+        self.map_id[slot] = self._map_id(map_name)
+
+    def remove(self, client_id):
+        slot = self.slots.pop(client_id, None)
+        if slot is None:
+            return
+        self.client_ids[slot] = None
+        for name, (_, fill) in _FIELDS.items():
+            getattr(self, name)[slot] = fill
+        self.free.append(slot)
+
+    # Чтение
+    def query_radius(self, map_name, x, y, radius, exclude=None):
+        """Сущности карты в радиусе: список (client_id, расстояние)"""
+        map_id = self.map_ids.get(map_name)
+        if map_id is None or not self.slots:
+            return []
+
+        if np is not None:
+            dx = self.x - x
+            dy = self.y - y
+            distances_sq = dx * dx + dy * dy
+            mask = (self.map_id == map_id) & (distances_sq <= radius * radius)
+            slots = np.nonzero(mask)[0]
+            distances = np.sqrt(distances_sq[slots])
+            return [(self.client_ids[slot], float(distance))
+                    for slot, distance in zip(slots.tolist(), distances.tolist())
+                    if self.client_ids[slot] != exclude]
+
+        radius_sq = radius * radius
+        found = []
+        for client_id, slot in self.slots.items():
+            if client_id == exclude or self.map_id[slot] != map_id:
+                continue
+            distance_sq = (self.x[slot] - x) ** 2 + (self.y[slot] - y) ** 2
+            if distance_sq <= radius_sq:
+                found.append((client_id, distance_sq ** 0.5))
+        return found
@@ -1,17 +1,54 @@
+import hashlib
+import math
+import threading
 import time
 import random
+from collections import deque
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+from account_pool import AccountWorkerPool
+from chat import ChatChannels, GLOBAL_CHANNEL, PARTY_PREFIX
+from concurrency import locked
+from effects import EffectStore
+import json_codec
+from entity_store import EntityStore
+from message_registry import MessageRegistry, MessageType
+from movement import MovementState
+from session import CharacterSession
+from world_timers import WorldTimers
+
+MINUTES_PER_DAY = 24 * 60
+
+# Уровни детализации рассылки позиций: (радиус, интервал в секундах).
+# Дальше последнего радиуса позиции не рассылаются (только присутствие).
+DEFAULT_UPDATE_TIERS = [
+    (8.0, 0.05),  # 20 Гц
+    (16.0, 0.2),  # 5 Гц
+    (40.0, 1.0),  # 1 Гц
+]
+
+# Поля эффекта от клиента, которые нужны только для отрисовки
+EFFECT_VISUAL_FIELDS = ('gifct_name', 'gif_url', 'scale')
+
 
 class GameLogic:
     """Игровая логика для UDP сервера"""
 
-    def __init__(self, database):
+    def __init__(self, database, config=None, clock=None):
         self.db = database
+        self.lock = threading.RLock()
+        self.config = config or {}
+        self.clock = clock or time.time  # виртуальные часы при воспроизведении
         self._init_world()
         self._init_structures()
         self._init_timers()
+        self._init_update_tiers()
+        self._init_dead_reckoning()
+        self._init_chat()
+        self._init_effects()
+        self._init_dispatch()
+        self._init_account_pool()
         print(f"[GAME] UDP Мир инициализирован: {self.world['name']}")
         print(f"[GAME] Протокол: UDP, Порт: {self.world.get('udp_port', 5555)}")
         print(f"[GAME] Время: {self.world['time']}, Погода: {self.world['weather']}")
@@ -34,52 +71,162 @@ class GameLogic:
     def _init_structures(self):
         """Инициализация структур данных"""
         self.online_players = {}  # client_id -> player_id
-        self.active_characters = {}  # client_id -> character_data
+        self.active_characters = {}  # client_id -> CharacterSession
         self.character_clients = {}  # character_id -> client_id
-        self.player_positions = {}  # client_id -> position
-        self.last_position_updates = {}  # client_id -> timestamp
-        self.last_broadcast_updates = {}  # client_id -> timestamp для рассылки
+        self.entities = EntityStore()  # координаты и карта по слотам
+        self.last_sent_positions = {}  # receiver_client_id -> {client_id: MovementState}
+        self.movement = {}  # client_id -> последнее MovementState от клиента
+        self.dirty_characters = set()  # client_id с изменениями, не сохраненными в БД
+        self.liveness_source = None  # client_id -> время последнего пакета (из сети)
+        self.flushed_activity = {}  # client_id -> время последнего пакета, уже записанное в БД
+        self.handler_stats = None  # HandlerStats: замер обработчиков (подключает ServerCore)
 
     def _init_timers(self):
-        """Инициализация таймеров"""
+        """Инициализация таймеров мира"""
         self.game_tick = 0
-        self.last_world_update = time.time()
         self.world_update_interval = 60
+        self.world_dirty = False
+        self.world_minute = self._parse_world_time(self.world.get('time', '12:00'))
+
+        self.timers = WorldTimers(self.clock)
+        self.timers.schedule('clock', self.world_update_interval, self._update_time,
+                             interval=self.world_update_interval)
+        self.timers.schedule('weather', self.world_update_interval, self._update_weather,
+                             interval=self.world_update_interval)
+        self.auto_save_interval = float(self.config.get('game', {}).get('auto_save_interval', 300))
+        self.timers.schedule('autosave', self.auto_save_interval, self._auto_save_characters,
+                             interval=self.auto_save_interval)
+
+    @staticmethod
+    def _parse_world_time(text):
+        """'HH:MM' -> минута суток"""
+        try:
+            hours, minutes = map(int, text.split(':'))
+            return (hours * 60 + minutes) % MINUTES_PER_DAY
+        except (AttributeError, ValueError):
+            return 12 * 60
+
+    def _format_world_time(self):
+        return f"{self.world_minute // 60:02d}:{self.world_minute % 60:02d}"
+
+    def schedule_event(self, name, delay, callback, interval=None):
+        """Событие мира по таймеру; callback возвращает ответы для рассылки или None"""
+        self.timers.schedule(name, delay, callback, interval)
+
+    def sync_world(self, world):
+        """Принять состояние мира извне (зона получает его от шлюза)"""
+        self.world.update(world)
+        self.world_minute = self._parse_world_time(self.world.get('time', '12:00'))
+
+    def _init_update_tiers(self):
+        """Загрузка уровней детализации рассылки позиций по картам"""
+        tiers_config = self.config.get('game', {}).get('update_tiers', {})
+
+        self.update_tiers = {}
+        for map_name, tiers in tiers_config.items():
+            try:
+                self.update_tiers[map_name] = sorted(
+                    (float(tier['radius']), float(tier['interval'])) for tier in tiers
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[GAME] Неверные уровни рассылки для карты {map_name}: {e}")
+
+        self.update_tiers.setdefault('default', DEFAULT_UPDATE_TIERS)
+        self.default_map = self.config.get('game', {}).get('starting_zone', 'start_city')
+
+    def _init_dead_reckoning(self):
+        """Порог ошибки экстраполяции и максимальная пауза между рассылками"""
+        settings = self.config.get('game', {}).get('dead_reckoning', {})
+        self.movement_error_threshold = float(settings.get('error_threshold', 0.25))
+        self.movement_max_silence = float(settings.get('max_silence', 0.75))
+
+    def _position_of(self, client_id):
+        """Позиция активного персонажа (словарь записи; координаты для поиска - в self.entities)"""
+        character = self.active_characters.get(client_id)
+        return character.position if character is not None else None
+
+    def predict_position(self, client_id, now=None):
+        """Экстраполированная позиция персонажа по модели движения"""
+        state = self.movement.get(client_id)
+        if state is None:
+            return self._position_of(client_id)
+        x, y, z = state.predict(self.clock() if now is None else now)
+        return dict(self._position_of(client_id) or {}, x=x, y=y, z=z)
+
+    def _init_chat(self):
+        """Каналы чата и радиус ближнего чата"""
+        self.chat_proximity_radius = float(self.config.get('game', {}).get('chat_proximity_radius', 10))
+        self.chat = ChatChannels()
+
+    def _init_effects(self):
+        """Эффекты способностей и ограничения их длительности и области"""
+        settings = self.config.get('game', {}).get('effects', {})
+        self.effect_default_duration = float(settings.get('default_duration', 5.0))
+        self.effect_max_duration = float(settings.get('max_duration', 30.0))
+        self.effect_default_radius = float(settings.get('default_radius', 2.0))
+        self.effect_max_radius = float(settings.get('max_radius', 10.0))
+        self.effects = EffectStore(self.clock)
+
+    def _update_chat_position(self, client_id, position):
+        """Карта игрока для канала зоны"""
+        self.chat.move(client_id, self._map_of(position))
+
+    def _store_entity(self, client_id, position):
+        """Запись координат персонажа в хранилище сущностей (по нему же - ближний чат)"""
+        self.entities.add(client_id, float(position.get('x', 0)), float(position.get('y', 0)),
+                          float(position.get('z', 0)), self._map_of(position))
+
+    def _map_of(self, position):
+        """Карта позиции (старые позиции без карты считаются стартовой картой)"""
+        return position.get('map') or self.default_map
+
+    def _get_update_tiers(self, map_name):
+        """Уровни детализации для карты"""
+        return self.update_tiers.get(map_name) or self.update_tiers['default']
 
     # Обновление мира
+    @locked
     def update_world(self):
         """Обновление состояния мира для UDP"""
         self.game_tick += 1
-        current_time = time.time()
-        if current_time - self.last_world_update >= self.world_update_interval:
-            self.last_world_update = current_time
-            return self._perform_world_update()
-        return None
-
-    def _perform_world_update(self):
-        """Выполнение обновления мира"""
-        updates = []
-        time_update = self._update_time()
-        if time_update:
-            updates.append(time_update)
-        weather_update = self._update_weather()
-        if weather_update:
-            updates.append(weather_update)
-        self._auto_save_characters()
-        return updates if updates else None
+        now = self.clock()
+        updates = self.complete_account_operations()
+
+        expires_at = self.effects.next_expiry()
+        if expires_at is not None and expires_at <= now:
+            updates.extend(self.expire_effects())
+
+        due = self.timers.next_due()
+        if due is not None and due <= now:
+            updates.extend(self.timers.run_due())
+            if self.world_dirty:
+                # Изменения мира за все сработавшие таймеры - одним сохранением
+                self.world_dirty = False
+                self.db.update_world_data(self.world)
+        return updates or None
+
+    def seconds_until_world_update(self):
+        """Время до ближайшего таймера мира или истечения эффекта"""
+        delays = [delay for delay in (self.timers.seconds_until_next(),
+                                      self.effects.seconds_until_next())
+                  if delay is not None]
+        return min(delays) if delays else None
+
+    def expire_effects(self):
+        """Рассылка об истекших эффектах игрокам поблизости"""
+        responses = []
+        for effect in self.effects.pop_expired():
+            responses.extend(self._effect_fanout('effect_expired', effect))
+        return responses
 
     def _update_time(self):
         """Обновление игрового времени"""
-        hours, minutes = map(int, self.world['time'].split(':'))
-        minutes += 1
-        if minutes >= 60:
-            minutes = 0
-            hours += 1
-            if hours >= 24:
-                hours = 0
-                self.world['day'] += 1
-        self.world['time'] = f"{hours:02d}:{minutes:02d}"
-        self.db.update_world_data(self.world)
+        self.world_minute += 1
+        if self.world_minute >= MINUTES_PER_DAY:
+            self.world_minute = 0
+            self.world['day'] += 1
+        self.world['time'] = self._format_world_time()
+        self.world_dirty = True
         return self._create_world_update('time', time=self.world['time'], day=self.world['day'])
 
     def _update_weather(self):
@@ -88,7 +235,7 @@ class GameLogic:
         new_weather = random.choice(weather_types)
         if new_weather != self.world['weather']:
             self.world['weather'] = new_weather
-            self.db.update_world_data(self.world)
+            self.world_dirty = True
             return self._create_world_update('weather', weather=new_weather)
         return None
 
@@ -99,88 +246,201 @@ class GameLogic:
             'data': {
                 'type': 'world_update',
                 'update_type': update_type,
-                'timestamp': time.time(),
+                'timestamp': self.clock(),
+                'server_tick': self.game_tick,
                 **data
             }
         }
 
+    def _pending_activity(self, client_id):
+        """Время последнего пакета клиента, если оно новее записанного в БД"""
+        last_activity = self.liveness_source(client_id) if self.liveness_source else None
+        if not last_activity or last_activity == self.flushed_activity.get(client_id):
+            return None
+        self.flushed_activity[client_id] = last_activity
+        return datetime.fromtimestamp(last_activity).isoformat()
+
+    @locked
     def _auto_save_characters(self):
-        """Автосохранение активных персонажей"""
+        """Автосохранение одной записью: позиции изменившихся персонажей и время активности
+        всех, от кого были пакеты с прошлого сохранения (в том числе стоящих на месте)"""
+        batch = {}
         for client_id, character in self.active_characters.items():
-            self.db.update_character(character['id'], {
-                'position': character.get('position', {'x': 0, 'y': 0, 'z': 0}),
-                'last_played': datetime.now().isoformat()
-            })
+            updates = {}
+            if client_id in self.dirty_characters:
+                updates['position'] = character.position
+                updates['last_played'] = datetime.now().isoformat()
+            last_activity = self._pending_activity(client_id)
+            if last_activity:
+                updates['last_activity'] = last_activity
+            if updates:
+                batch[character.id] = updates
+        self.dirty_characters.clear()
+
+        if batch:
+            self.db.update_characters(batch)
+        else:
+            self.db.flush()  # регистрации и входы из пула аккаунтов
 
     # Основной обработчик сообщений
-    def handle_message(self, message):
-        """Обработка входящих сообщений для UDP"""
+    def _init_dispatch(self):
+        """Таблица диспетчеризации с валидаторами, собирается один раз"""
+        handlers = {
+            # UDP-специфичные сообщения
+            MessageType.CLIENT_INIT: self.handle_client_init,
+            MessageType.CLIENT_DISCONNECT: self.handle_logout,
+            MessageType.HEARTBEAT: self.handle_heartbeat,
+            MessageType.SKIN_UPDATE: self.handle_skin_update,
+            MessageType.REQUEST_SKIN: self.handle_skin_request,
+            MessageType.GIFCT_ACTIVATION: self.handle_gifct_activation,
+            # Основные игровые сообщения
+            MessageType.AUTH: self.handle_auth,
+            MessageType.CHARACTER_SELECT: self.handle_character_select,
+            MessageType.JOIN_WORLD: self.handle_join_world,
+            MessageType.POSITION_UPDATE: self.handle_position_update,
+            MessageType.CHARACTER_MOVE: self.handle_position_update,
+            MessageType.CHAT_MESSAGE: self.handle_chat,
+            MessageType.CHAT_JOIN: self.handle_chat_join,
+            MessageType.CHAT_LEAVE: self.handle_chat_leave,
+            MessageType.LEAVE_WORLD: self.handle_leave_world,
+            MessageType.PING: self.handle_ping,
+            MessageType.TEST: self.handle_ping,
+            # Совместимость со старыми сообщениями
+            MessageType.REGISTER: self.handle_register,
+            MessageType.LOGIN: self.handle_login,
+            MessageType.LOGOUT: self.handle_logout,
+            MessageType.CREATE_CHARACTER: self.handle_create_character,
+            MessageType.SELECT_CHARACTER: self.handle_select_character,
+            MessageType.DELETE_CHARACTER: self.handle_delete_character,
+            MessageType.GET_CHARACTERS: self.handle_get_characters,
+            MessageType.CHARACTER_ACTION: self.handle_character_action,
+            MessageType.GET_WORLD_INFO: self.handle_get_world_info,
+            MessageType.SAVE_CHARACTER: self.handle_save_character,
+        }
+        self.message_registry = MessageRegistry()
+        self.dispatch = self.message_registry.compile(handlers)
+
+        # Операции аккаунтов: (работа с базой в пуле, завершение в потоке тика)
+        self.account_operations = {
+            MessageType.AUTH.value: (self._auth_work, self._auth_done),
+            MessageType.REGISTER.value: (self._register_work, self._register_done),
+            MessageType.LOGIN.value: (self._login_work, self._login_done),
+        }
+
+    def _init_account_pool(self):
+        """Пул потоков для операций аккаунтов; 0 потоков - выполнение прямо в тике"""
+        workers = int(self.config.get('server', {}).get('account_workers', 2))
+        self.account_pool = AccountWorkerPool(workers) if workers > 0 else None
+        self.account_backlog = {}  # client_id -> сообщения, ждущие завершения операции
+        self.message_router = None  # куда отдавать отложенные сообщения (шлюз зон); None - сюда
+
+    @locked
+    def complete_account_operations(self):
+        """Завершение операций из пула и обработка отложенных сообщений клиентов"""
+        if self.account_pool is None:
+            return []
+        responses = []
+        for completion in self.account_pool.drain():
+            responses.extend(self._complete_account_operation(*completion))
+        return responses
+
+    def _complete_account_operation(self, client_id, msg_type, message, payload, result, error, duration):
+        backlog = self.account_backlog.pop(client_id, None) or deque()
+
+        started = time.perf_counter()
+        if error is not None:
+            print(f"[GAME] UDP Ошибка операции {msg_type} для {client_id}: {error}")
+            responses = self.error_response(client_id, 'Внутренняя ошибка сервера')
+        else:
+            responses = self.account_operations[msg_type][1](client_id, payload, result) or []
+        if self.handler_stats:
+            self.handler_stats.record(msg_type, duration + time.perf_counter() - started,
+                                      message, responses, failed=error is not None)
+
+        # Сообщения клиента по порядку, пока одно из них снова не уйдет в пул
+        route = self.message_router or self.handle_message
+        while backlog:
+            if client_id in self.account_backlog:
+                self.account_backlog[client_id].extend(backlog)
+                break
+            responses.extend(route(backlog.popleft()) or [])
+        return responses
+
+    def shutdown(self):
+        """Завершение операций аккаунтов перед остановкой"""
+        if self.account_pool is None:
+            return []
+        responses = []
+        for completion in self.account_pool.wait_idle():
+            responses.extend(self._complete_account_operation(*completion))
+        self.account_pool.shutdown()
+        return responses
+
+    def decode_message(self, message):
+        """Разбор сообщения по схеме: (полезная нагрузка, текст ошибки)"""
+        entry = self.dispatch.get(message.get('type'))
+        return entry.decode(message) if entry else (None, None)
+
+    @locked
+    def handle_message(self, message, validated=False, payload=None):
+        """Обработка входящих сообщений для UDP; validated - сообщение уже разобрано в payload"""
         msg_type = message.get('type')
         client_id = message.get('client_id')
 
-        if msg_type not in ['heartbeat', 'ping']:
+        if msg_type not in ('heartbeat', 'ping'):
             print(f"[GAME] UDP Обработка от {client_id}: {msg_type}")
 
-        # UDP-специфичные сообщения
-        if msg_type == 'client_init':
-            return self._create_client_response(client_id, 'client_init_response',
-                                                success=True, message='UDP клиент инициализирован')
-        elif msg_type == 'client_disconnect':
-            return self.remove_player(client_id)
-        elif msg_type == 'heartbeat':
-            return self.handle_heartbeat(client_id, message)
-        elif msg_type == 'skin_update':
-            return self.handle_skin_update(client_id, message)
-        elif msg_type == 'request_skin':
-            return self.handle_skin_request(client_id, message)
-
-        # Основные игровые сообщения
-        handlers = {
-            'auth': self.handle_auth,
-            'character_select': self.handle_character_select,
-            'join_world': self.handle_join_world,
-            'position_update': self.handle_position_update,
-            'character_move': self.handle_position_update,
-            'chat_message': self.handle_chat,
-            'leave_world': self.handle_leave_world,
-            'ping': self.handle_ping,
-            'test': self.handle_ping,
-            # Совместимость со старыми сообщениями
-            'register': self.handle_register,
-            'login': self.handle_login,
-            'logout': self.handle_logout,
-            'create_character': self.handle_create_character,
-            'select_character': self.handle_select_character,
-            'delete_character': self.handle_delete_character,
-            'get_characters': self.handle_get_characters,
-            'character_action': self.handle_character_action,
-            'get_world_info': self.handle_get_world_info,
-            'save_character': self.handle_save_character,
-        }
+        # Пока операция аккаунта клиента в пуле, его сообщения ждут ее завершения
+        if client_id in self.account_backlog:
+            self.account_backlog[client_id].append(message)
+            return None
 
-        handler = handlers.get(msg_type)
-        if handler:
-            return handler(client_id, message)
+        entry = self.dispatch.get(msg_type)
+        if entry is None:
+            print(f"[GAME] Неизвестный тип сообщения UDP: {msg_type}")
+            return self.error_response(client_id, f'Неизвестный тип сообщения: {msg_type}')
 
-        print(f"[GAME] Неизвестный тип сообщения UDP: {msg_type}")
-        return self.error_response(client_id, f'Неизвестный тип сообщения: {msg_type}')
+        if not validated:
+            payload, error = entry.decode(message)
+            if error:
+                return self.error_response(client_id, error)
+
+        operation = self.account_operations.get(msg_type) if self.account_pool else None
+        if operation:
+            self.account_backlog[client_id] = deque()
+            self.account_pool.submit(client_id, msg_type, message, payload, operation[0])
+            return None
+
+        if self.handler_stats is None:
+            return entry.handler(client_id, payload)
+
+        started = time.perf_counter()
+        try:
+            responses = entry.handler(client_id, payload)
+        except Exception:
+            self.handler_stats.record(msg_type, time.perf_counter() - started, message, None, failed=True)
+            raise
+        self.handler_stats.record(msg_type, time.perf_counter() - started, message, responses)
+        return responses
 
     # Обработчики сообщений
-    def handle_heartbeat(self, client_id, message):
-        """Обработка heartbeat сообщения"""
-        if client_id in self.active_characters:
-            character = self.active_characters[client_id]
-            self.db.update_character(character['id'], {
-                'last_activity': datetime.now().isoformat()
-            })
+    def handle_client_init(self, client_id, payload):
+        """Инициализация UDP клиента"""
+        return self._create_client_response(client_id, 'client_init_response',
+                                            success=True, message='UDP клиент инициализирован')
+
+    def handle_heartbeat(self, client_id, payload):
+        """Обработка heartbeat сообщения (обычно отвечает сам UDP сервер)"""
         return self._create_client_response(client_id, 'heartbeat_response',
-                                            timestamp=time.time(), server_tick=self.game_tick)
+                                            timestamp=self.clock(), server_tick=self.game_tick)
 
-    def handle_auth(self, client_id, message):
+    def handle_auth(self, client_id, payload):
         """Обработка аутентификации для UDP"""
-        username = message.get('username')
-        if not username:
-            return self.error_response(client_id, 'Не указано имя пользователя')
+        return self._auth_done(client_id, payload, self._auth_work(payload))
+
+    def _auth_work(self, payload):
+        """Поиск или регистрация игрока (в пуле потоков)"""
+        username = payload.username
 
         existing_player = self.db.find_player_by_username(username)
         if existing_player:
@@ -192,21 +452,22 @@ class GameLogic:
             )
             print(f"[GAME] UDP Создан новый игрок: {player_id}")
 
-        self.online_players[client_id] = player_id
         self.db.increment_online_players()
+        return player_id
+
+    def _auth_done(self, client_id, payload, player_id):
+        username = payload.username
+        self.online_players[client_id] = player_id
 
         return self._create_client_response(client_id, 'auth_response',
                                             success=True, player_id=player_id,
                                             username=username, message='UDP Аутентификация успешна',
                                             protocol='udp')
 
-    def handle_character_select(self, client_id, message):
+    def handle_character_select(self, client_id, payload):
         """Обработка выбора персонажа"""
-        character_id = message.get('character_id')
-        character_data = message.get('character_data')
-
-        if not character_id:
-            return self.error_response(client_id, 'Не указан ID персонажа')
+        character_id = payload.character_id
+        character_data = payload.character_data
 
         # Проверяем player_id
         player_id = self.online_players.get(client_id)
@@ -236,38 +497,32 @@ class GameLogic:
                                             },
                                             message='Персонаж выбран')
 
-    def handle_skin_update(self, client_id, message):
+    def handle_skin_update(self, client_id, payload):
         """Обработка обновления скина персонажа"""
         if client_id not in self.active_characters:
             return self.error_response(client_id, 'Не в мире')
 
         character = self.active_characters[client_id]
-        skin_data = message.get('skin_data', {})
-
-        # Обновляем данные скина у персонажа
-        if 'current_skin' not in character:
-            character['current_skin'] = {}
-        character['current_skin'].update(skin_data)
+        skin_data = payload.skin_data or {}
 
-        # Сохраняем в БД
-        self.db.update_character(character['id'], {
-            'current_skin': character['current_skin']
-        })
+        # Обновляем скин в записи персонажа
+        current_skin = dict(character.current_skin or {})
+        current_skin.update(skin_data)
+        character.skin_hash = None
+        self.db.update_character(character.id, {'current_skin': current_skin})
 
         # Рассылаем обновление другим игрокам
         broadcast_msg = self._create_broadcast_message('skin_update',
                                                        character=character,
-                                                       skin_data=skin_data)
+                                                       skin_data=skin_data,
+                                                       skin_hash=self._skin_hash(character))
 
         return [{'target': 'broadcast', 'data': broadcast_msg,
                  'exclude_client_id': client_id}]
 
-    def handle_skin_request(self, client_id, message):
+    def handle_skin_request(self, client_id, payload):
         """Обработка запроса скина игрока"""
-        target_character_id = message.get('target_character_id')
-
-        if not target_character_id:
-            return self.error_response(client_id, 'Не указан ID персонажа')
+        target_character_id = payload.target_character_id
 
         # Ищем игрока с этим character_id
         target_client_id = self.character_clients.get(target_character_id)
@@ -276,91 +531,56 @@ class GameLogic:
             return self.error_response(client_id, 'Игрок не найден')
 
         character = self.active_characters[target_client_id]
-        skin_data = character.get('current_skin', {})
+        skin_data = character.current_skin or {}
 
         return self._create_client_response(client_id, 'skin_info_response',
                                             character_id=target_character_id,
-                                            character_name=character['name'],
+                                            character_name=character.name,
                                             skin_data=skin_data)
 
-    def handle_join_world(self, client_id, message):
+    def handle_join_world(self, client_id, payload):
         """Обработка входа в игровой мир для UDP"""
         print(f"[GAME] UDP Запрос на вход в мир от {client_id}")
 
-        character_id = message.get('character_id')
-        character_name = message.get('character_name')
-
-        if not character_id:
-            return self.error_response(client_id, 'Не указан ID персонажа')
+        character_id = payload.character_id
+        character_name = payload.character_name
 
         # Проверяем, есть ли уже активный персонаж у этого клиента
         if client_id in self.active_characters:
             return self.error_response(client_id, 'Уже в мире с другим персонажем')
 
-        # Получаем данные персонажа из БД
-        character = self.db.get_character(character_id)
-        if not character:
-            # Если персонажа нет в БД, создаем нового
-            character_data = {
-                'id': character_id,
-                'name': character_name or f'Character_{character_id}',
-                'race': 'human',
-                'class': 'warrior',
-                'level': 1,
-                'health': 100,
-                'max_health': 100,
-                'position': {'x': 0, 'y': 0, 'z': 0}
-            }
-
-            # Если есть player_id в online_players, используем его
-            player_id = self.online_players.get(client_id, f'player_{client_id}')
-
-            character_id, character = self.db.create_character(player_id, character_data)
+        # Получаем данные персонажа из БД; в мире - только сессия с горячими полями
+        character_id, record = self.load_or_create_character(client_id, character_id, character_name)
+        character = CharacterSession(client_id, record, self.db)
 
         # Добавляем персонажа в активные
         self.active_characters[client_id] = character
         self.character_clients[character_id] = client_id
 
-        # Обновляем позицию
-        if 'position' in message:
-            character['position'] = message['position']
+        # Обновляем позицию и тип персонажа
+        updates = {}
+        if payload.position is not None:
+            character.position = payload.position.to_dict()
+        if payload.character_type:
+            character.character_type = updates['character_type'] = payload.character_type
 
-        self.player_positions[client_id] = character.get('position', {'x': 0, 'y': 0, 'z': 0})
-        self.last_position_updates[client_id] = time.time()
+        self._store_entity(client_id, character.position)
+
+        # Каналы чата
+        self.chat.subscribe(client_id, GLOBAL_CHANNEL)
+        self._update_chat_position(client_id, character.position)
 
         # Обновляем в БД
         self.db.update_character(character_id, {
             'last_activity': datetime.now().isoformat(),
             'in_world': True,
-            'position': character.get('position', {'x': 0, 'y': 0, 'z': 0})
+            'position': character.position,
+            **updates
         })
 
-        # После добавления персонажа в активные
-        self.active_characters[client_id] = character
-
-        # Отправляем новому клиенту скины всех текущих игроков
-        responses = []
-
-        # Скины существующих игроков
-        for other_client_id, other_character in self.active_characters.items():
-            if other_client_id != client_id and 'current_skin' in other_character:
-                skin_info_msg = {
-                    'type': 'player_skin_info',
-                    'character_id': other_character['id'],
-                    'character_name': other_character['name'],
-                    'skin_data': other_character['current_skin'],
-                    'timestamp': time.time()
-                }
-                responses.append({
-                    'target': 'client',
-                    'client_id': client_id,
-                    'data': skin_info_msg
-                })
-
-        # Создаем ответ клиенту
+        # Ответ клиенту: вход и снимок всех игроков в мире одним сообщением.
+        # Скины клиент запрашивает отдельно (request_skin) по хэшу.
         responses = []
-
-        # Ответ клиенту об успешном входе
         responses.append({
             'target': 'client',
             'client_id': client_id,
@@ -368,15 +588,20 @@ class GameLogic:
                 'type': 'world_joined',
                 'success': True,
                 'character_id': character_id,
-                'character_name': character['name'],
+                'character_name': character.name,
                 'world_info': {
                     'name': self.world['name'],
                     'time': self.world['time'],
                     'weather': self.world['weather'],
                     'online_players': len(self.active_characters)
                 },
+                'players': self._world_snapshot(exclude_client_id=client_id),
+                'effects': [self.effects.public(effect) for effect in
+                            self.effects.on_map(self._map_of(character.position))],
                 'protocol': 'udp',
-                'timestamp': time.time()
+                'max_silence': self.movement_max_silence,
+                'timestamp': self.clock(),
+                'server_tick': self.game_tick
             }
         })
 
@@ -384,9 +609,12 @@ class GameLogic:
         broadcast_msg = {
             'type': 'player_joined',
             'character_id': character_id,
-            'character_name': character['name'],
-            'position': character.get('position', {'x': 0, 'y': 0, 'z': 0}),
-            'timestamp': time.time(),
+            'character_name': character.name,
+            'character_type': character.character_type,
+            'skin_hash': self._skin_hash(character),
+            'position': character.position,
+            'timestamp': self.clock(),
+            'server_tick': self.game_tick,
             'protocol': 'udp'
         }
 
@@ -396,20 +624,130 @@ class GameLogic:
             'exclude_client_id': client_id
         })
 
-        print(f"[GAME] UDP Персонаж {character['name']} вошел в мир")
+        print(f"[GAME] UDP Персонаж {character.name} вошел в мир")
         return responses
 
-    def handle_leave_world(self, client_id, message):
+    def _world_snapshot(self, exclude_client_id=None):
+        """Компактный снимок игроков в мире для входящего клиента"""
+        players = []
+        for other_client_id, other_character in self.active_characters.items():
+            if other_client_id == exclude_client_id:
+                continue
+            player = {
+                'id': other_character.id,
+                'name': other_character.name,
+                'character_type': other_character.character_type,
+                'position': other_character.position,
+            }
+            skin_hash = self._skin_hash(other_character)
+            if skin_hash:
+                player['skin_hash'] = skin_hash
+            state = self.movement.get(other_client_id)
+            if state is not None and state.is_moving():
+                # Движущийся игрок - в экстраполированной на текущий момент точке
+                player['position'] = self.predict_position(other_client_id)
+                player['velocity'] = state.velocity()
+            players.append(player)
+        return players
+
+    def _skin_hash(self, character):
+        """Короткий хэш текущего скина (кэшируется до изменения скина)"""
+        if character.skin_hash is None:
+            skin = character.current_skin
+            # Пустая строка - скина нет (чтобы не читать запись повторно)
+            character.skin_hash = (hashlib.sha1(json_codec.dumps(skin, sort_keys=True)).hexdigest()[:12]
+                                   if skin else '')
+        return character.skin_hash or None
+
+    def handle_gifct_activation(self, client_id, payload):
+        """Активация способности: эффект создает сервер, клиенты только отрисовывают"""
+        if client_id not in self.active_characters:
+            return self.error_response(client_id, 'Не в мире')
+
+        character = self.active_characters[client_id]
+        gifct_data = payload.gifct_data or {}
+        gifct_id = payload.gifct_id or gifct_data.get('gifct_id') or 'default'
+        if self.db.get_gifct_settings().get('gifct_enabled', {}).get(gifct_id) is False:
+            return self.error_response(client_id, f'Способность {gifct_id} отключена')
+
+        # Эффект появляется в позиции персонажа на сервере, длительность и область ограничены
+        position = character.position or {'x': 0, 'y': 0, 'z': 0}
+        try:
+            duration = float(gifct_data.get('duration', self.effect_default_duration))
+            radius = float(gifct_data.get('radius', self.effect_default_radius))
+        except (TypeError, ValueError):
+            return self.error_response(client_id, 'Неверные параметры эффекта')
+        # NaN проходит через min/max, а область с радиусом NaN никто не видит
+        if not (math.isfinite(duration) and math.isfinite(radius)):
+            return self.error_response(client_id, 'Неверные параметры эффекта')
+        duration = min(max(duration, 0.0), self.effect_max_duration)
+        radius = min(max(radius, 0.0), self.effect_max_radius)
+
+        visual = {key: gifct_data[key] for key in EFFECT_VISUAL_FIELDS if key in gifct_data}
+        effect = self.effects.spawn(client_id, character.id, gifct_id, self._map_of(position),
+                                    {'x': float(position.get('x', 0)),
+                                     'y': float(position.get('y', 0)),
+                                     'z': float(position.get('z', 0))},
+                                    duration, radius, **visual)
+        return self._effect_fanout('effect_spawn', effect,
+                                   character_name=character.name,
+                                   effect_data=self.effects.public(effect))
+
+    def _effect_fanout(self, msg_type, effect, **extra):
+        """Сообщение об эффекте игрокам, которые видят его область"""
+        position = effect['position']
+        interest_radius = self._get_update_tiers(effect['map'])[-1][0] + effect['radius']
+        receivers = self.entities.query_radius(effect['map'], position['x'], position['y'],
+                                               interest_radius)
+        if not receivers:
+            return []
+
+        data = {
+            'type': msg_type,
+            'effect_id': effect['id'],
+            'character_id': effect['character_id'],
+            'timestamp': self.clock(),
+            'server_tick': self.game_tick,
+            'protocol': 'udp',
+            **extra
+        }
+        return [{'target': 'client', 'client_id': receiver_id, 'data': data}
+                for receiver_id, _ in receivers]
+
+    def load_or_create_character(self, client_id, character_id, character_name=None):
+        """Загрузка персонажа из БД или создание нового при входе в мир"""
+        character = self.db.get_character(character_id)
+        if character:
+            return character_id, character
+
+        # Если персонажа нет в БД, создаем нового
+        character_data = {
+            'id': character_id,
+            'name': character_name or f'Character_{character_id}',
+            'race': 'human',
+            'class': 'warrior',
+            'level': 1,
+            'health': 100,
+            'max_health': 100,
+            'position': {'x': 0, 'y': 0, 'z': 0}
+        }
+
+        # Если есть player_id в online_players, используем его
+        player_id = self.online_players.get(client_id, f'player_{client_id}')
+
+        return self.db.create_character(player_id, character_data)
+
+    def handle_leave_world(self, client_id, payload):
         """Обработка выхода из мира"""
         if client_id not in self.active_characters:
             return self.error_response(client_id, 'Не в мире')
 
         character = self.active_characters[client_id]
-        character_id = character['id']
+        character_id = character.id
 
         # Сохраняем данные
         self.db.update_character(character_id, {
-            'position': character.get('position', {'x': 0, 'y': 0, 'z': 0}),
+            'position': character.position,
             'last_played': datetime.now().isoformat(),
             'in_world': False
         })
@@ -421,8 +759,11 @@ class GameLogic:
             del self.character_clients[character_id]
 
         # Очищаем связанные данные
-        for dict_to_clean in [self.player_positions, self.last_position_updates, self.last_broadcast_updates]:
-            dict_to_clean.pop(client_id, None)
+        self.entities.remove(client_id)
+        self._forget_sent_positions(client_id)
+        self.dirty_characters.discard(client_id)
+        self.flushed_activity.pop(client_id, None)
+        self.chat.remove_client(client_id)
 
         # Ответ клиенту
         responses = [{
@@ -432,7 +773,7 @@ class GameLogic:
                 'type': 'world_left',
                 'success': True,
                 'message': 'Вышли из мира',
-                'timestamp': time.time()
+                'timestamp': self.clock()
             }
         }]
 
@@ -440,8 +781,9 @@ class GameLogic:
         broadcast_msg = {
             'type': 'player_left',
             'character_id': character_id,
-            'character_name': character['name'],
-            'timestamp': time.time(),
+            'character_name': character.name,
+            'timestamp': self.clock(),
+            'server_tick': self.game_tick,
             'protocol': 'udp'
         }
 
@@ -451,55 +793,111 @@ class GameLogic:
             'exclude_client_id': client_id
         })
 
-        print(f"[GAME] UDP Персонаж {character['name']} покинул мир")
+        print(f"[GAME] UDP Персонаж {character.name} покинул мир")
         return responses
 
-    def handle_position_update(self, client_id, message):
+    def handle_position_update(self, client_id, payload):
         """Обработка обновления позиции для UDP"""
         if client_id not in self.active_characters:
             return None
 
         character = self.active_characters[client_id]
-        position = self._extract_position(message)
+        position = self._extract_position(payload)
         if not position:
             return None
 
+        # Клиент присылает только координаты - карту и зону сохраняем
+        previous = character.position or {}
+        for key in ('map', 'zone'):
+            if key not in position and key in previous:
+                position[key] = previous[key]
+
         # Обновляем позицию
-        character['position'] = position
-        self.player_positions[client_id] = position
-        self.db.update_character(character['id'], {'position': position})
-
-        # Обновляем время
-        current_time = time.time()
-        self.last_position_updates[client_id] = current_time
-
-        # Рассылка с троттлингом
-        last_broadcast = self.last_broadcast_updates.get(client_id, 0)
-        if current_time - last_broadcast >= 0.05:  # 20 FPS
-            self.last_broadcast_updates[client_id] = current_time
-            broadcast_msg = self._create_broadcast_message('position_update',
-                                                           character=character,
-                                                           position=position)
-            return [{'target': 'broadcast', 'data': broadcast_msg,
-                     'exclude_client_id': client_id}]
-        return None
+        character.position = position
+        self._update_chat_position(client_id, position)
+        self.dirty_characters.add(client_id)  # в БД - при автосохранении
+
+        # Обновляем хранилище сущностей и модель движения
+        self._store_entity(client_id, position)
+        velocity = payload.velocity.to_dict() if payload.velocity is not None else None
+        state = MovementState.from_message(position, velocity, payload.input, self.clock())
+        self.movement[client_id] = state
+
+        # Рассылка с частотой по уровню детализации
+        return self._position_fanout(client_id, character, position, state)
+
+    def _needs_position_update(self, sent_state, state, interval, nearest):
+        """Нужно ли отправлять состояние получателю, у которого есть sent_state"""
+        if sent_state is None:
+            return True
+        # Смена движения (старт, стоп, поворот) ближнему уровню уходит сразу,
+        # дальним - не чаще их интервала
+        motion_changed = not sent_state.same_motion(state)
+        if motion_changed and nearest:
+            return True
+        elapsed = state.timestamp - sent_state.timestamp
+        if elapsed < interval:
+            return False
+        if motion_changed or elapsed >= self.movement_max_silence:
+            return True
+        return sent_state.error_to(state, state.timestamp) > self.movement_error_threshold
+
+    def _position_fanout(self, client_id, character, position, state):
+        """Рассылка позиции игрокам той же карты: уровни по расстоянию и экстраполяция"""
+        map_name = self._map_of(position)
+        tiers = self._get_update_tiers(map_name)
+        max_radius = tiers[-1][0]
+
+        broadcast_msg = None
+        responses = []
 
-    def _extract_position(self, message):
+        # Дальше последнего радиуса - только присутствие
+        nearby = self.entities.query_radius(map_name, float(position.get('x', 0)),
+                                            float(position.get('y', 0)), max_radius,
+                                            exclude=client_id)
+        nearest_radius = tiers[0][0]
+        for other_client_id, distance in nearby:
+            interval = next(tier_interval for radius, tier_interval in tiers if distance <= radius)
+            sent = self.last_sent_positions.setdefault(other_client_id, {})
+            if not self._needs_position_update(sent.get(client_id), state, interval,
+                                               distance <= nearest_radius):
+                continue
+            sent[client_id] = state
+
+            if broadcast_msg is None:
+                broadcast_msg = self._create_broadcast_message('position_update',
+                                                               character=character,
+                                                               position=position,
+                                                               velocity=state.velocity())
+            responses.append({'target': 'client', 'client_id': other_client_id,
+                              'data': broadcast_msg})
+
+        return responses or None
+
+    def _forget_sent_positions(self, client_id):
+        """Удаление истории рассылки позиций и модели движения клиента"""
+        self.movement.pop(client_id, None)
+        self.last_sent_positions.pop(client_id, None)
+        for sent in self.last_sent_positions.values():
+            sent.pop(client_id, None)
+
+    def _extract_position(self, payload):
         """Извлечение позиции из сообщения"""
-        if 'position' in message:
-            return message['position']
-        elif 'x' in message and 'y' in message:
-            return {'x': message.get('x', 0), 'y': message.get('y', 0),
-                    'z': message.get('z', 0)}
+        if payload.position is not None:
+            return payload.position.to_dict()
+        elif payload.x is not None and payload.y is not None:
+            return {'x': payload.x, 'y': payload.y,
+                    'z': payload.z if payload.z is not None else 0}
         return None
 
     def _create_broadcast_message(self, msg_type, character, **extra):
         """Создание широковещательного сообщения"""
         return {
             'type': msg_type,
-            'character_id': character['id'],
-            'character_name': character['name'],
-            'timestamp': time.time(),
+            'character_id': character.id,
+            'character_name': character.name,
+            'timestamp': self.clock(),
+            'server_tick': self.game_tick,
             'protocol': 'udp',
             **extra
         }
@@ -513,17 +911,23 @@ class GameLogic:
         }]
 
     # Удаление игрока
+    @locked
     def remove_player(self, client_id):
         """Удаление игрока при отключении"""
+        if client_id in self.account_backlog:
+            # Отключение после незавершенного входа - по порядку, после операции
+            self.account_backlog[client_id].append({'type': 'client_disconnect', 'client_id': client_id})
+            return None
+
         responses = []
 
         if client_id in self.active_characters:
             character = self.active_characters[client_id]
-            character_id = character['id']
+            character_id = character.id
 
             # Сохраняем данные
             self.db.update_character(character_id, {
-                'position': character.get('position', {'x': 0, 'y': 0, 'z': 0}),
+                'position': character.position,
                 'last_played': datetime.now().isoformat(),
                 'in_world': False
             })
@@ -550,10 +954,13 @@ class GameLogic:
             del self.active_characters[client_id]
 
         # Удаляем из индексов
-        for dict_to_clean in [self.character_clients, self.player_positions,
-                              self.last_position_updates, self.last_broadcast_updates,
-                              self.online_players]:
+        for dict_to_clean in [self.character_clients, self.online_players]:
             dict_to_clean.pop(client_id, None)
+        self.entities.remove(client_id)
+        self._forget_sent_positions(client_id)
+        self.dirty_characters.discard(client_id)
+        self.flushed_activity.pop(client_id, None)
+        self.chat.remove_client(client_id)
 
         if character_id in self.character_clients:
             del self.character_clients[character_id]
@@ -565,38 +972,85 @@ class GameLogic:
         return self._create_client_response(client_id, 'error',
                                             success=False, message=message, protocol='udp')
 
-    def handle_ping(self, client_id, message):
+    def handle_ping(self, client_id, payload):
         """Обработка пинга"""
         return self._create_client_response(client_id, 'pong',
-                                            timestamp=time.time(),
+                                            timestamp=self.clock(),
                                             server_time=self.world['time'],
                                             game_tick=self.game_tick,
                                             protocol='udp')
 
-    def handle_chat(self, client_id, message):
-        """Обработка чата"""
+    def handle_chat(self, client_id, payload):
+        """Обработка чата: рассылка только подписчикам канала"""
         if client_id not in self.active_characters:
             return self.error_response(client_id, 'Не в мире')
 
         character = self.active_characters[client_id]
+        channel = payload.channel or GLOBAL_CHANNEL
+
+        if channel == GLOBAL_CHANNEL:
+            recipients = self.chat.members(GLOBAL_CHANNEL)
+        elif channel == 'zone':
+            recipients = self.chat.members(self.chat.zone_channel(client_id))
+        elif channel == 'proximity':
+            position = character.position or {}
+            recipients = [other_client_id for other_client_id, _ in self.entities.query_radius(
+                self._map_of(position), float(position.get('x', 0)), float(position.get('y', 0)),
+                self.chat_proximity_radius)]
+        elif channel == 'whisper':
+            target_client_id = self.character_clients.get(payload.target_character_id)
+            if target_client_id not in self.active_characters:
+                return self.error_response(client_id, 'Игрок не найден')
+            recipients = (target_client_id,)
+        elif channel.startswith(PARTY_PREFIX):
+            if not self.chat.is_member(client_id, channel):
+                return self.error_response(client_id, 'Вы не в этом канале')
+            recipients = self.chat.members(channel)
+        else:
+            return self.error_response(client_id, f'Неизвестный канал: {channel}')
 
-        broadcast_msg = self._create_broadcast_message('chat_message',
-                                                       character=character,
-                                                       text=message.get('text', ''),
-                                                       channel=message.get('channel', 'global'))
+        chat_msg = self._create_broadcast_message('chat_message',
+                                                  character=character,
+                                                  text=payload.text,
+                                                  channel=channel)
+
+        # Отправитель свое сообщение уже показал
+        return [{'target': 'client', 'client_id': recipient_id, 'data': chat_msg}
+                for recipient_id in recipients if recipient_id != client_id]
+
+    def handle_chat_join(self, client_id, payload):
+        """Вход в канал группы"""
+        if client_id not in self.active_characters:
+            return self.error_response(client_id, 'Не в мире')
+
+        channel = payload.channel
+        if not channel.startswith(PARTY_PREFIX) or len(channel) == len(PARTY_PREFIX):
+            return self.error_response(client_id, f'Нельзя войти в канал: {channel}')
 
-        return [{'target': 'broadcast', 'data': broadcast_msg}]
+        self.chat.subscribe(client_id, channel)
+        return self._create_client_response(client_id, 'chat_channel_joined',
+                                            success=True, channel=channel,
+                                            members=len(self.chat.members(channel)))
+
+    def handle_chat_leave(self, client_id, payload):
+        """Выход из канала группы"""
+        channel = payload.channel
+        if not channel.startswith(PARTY_PREFIX):
+            return self.error_response(client_id, f'Нельзя выйти из канала: {channel}')
+
+        self.chat.unsubscribe(client_id, channel)
+        return self._create_client_response(client_id, 'chat_channel_left',
+                                            success=True, channel=channel)
 
     # Методы для совместимости
-    def handle_register(self, client_id, message):
-        username = message.get('username')
-        password = message.get('password')
-        email = message.get('email')
+    def handle_register(self, client_id, payload):
+        return self._register_done(client_id, payload, self._register_work(payload))
 
-        if not username or not password:
-            return self.error_response(client_id, 'Не указано имя пользователя или пароль')
+    def _register_work(self, payload):
+        return self.db.register_player(payload.username, payload.password, payload.email)
 
-        player_id, result = self.db.register_player(username, password, email)
+    def _register_done(self, client_id, payload, result):
+        player_id, result = result
 
         if player_id:
             return self._create_client_response(client_id, 'register_response',
@@ -605,21 +1059,25 @@ class GameLogic:
         else:
             return self.error_response(client_id, result)
 
-    def handle_login(self, client_id, message):
-        username = message.get('username')
-        password = message.get('password')
+    def handle_login(self, client_id, payload):
+        return self._login_done(client_id, payload, self._login_work(payload))
+
+    def _login_work(self, payload):
+        """Проверка пароля и загрузка персонажей игрока (в пуле потоков)"""
+        player_id, result = self.db.authenticate_player(payload.username, payload.password)
+        if not player_id:
+            return None, result, None
 
-        if not username or not password:
-            return self.error_response(client_id, 'Не указаны учетные данные')
+        self.db.increment_online_players()
+        return player_id, self.db.get_player(player_id), self.db.get_player_characters(player_id)
 
-        player_id, result = self.db.authenticate_player(username, password)
+    def _login_done(self, client_id, payload, result):
+        username = payload.username
+        player_id, player_data, characters = result
 
         if player_id:
             self.online_players[client_id] = player_id
-            self.db.increment_online_players()
 
-            player_data = self.db.get_player(player_id)
-            characters = self.db.get_player_characters(player_id)
             character_list = [{
                 'id': char['id'],
                 'name': char['name'],
@@ -639,30 +1097,29 @@ class GameLogic:
                                                 characters=character_list,
                                                 message=f'Добро пожаловать, {username}!')
         else:
-            return self.error_response(client_id, result)
+            # Неудачный вход: вместо данных игрока - текст ошибки
+            return self.error_response(client_id, player_data)
 
-    def handle_logout(self, client_id, message):
+    def handle_logout(self, client_id, payload):
         return self.remove_player(client_id)
 
-    def handle_create_character(self, client_id, message):
+    def handle_create_character(self, client_id, payload):
         player_id = self.online_players.get(client_id)
         if not player_id:
             return self.error_response(client_id, 'Не аутентифицирован')
 
-        character_data = message.get('character_data', {})
+        character_data = payload.character_data or {}
         character_id, character = self.db.create_character(player_id, character_data)
 
         return self._create_client_response(client_id, 'character_created',
                                             success=True, character_id=character_id,
                                             character_data=character)
 
-    def handle_select_character(self, client_id, message):
-        return self.handle_character_select(client_id, message)
+    def handle_select_character(self, client_id, payload):
+        return self.handle_character_select(client_id, payload)
 
-    def handle_delete_character(self, client_id, message):
-        character_id = message.get('character_id')
-        if not character_id:
-            return self.error_response(client_id, 'Не указан ID персонажа')
+    def handle_delete_character(self, client_id, payload):
+        character_id = payload.character_id
 
         success = self.db.delete_character(character_id)
         if success:
@@ -671,7 +1128,7 @@ class GameLogic:
         else:
             return self.error_response(client_id, 'Не удалось удалить персонажа')
 
-    def handle_get_characters(self, client_id, message):
+    def handle_get_characters(self, client_id, payload):
         player_id = self.online_players.get(client_id)
         if not player_id:
             return self.error_response(client_id, 'Не аутентифицирован')
@@ -689,36 +1146,39 @@ class GameLogic:
         return self._create_client_response(client_id, 'characters_list',
                                             characters=character_list)
 
-    def handle_character_action(self, client_id, message):
+    def handle_character_action(self, client_id, payload):
         # Базовая реализация для тестирования
         return self._create_client_response(client_id, 'action_response',
                                             success=True,
-                                            action=message.get('action'),
+                                            action=payload.action,
                                             message='Действие выполнено')
 
-    def handle_get_world_info(self, client_id, message):
+    def handle_get_world_info(self, client_id, payload):
         return self._create_client_response(client_id, 'world_info',
                                             world=self.world,
                                             online_players=len(self.active_characters))
 
-    def handle_save_character(self, client_id, message):
+    def handle_save_character(self, client_id, payload):
         if client_id not in self.active_characters:
             return self.error_response(client_id, 'Нет активного персонажа')
 
         character = self.active_characters[client_id]
-        self.db.update_character(character['id'], {
-            'position': character.get('position', {'x': 0, 'y': 0, 'z': 0}),
+        self.db.update_character(character.id, {
+            'position': character.position,
             'last_played': datetime.now().isoformat()
         })
+        self.dirty_characters.discard(client_id)
 
         return self._create_client_response(client_id, 'character_saved',
                                             success=True,
-                                            character_id=character['id'])
+                                            character_id=character.id)
 
+    @locked
     def get_player_count(self):
         """Получение количества онлайн игроков"""
         return len(self.active_characters)
 
+    @locked
     def get_world_state(self):
         """Получение текущего состояния мира"""
         return {
@@ -1747,6 +1747,82 @@ class ServerGUI:
                  bg=self.colors['bg'],
                  fg=self.colors['text']).pack(anchor='w', pady=(0, 20))
 
+        # Message handlers
+        tk.Label(frame,
+                 text="Message Handlers",
+                 font=('Segoe UI', 12, 'bold'),
+                 bg=self.colors['bg'],
+                 fg=self.colors['text']).pack(anchor='w', pady=(0, 5))
+
+        handler_columns = [
+            ('type', "Type", 160),
+            ('calls', "Calls", 80),
+            ('avg_ms', "Avg ms", 80),
+            ('max_ms', "Max ms", 80),
+            ('total_ms', "Total ms", 90),
+            ('responses', "Responses", 90),
+            ('bytes', "Bytes", 90),
+            ('errors', "Errors", 70)
+        ]
+        self.handler_stats_tree = ttk.Treeview(frame,
+                                               columns=[key for key, _, _ in handler_columns],
+                                               show='headings',
+                                               height=10)
+        for key, title, width in handler_columns:
+            self.handler_stats_tree.heading(key, text=title)
+            self.handler_stats_tree.column(key, width=width, anchor='w' if key == 'type' else 'e')
+        self.handler_stats_tree.pack(fill=tk.X, pady=(0, 15))
+
+        # Slow calls
+        self.slow_calls_label = tk.Label(frame,
+                                         text="Slow Calls",
+                                         font=('Segoe UI', 12, 'bold'),
+                                         bg=self.colors['bg'],
+                                         fg=self.colors['text'])
+        self.slow_calls_label.pack(anchor='w', pady=(0, 5))
+
+        slow_columns = [
+            ('time', "Time", 90),
+            ('type', "Type", 160),
+            ('client_id', "Client", 120),
+            ('duration_ms', "ms", 80),
+            ('request_bytes', "Request bytes", 110),
+            ('response_bytes', "Response bytes", 110),
+            ('responses', "Responses", 90)
+        ]
+        self.slow_calls_tree = ttk.Treeview(frame,
+                                            columns=[key for key, _, _ in slow_columns],
+                                            show='headings',
+                                            height=8)
+        for key, title, width in slow_columns:
+            self.slow_calls_tree.heading(key, text=title)
+            self.slow_calls_tree.column(key, width=width, anchor='w' if key in ('time', 'type', 'client_id') else 'e')
+        self.slow_calls_tree.pack(fill=tk.BOTH, expand=True)
+
+    def update_handler_stats(self, handler_stats):
+        """Refresh handler statistics tables"""
+        if not handler_stats or not hasattr(self, 'handler_stats_tree'):
+            return
+
+        self.handler_stats_tree.delete(*self.handler_stats_tree.get_children())
+        for item in handler_stats.get('handlers', []):
+            self.handler_stats_tree.insert('', tk.END, values=(
+                item['type'], item['calls'], f"{item['avg_ms']:.3f}", f"{item['max_ms']:.3f}",
+                f"{item['total_ms']:.1f}", item['responses'], item['bytes'], item['errors']
+            ))
+
+        self.slow_calls_label.config(
+            text=f"Slow Calls (>= {handler_stats.get('slow_threshold_ms', 0):.0f} ms)")
+        self.slow_calls_tree.delete(*self.slow_calls_tree.get_children())
+        for item in reversed(handler_stats.get('slow_calls', [])):
+            self.slow_calls_tree.insert('', tk.END, values=(
+                datetime.fromtimestamp(item['timestamp']).strftime('%H:%M:%S'),
+                item['type'], item['client_id'], f"{item['duration_ms']:.2f}",
+                item['request_bytes'],
+                item['response_bytes'] if item['response_bytes'] is not None else '-',
+                item['responses']
+            ))
+
     def create_logs_section(self):
         """Create Logs section"""
         frame = tk.Frame(self.content_frame, bg=self.colors['bg'])
@@ -2282,6 +2358,9 @@ class ServerGUI:
                 connections = len(self.server.network.clients)
                 self.stats_vars['connections'].set(str(connections))
 
+            if hasattr(self.server, 'handler_stats') and self.server.handler_stats:
+                self.update_handler_stats(self.server.handler_stats.snapshot())
+
     def save_config(self):
         try:
             with open('config.json', 'w') as f:
@@ -0,0 +1,105 @@
+"""
+Статистика обработчиков сообщений: вызовы, время, ответы, байты и медленные вызовы
+"""
+
+import threading
+import time
+from collections import deque
+
+import json_codec
+
+# Границы гистограммы длительности обработчиков (секунды)
+HANDLER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+def _payload_size(data):
+    """Размер сообщения в JSON (как его отправит сеть)"""
+    try:
+        return len(json_codec.dumps(data))
+    except (TypeError, ValueError):
+        return 0
+
+
+class HandlerStats:
+    """Счетчики по типам сообщений; медленные вызовы сохраняются с размерами сообщений"""
+
+    def __init__(self, metrics=None, slow_threshold=0.02, slow_samples=50, count_bytes=False):
+        self.metrics = metrics
+        self.slow_threshold = slow_threshold
+        self.count_bytes = count_bytes
+        self.lock = threading.Lock()  # снимок читает GUI из другого потока
+        self.handlers = {}  # тип -> [вызовы, время, макс. время, ответы, байты, ошибки]
+        self.slow_calls = deque(maxlen=slow_samples)
+
+    def record(self, msg_type, duration, message, responses, failed=False):
+        """Учет одного вызова обработчика"""
+        responses = responses or []
+        response_bytes = 0
+        if self.count_bytes:
+            # Рассылка - одно сообщение многим получателям: сериализуем его один раз
+            sizes = {}
+            for response in responses:
+                data = response.get('data')
+                size = sizes.get(id(data))
+                if size is None:
+                    size = sizes[id(data)] = _payload_size(data)
+                response_bytes += size
+
+        with self.lock:
+            entry = self.handlers.get(msg_type)
+            if entry is None:
+                entry = self.handlers[msg_type] = [0, 0.0, 0.0, 0, 0, 0]
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+            entry[3] += len(responses)
+            entry[4] += response_bytes
+            entry[5] += 1 if failed else 0
+
+            if duration >= self.slow_threshold:
+                self.slow_calls.append({
+                    'type': msg_type,
+                    'client_id': message.get('client_id'),
+                    'duration_ms': duration * 1000,
+                    'request_bytes': _payload_size(message),
+                    'response_bytes': response_bytes if self.count_bytes else None,
+                    'responses': len(responses),
+                    'timestamp': time.time(),
+                })
+
+        if self.metrics:
+            self.metrics.observe('handler_duration_seconds', duration,
+                                 buckets=HANDLER_BUCKETS, type=msg_type)
+            self.metrics.inc('handler_responses_total', len(responses), type=msg_type)
+            if response_bytes:
+                self.metrics.inc('handler_response_bytes_total', response_bytes, type=msg_type)
+            if failed:
+                self.metrics.inc('handler_errors_total', type=msg_type)
+
+    def snapshot(self):
+        """Статистика для get_server_info: обработчики по убыванию общего времени"""
+        with self.lock:
+            handlers = [{
+                'type': msg_type,
+                'calls': calls,
+                'total_ms': total * 1000,
+                'avg_ms': total / calls * 1000 if calls else 0.0,
+                'max_ms': longest * 1000,
+                'responses': responses,
+                'bytes': response_bytes,
+                'errors': errors,
+            } for msg_type, (calls, total, longest, responses, response_bytes, errors)
+                in self.handlers.items()]
+            slow_calls = list(self.slow_calls)
+
+        handlers.sort(key=lambda item: item['total_ms'], reverse=True)
+        return {
+            'handlers': handlers,
+            'slow_calls': slow_calls,
+            'slow_threshold_ms': self.slow_threshold * 1000,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.handlers.clear()
+            self.slow_calls.clear()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сервера и клиентов в одном процессе без сокетов: ServerCore и NetworkClient
+работают через петлю в памяти (transport.LoopbackNetwork) с заданными задержкой,
+джиттером и потерями. Клиенты регистрируются, входят в мир и шлют позиции и ping.
+
+Использование:
+    python loopback_bench.py [--clients 50] [--duration 10] [--rate 10]
+                             [--latency 0] [--jitter 0] [--loss 0] [--seed 0] [--json]
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from transport import LoopbackNetwork
+
+# NetworkClient берем из клиента (общие модули - одинаковые копии)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Client'))
+
+SERVER_HOST = 'loopback'
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _summary_ms(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': _percentile(values, 0.50) * 1000,
+        'p95_ms': _percentile(values, 0.95) * 1000,
+        'p99_ms': _percentile(values, 0.99) * 1000,
+        'max_ms': values[-1] * 1000 if values else 0.0,
+    }
+
+
+class BenchClient:
+    """Клиент бенчмарка: NetworkClient и поток приема"""
+
+    def __init__(self, index, network, port, spread):
+        from network_client import NetworkClient
+
+        self.index = index
+        self.client = NetworkClient(SERVER_HOST, port, transport_factory=network.endpoint)
+        self.client.receive_timeout = 0.1
+        self.username = f"bench_{index}"
+        self.character_id = f"bench_char_{index}"
+        # Клиенты стоят на окружности - соседи получают позиции друг друга
+        angle = 2 * math.pi * index / max(1, spread)
+        self.center = (100 + spread * math.cos(angle), 100 + spread * math.sin(angle))
+
+        self.responses = {}  # тип ответа -> threading.Event
+        self.received = Counter()
+        self.sent = 0
+        self.joined_at = None
+        self.ping_sent_at = None
+        self.rtts = []
+        self.position_delays = []  # от отметки сервера до приема
+        self.running = True
+        self.thread = threading.Thread(target=self.receive_loop, daemon=True,
+                                       name=f"bench_client_{index}")
+
+    def start(self):
+        self.client.connect()
+        self.thread.start()
+
+    def send(self, message):
+        if self.client.send(message):
+            self.sent += 1
+
+    def request(self, message, response_type, timeout):
+        """Отправка и ожидание ответа нужного типа (повтор при потере)"""
+        event = self.responses.setdefault(response_type, threading.Event())
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.send(dict(message))
+            if event.wait(min(1.0, max(0.0, deadline - time.monotonic()))):
+                return True
+        return False
+
+    def receive_loop(self):
+        while self.running:
+            message = self.client.receive()
+            if not message:
+                continue
+            received_at = time.time()
+            msg_type = message.get('type')
+            self.received[msg_type] += 1
+
+            if msg_type == 'pong' and self.ping_sent_at is not None:
+                self.rtts.append(time.perf_counter() - self.ping_sent_at)
+                self.ping_sent_at = None
+            elif msg_type == 'position_update' and isinstance(message.get('timestamp'), (int, float)):
+                self.position_delays.append(max(0.0, received_at - message['timestamp']))
+
+            event = self.responses.get(msg_type)
+            if event:
+                event.set()
+
+    def login_and_join(self, timeout):
+        """Регистрация, вход и вход в мир"""
+        credentials = {'username': self.username, 'password': 'bench'}
+        if not self.request({'type': 'register', **credentials}, 'register_response', timeout):
+            return False
+        if not self.request({'type': 'login', **credentials}, 'login_response', timeout):
+            return False
+        started = time.perf_counter()
+        joined = self.request({
+            'type': 'join_world',
+            'character_id': self.character_id,
+            'character_name': self.username,
+            'position': {'x': self.center[0], 'y': self.center[1], 'z': 0}
+        }, 'world_joined', timeout)
+        if joined:
+            self.joined_at = time.perf_counter() - started
+        return joined
+
+    def move(self, phase):
+        """Движение по малой окружности вокруг своей точки"""
+        x = self.center[0] + 3 * math.cos(phase)
+        y = self.center[1] + 3 * math.sin(phase)
+        self.send({'type': 'position_update', 'position': {'x': x, 'y': y, 'z': 0},
+                   'velocity': {'x': -3 * math.sin(phase), 'y': 3 * math.cos(phase), 'z': 0}})
+
+    def ping(self):
+        if self.ping_sent_at is None or time.perf_counter() - self.ping_sent_at > 2.0:
+            self.ping_sent_at = time.perf_counter()
+            self.client.test_connection()
+            self.sent += 1
+
+    def stop(self):
+        self.client.disconnect()
+        self.running = False
+        self.thread.join(timeout=1)
+
+
+def run_benchmark(clients=50, duration=10.0, rate=10.0, latency=0.0, jitter=0.0, loss=0.0,
+                  seed=0, config_file='config.json', verbose=False):
+    """Прогон бенчмарка; возвращает отчет"""
+    from server_core import ServerCore
+
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='dpp2_bench_')
+    config.setdefault('database', {})['path'] = os.path.join(workdir, 'bench_db.json')
+    config.setdefault('metrics', {})['enabled'] = False
+    config.setdefault('network', {}).setdefault('capture', {})['enabled'] = False
+    server = config.setdefault('server', {})
+    server['host'] = SERVER_HOST
+    server['max_players'] = max(server.get('max_players', 100), clients)
+    bench_config = os.path.join(workdir, 'config.json')
+    with open(bench_config, 'w') as f:
+        json.dump(config, f)
+
+    random.seed(seed)
+    network = LoopbackNetwork(latency=latency, jitter=jitter, loss=loss, seed=seed)
+    tick_durations = []
+    bench_clients = []
+    joined = 0
+
+    output = sys.stdout if verbose else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(output):
+            core = ServerCore(bench_config, transport_factory=network.endpoint)
+
+            # Замер каждого тика сервера
+            process_tick = core._process_tick
+
+            def timed_tick(tick_counter):
+                started = time.perf_counter()
+                process_tick(tick_counter)
+                tick_durations.append(time.perf_counter() - started)
+            core._process_tick = timed_tick
+
+            if not core.start():
+                raise RuntimeError('Сервер не запустился')
+
+            spread = max(10.0, clients * 2.0)
+            bench_clients = [BenchClient(i, network, server['port'], spread) for i in range(clients)]
+            for client in bench_clients:
+                client.start()
+
+            # Вход всех клиентов параллельно
+            join_threads = []
+            results = []
+            for client in bench_clients:
+                thread = threading.Thread(target=lambda c=client: results.append(c.login_and_join(10.0)),
+                                          daemon=True)
+                thread.start()
+                join_threads.append(thread)
+            for thread in join_threads:
+                thread.join()
+            joined = sum(1 for result in results if result)
+
+            # Основная фаза: позиции с частотой rate и ping раз в секунду
+            tick_durations.clear()
+            for client in bench_clients:
+                client.received.clear()
+                client.sent = 0
+            interval = 1.0 / rate
+            started = time.perf_counter()
+            next_send = started
+            step = 0
+            while time.perf_counter() - started < duration:
+                phase = step * interval
+                for client in bench_clients:
+                    if client.joined_at is not None:
+                        client.move(phase + client.index)
+                if step % max(1, int(rate)) == 0:
+                    for client in bench_clients:
+                        client.ping()
+                step += 1
+                next_send += interval
+                time.sleep(max(0.0, next_send - time.perf_counter()))
+            elapsed = time.perf_counter() - started
+
+            for client in bench_clients:
+                client.stop()
+            handler_stats = core.handler_stats.snapshot() if core.handler_stats else {}
+            network_stats = core.network.get_stats()
+            core.stop()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    received = Counter()
+    for client in bench_clients:
+        received.update(client.received)
+    sent = sum(client.sent for client in bench_clients)
+    ticks = _summary_ms(tick_durations)
+    return {
+        'clients': clients,
+        'joined': joined,
+        'duration_s': elapsed,
+        'rate_hz': rate,
+        'link': {'latency_ms': latency * 1000, 'jitter_ms': jitter * 1000, 'loss': loss, 'seed': seed},
+        'join_ms': _summary_ms([c.joined_at for c in bench_clients if c.joined_at is not None]),
+        'rtt_ms': _summary_ms([rtt for c in bench_clients for rtt in c.rtts]),
+        'position_delay_ms': _summary_ms([d for c in bench_clients for d in c.position_delays]),
+        'client_messages_sent': sent,
+        'client_messages_received': sum(received.values()),
+        'received_by_type': dict(received.most_common(10)),
+        'ticks': ticks,
+        'tick_total_ms': sum(tick_durations) * 1000,
+        'server_packets_received': network_stats.get('packets_received', 0),
+        'server_packets_sent': network_stats.get('packets_sent', 0),
+        'loopback': network.get_stats(),
+        'handlers': handler_stats.get('handlers', [])[:10],
+    }
+
+
+def print_report(report):
+    """Вывод отчета бенчмарка"""
+    link = report['link']
+    print(f"Клиентов: {report['clients']} (в мире: {report['joined']}), "
+          f"{report['duration_s']:.1f} с, позиций {report['rate_hz']:g} Гц")
+    print(f"Канал: задержка {link['latency_ms']:g} мс, джиттер {link['jitter_ms']:g} мс, "
+          f"потери {link['loss'] * 100:g}%, зерно {link['seed']}")
+    for title, key in (('Вход в мир', 'join_ms'), ('RTT ping', 'rtt_ms'),
+                       ('Доставка позиций', 'position_delay_ms'), ('Тики', 'ticks')):
+        item = report[key]
+        print(f"{title}: {item['count']} шт, p50 {item['p50_ms']:.3f} мс, p95 {item['p95_ms']:.3f} мс, "
+              f"p99 {item['p99_ms']:.3f} мс, макс {item['max_ms']:.3f} мс")
+    print(f"Время тиков всего: {report['tick_total_ms']:.1f} мс")
+    print(f"Клиенты: отправлено {report['client_messages_sent']}, "
+          f"получено {report['client_messages_received']}")
+    print(f"Сервер: принято пакетов {report['server_packets_received']}, "
+          f"отправлено {report['server_packets_sent']}")
+    loopback = report['loopback']
+    print(f"Петля: датаграмм {loopback['sent']}, потеряно {loopback['lost']}, "
+          f"без получателя {loopback['unreachable']}")
+    if report['received_by_type']:
+        print("Получено клиентами по типам:")
+        for msg_type, count in report['received_by_type'].items():
+            print(f"  {msg_type}: {count}")
+    if report['handlers']:
+        print("Обработчики по общему времени:")
+        for item in report['handlers']:
+            print(f"  {item['type']}: вызовов {item['calls']}, всего {item['total_ms']:.1f} мс, "
+                  f"среднее {item['avg_ms']:.3f} мс, макс {item['max_ms']:.3f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк сервера и клиентов через петлю в памяти')
+    parser.add_argument('--clients', type=int, default=50, help='число клиентов')
+    parser.add_argument('--duration', type=float, default=10.0, help='длительность основной фазы, с')
+    parser.add_argument('--rate', type=float, default=10.0, help='частота отправки позиций, Гц')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка в одну сторону, мс')
+    parser.add_argument('--jitter', type=float, default=0.0, help='джиттер (добавка 0..N), мс')
+    parser.add_argument('--loss', type=float, default=0.0, help='доля потерянных датаграмм (0..1)')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных чисел')
+    parser.add_argument('--config', default='config.json', help='конфигурация сервера')
+    parser.add_argument('--verbose', action='store_true', help='показывать вывод сервера и клиентов')
+    parser.add_argument('--json', action='store_true', help='отчет в формате JSON')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.clients, args.duration, args.rate, args.latency / 1000.0,
+                           args.jitter / 1000.0, args.loss, args.seed, args.config, args.verbose)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
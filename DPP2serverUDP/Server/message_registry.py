@@ -0,0 +1,308 @@
+"""
+Реестр входящих сообщений UDP сервера: типы, схемы и скомпилированные декодеры.
+Декодер проверяет сообщение по dataclass-схеме и возвращает экземпляр схемы -
+обработчик получает типизированную полезную нагрузку, исходный словарь не меняется.
+"""
+
+import dataclasses
+import typing
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+
+class MessageType(Enum):
+    """Типы входящих сообщений.
+    Свой список, а не MessageType из DPP2serverTCP/Shared/protocol.py: тот описывает протокол
+    неиспользуемого TCP сервера (connect, movement, emote...) и не импортируется из UDP сервера"""
+    # Подключение
+    CLIENT_INIT = "client_init"
+    CLIENT_DISCONNECT = "client_disconnect"
+    HEARTBEAT = "heartbeat"
+
+    # Аккаунт и персонажи
+    AUTH = "auth"
+    REGISTER = "register"
+    LOGIN = "login"
+    LOGOUT = "logout"
+    CHARACTER_SELECT = "character_select"
+    SELECT_CHARACTER = "select_character"
+    CREATE_CHARACTER = "create_character"
+    DELETE_CHARACTER = "delete_character"
+    GET_CHARACTERS = "get_characters"
+    SAVE_CHARACTER = "save_character"
+
+    # Игровой мир
+    JOIN_WORLD = "join_world"
+    LEAVE_WORLD = "leave_world"
+    POSITION_UPDATE = "position_update"
+    CHARACTER_MOVE = "character_move"
+    CHARACTER_ACTION = "character_action"
+    GET_WORLD_INFO = "get_world_info"
+    SKIN_UPDATE = "skin_update"
+    REQUEST_SKIN = "request_skin"
+    GIFCT_ACTIVATION = "gifct_activation"
+
+    # Чат
+    CHAT_MESSAGE = "chat_message"
+    CHAT_JOIN = "chat_join"
+    CHAT_LEAVE = "chat_leave"
+
+    # Системные
+    PING = "ping"
+    TEST = "test"
+
+
+# Схемы полезной нагрузки
+@dataclass
+class Position:
+    """Позиция персонажа"""
+    x: float
+    y: float
+    z: float = 0.0
+    map: Optional[str] = None
+    zone: Optional[str] = None
+
+    def to_dict(self):
+        """Словарь позиции для записи персонажа и рассылки (без пустых map и zone)"""
+        position = {'x': self.x, 'y': self.y, 'z': self.z}
+        if self.map is not None:
+            position['map'] = self.map
+        if self.zone is not None:
+            position['zone'] = self.zone
+        return position
+
+
+@dataclass
+class Velocity:
+    """Скорость персонажа (единиц в секунду)"""
+    x: float = 0.0
+    y: float = 0.0
+    z: float = 0.0
+
+    def to_dict(self):
+        return {'x': self.x, 'y': self.y, 'z': self.z}
+
+
+@dataclass
+class AuthPayload:
+    username: str
+
+
+@dataclass
+class RegisterPayload:
+    username: str
+    password: str
+    email: Optional[str] = None
+
+
+@dataclass
+class LoginPayload:
+    username: str
+    password: str
+
+
+@dataclass
+class CharacterSelectPayload:
+    character_id: str
+    character_data: Optional[dict] = None
+
+
+@dataclass
+class CreateCharacterPayload:
+    character_data: Optional[dict] = None
+
+
+@dataclass
+class DeleteCharacterPayload:
+    character_id: str
+
+
+@dataclass
+class JoinWorldPayload:
+    character_id: str
+    character_name: Optional[str] = None
+    character_type: Optional[str] = None
+    position: Optional[Position] = None
+
+
+@dataclass
+class PositionUpdatePayload:
+    position: Optional[Position] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    z: Optional[float] = None
+    velocity: Optional[Velocity] = None
+    input: Optional[dict] = None
+
+
+@dataclass
+class CharacterActionPayload:
+    action: Optional[str] = None
+
+
+@dataclass
+class SkinUpdatePayload:
+    skin_data: Optional[dict] = None
+
+
+@dataclass
+class RequestSkinPayload:
+    target_character_id: str
+
+
+@dataclass
+class GifctActivationPayload:
+    gifct_id: Optional[str] = None
+    gifct_data: Optional[dict] = None
+
+
+@dataclass
+class ChatPayload:
+    text: str = ''
+    channel: Optional[str] = None
+    target_character_id: Optional[str] = None
+
+
+@dataclass
+class ChatChannelPayload:
+    channel: str
+
+
+MESSAGE_SCHEMAS = {
+    MessageType.AUTH: AuthPayload,
+    MessageType.REGISTER: RegisterPayload,
+    MessageType.LOGIN: LoginPayload,
+    MessageType.CHARACTER_SELECT: CharacterSelectPayload,
+    MessageType.SELECT_CHARACTER: CharacterSelectPayload,
+    MessageType.CREATE_CHARACTER: CreateCharacterPayload,
+    MessageType.DELETE_CHARACTER: DeleteCharacterPayload,
+    MessageType.JOIN_WORLD: JoinWorldPayload,
+    MessageType.POSITION_UPDATE: PositionUpdatePayload,
+    MessageType.CHARACTER_MOVE: PositionUpdatePayload,
+    MessageType.CHARACTER_ACTION: CharacterActionPayload,
+    MessageType.SKIN_UPDATE: SkinUpdatePayload,
+    MessageType.REQUEST_SKIN: RequestSkinPayload,
+    MessageType.GIFCT_ACTIVATION: GifctActivationPayload,
+    MessageType.CHAT_MESSAGE: ChatPayload,
+    MessageType.CHAT_JOIN: ChatChannelPayload,
+    MessageType.CHAT_LEAVE: ChatChannelPayload,
+}
+
+
+class MessageEntry:
+    """Скомпилированная запись реестра: декодер и обработчик"""
+
+    __slots__ = ('message_type', 'decode', 'handler')
+
+    def __init__(self, message_type, decode, handler):
+        self.message_type = message_type
+        self.decode = decode
+        self.handler = handler
+
+
+class MessageRegistry:
+    """Компиляция декодеров по схемам и таблица диспетчеризации"""
+
+    def __init__(self, schemas=None):
+        self.schemas = MESSAGE_SCHEMAS if schemas is None else schemas
+        self.decoders: Dict[MessageType, Callable[[dict], tuple]] = {}
+
+    def compile(self, handlers: Dict[MessageType, Callable]) -> Dict[str, MessageEntry]:
+        """Таблица тип сообщения -> запись с декодером и обработчиком"""
+        table = {}
+        for message_type, handler in handlers.items():
+            decode = self.decoder_for(message_type)
+            table[message_type.value] = MessageEntry(message_type, decode, handler)
+        return table
+
+    def decoder_for(self, message_type: MessageType):
+        """Декодер для типа сообщения (компилируется один раз)"""
+        if message_type not in self.decoders:
+            schema = self.schemas.get(message_type)
+            self.decoders[message_type] = _compile_schema(schema) if schema else _no_payload
+        return self.decoders[message_type]
+
+    def decode(self, message: dict) -> tuple:
+        """(полезная нагрузка, ошибка) для сообщения известного типа; неизвестные - (None, None)"""
+        try:
+            message_type = MessageType(message.get('type'))
+        except ValueError:
+            return None, None
+        return self.decoder_for(message_type)(message)
+
+
+def _no_payload(message):
+    return None, None
+
+
+def _compile_schema(schema, prefix='') -> Callable[[dict], tuple]:
+    """Сборка декодера по полям dataclass-схемы; prefix - путь вложенного поля в ошибках"""
+    hints = typing.get_type_hints(schema)
+    checks = []
+
+    for field in dataclasses.fields(schema):
+        field_type, optional = _unwrap_optional(hints[field.name])
+        has_default = field.default is not dataclasses.MISSING
+        required = not optional and not has_default
+        path = prefix + field.name
+        checks.append((field.name, path, required, _compile_type_check(field_type, path)))
+
+    checks = tuple(checks)
+
+    def decode(message):
+        values = {}
+        for name, path, required, check in checks:
+            value = message.get(name)
+            if value is None or (required and value == ''):
+                if required:
+                    return None, f'Не указано поле {path}'
+                continue  # значение по умолчанию из схемы
+
+            value, error = check(value)
+            if error:
+                return None, error
+            values[name] = value
+        return schema(**values), None
+
+    return decode
+
+
+def _unwrap_optional(hint):
+    if typing.get_origin(hint) is typing.Union:
+        args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return hint, False
+
+
+def _compile_type_check(field_type, path) -> Callable[[Any], tuple]:
+    """Проверка и нормализация значения одного поля: (значение, ошибка)"""
+    invalid = f'Неверное значение поля {path}'
+
+    if dataclasses.is_dataclass(field_type):
+        nested = _compile_schema(field_type, path + '.')
+
+        def check_nested(value):
+            if not isinstance(value, dict):
+                return value, invalid
+            return nested(value)
+        return check_nested
+
+    if field_type is float:
+        def check_float(value):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return value, invalid
+            return float(value), None
+        return check_float
+
+    if field_type is int:
+        def check_int(value):
+            if isinstance(value, bool) or not isinstance(value, int):
+                return value, invalid
+            return value, None
+        return check_int
+
+    def check_instance(value):
+        return value, None if isinstance(value, field_type) else invalid
+    return check_instance
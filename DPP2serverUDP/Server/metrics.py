@@ -0,0 +1,211 @@
+"""
+Метрики UDP сервера в текстовом формате Prometheus
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class MetricsRegistry:
+    """Потокобезопасное хранилище счетчиков, gauge-значений и гистограмм"""
+
+    def __init__(self, prefix='dpp2'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket_counts, sum, count]
+        self.buckets = {}  # name -> границы бакетов
+        self.descriptions = {}  # name -> help
+        self.collectors = []  # функции, вызываемые перед выдачей
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, text):
+        """Описание метрики (строка # HELP)"""
+        self.descriptions[name] = text
+
+    def add_collector(self, collector):
+        """Регистрация функции, обновляющей gauge-значения перед выдачей"""
+        self.collectors.append(collector)
+
+    def inc(self, name, value=1, **labels):
+        """Увеличение счетчика"""
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Установка gauge-значения"""
+        key = self._key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Добавление наблюдения в гистограмму"""
+        key = self._key(name, labels)
+        with self.lock:
+            bounds = self.buckets.setdefault(name, tuple(buckets))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = [[0] * len(bounds), 0.0, 0]
+                self.histograms[key] = histogram
+            index = bisect.bisect_left(bounds, value)
+            if index < len(bounds):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def get_counter(self, name, **labels):
+        """Текущее значение счетчика"""
+        with self.lock:
+            return self.counters.get(self._key(name, labels), 0)
+
+    # Выдача
+    def render(self):
+        """Формирование текста в формате Prometheus"""
+        for collector in list(self.collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"[METRICS] Ошибка сборщика метрик: {e}")
+
+        lines = []
+        with self.lock:
+            self._render_simple(lines, self.counters, 'counter')
+            self._render_simple(lines, self.gauges, 'gauge')
+            self._render_histograms(lines)
+        lines.append('')
+        return '\n'.join(lines)
+
+    def _full_name(self, name):
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    def _header(self, lines, name, metric_type):
+        full_name = self._full_name(name)
+        if name in self.descriptions:
+            lines.append(f"# HELP {full_name} {self.descriptions[name]}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+
+    def _render_simple(self, lines, values, metric_type):
+        for name in sorted({name for name, _ in values}):
+            self._header(lines, name, metric_type)
+            for (metric_name, labels), value in sorted(values.items()):
+                if metric_name == name:
+                    lines.append(f"{self._full_name(name)}{_format_labels(labels)} {_format_value(value)}")
+
+    def _render_histograms(self, lines):
+        for name in sorted({name for name, _ in self.histograms}):
+            self._header(lines, name, 'histogram')
+            full_name = self._full_name(name)
+            bounds = self.buckets[name]
+            for (metric_name, labels), (counts, total, count) in sorted(self.histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(bounds, counts):
+                    cumulative += bucket_count
+                    bucket_labels = labels + (('le', _format_value(bound)),)
+                    lines.append(f"{full_name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                inf_labels = labels + (('le', '+Inf'),)
+                lines.append(f"{full_name}_bucket{_format_labels(inf_labels)} {count}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """HTTP обработчик для /metrics"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Запросы скрейпера не логируем
+        pass
+
+
+class MetricsServer:
+    """Локальный HTTP эндпоинт метрик в фоновом потоке"""
+
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """Запуск HTTP сервера метрик"""
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), _MetricsRequestHandler)
+            self.httpd.daemon_threads = True
+            self.httpd.registry = self.registry
+            self.port = self.httpd.server_address[1]
+
+            self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="Metrics")
+            self.thread.start()
+
+            print(f"[METRICS] Метрики доступны на http://{self.host}:{self.port}/metrics")
+            return True
+        except Exception as e:
+            print(f"[METRICS] Ошибка запуска эндпоинта метрик: {e}")
+            self.httpd = None
+            return False
+
+    def stop(self):
+        """Остановка HTTP сервера метрик"""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+class Timer:
+    """Контекстный менеджер для замера длительности в гистограмму"""
+
+    def __init__(self, registry, name, **labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.registry:
+            self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
@@ -0,0 +1,53 @@
+"""
+Модель движения персонажей для экстраполяции (dead reckoning)
+"""
+
+import math
+
+# Разница скоростей, которая считается сменой движения (единиц/с)
+VELOCITY_EPSILON = 0.01
+
+
+class MovementState:
+    """Позиция, скорость и ввод персонажа на момент получения"""
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, vx=0.0, vy=0.0, vz=0.0, timestamp=0.0, input_state=None):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.vx = vx
+        self.vy = vy
+        self.vz = vz
+        self.timestamp = timestamp
+        self.input_state = input_state
+
+    @classmethod
+    def from_message(cls, position, velocity, input_state, timestamp):
+        velocity = velocity or {}
+        return cls(position.get('x', 0.0), position.get('y', 0.0), position.get('z', 0.0),
+                   velocity.get('x', 0.0), velocity.get('y', 0.0), velocity.get('z', 0.0),
+                   timestamp, input_state)
+
+    def predict(self, now):
+        """Экстраполированная позиция на момент now"""
+        dt = max(0.0, now - self.timestamp)
+        return self.x + self.vx * dt, self.y + self.vy * dt, self.z + self.vz * dt
+
+    def error_to(self, actual, now):
+        """Расстояние между экстраполяцией и фактическим состоянием"""
+        x, y, z = self.predict(now)
+        return math.sqrt((actual.x - x) ** 2 + (actual.y - y) ** 2 + (actual.z - z) ** 2)
+
+    def same_motion(self, other):
+        """Та же скорость и тот же ввод"""
+        return (abs(self.vx - other.vx) < VELOCITY_EPSILON
+                and abs(self.vy - other.vy) < VELOCITY_EPSILON
+                and abs(self.vz - other.vz) < VELOCITY_EPSILON
+                and self.input_state == other.input_state)
+
+    def is_moving(self):
+        return (abs(self.vx) >= VELOCITY_EPSILON or abs(self.vy) >= VELOCITY_EPSILON
+                or abs(self.vz) >= VELOCITY_EPSILON)
+
+    def velocity(self):
+        return {'x': self.vx, 'y': self.vy, 'z': self.vz}
@@ -1,35 +1,39 @@
-import socket
 import threading
-import json
 import time
-import select
+import secrets
 from datetime import datetime
 from typing import Dict, Tuple, Optional, Any
 
+import json_codec
+from capture import CaptureWriter
+from packet_codec import PacketEncoder, PacketReassembler
+from transport import UDPTransport
+
+# Сообщения поддержания соединения, на которые отвечает сам UDP сервер
+KEEPALIVE_TYPES = ('heartbeat', 'ping')
+
 
 class UDPClientConnection:
-    """Клиентское соединение для UDP"""
+    """Клиентское соединение для UDP (только поля, которые читает сервер)"""
+
+    __slots__ = ('address', 'id', 'session_token', 'username', 'player_id', 'last_activity',
+                 'authenticated', 'ping', 'character_id', 'in_world')
 
-    def __init__(self, address, client_id):
+    def __init__(self, address, client_id, session_token=None):
         self.address = address
         self.id = client_id
+        self.session_token = session_token
         self.username = f"Player_{client_id}"
         self.player_id = None
         self.last_activity = time.time()
         self.authenticated = False
         self.ping = 0
-        self.packet_counter = 0
-        self.last_packet_time = 0
-        self.packet_loss = 0
-        self.connected = True
         self.character_id = None
-        self.character_data = {}
         self.in_world = False
 
     def update_activity(self):
         """Обновление времени последней активности"""
         self.last_activity = time.time()
-        self.last_packet_time = time.time()
 
     def is_timed_out(self, timeout=10):
         """Проверка таймаута соединения"""
@@ -42,21 +46,28 @@ class UDPClientConnection:
 class UDPServer:
     """UDP сервер для игры"""
 
-    def __init__(self, host='0.0.0.0', port=5555, max_clients=100):
+    def __init__(self, host='0.0.0.0', port=5555, max_clients=100, metrics=None, transport_factory=None):
         self.host = host
         self.port = port
         self.max_clients = max_clients
         self.running = False
-        self.socket = None
+        # Транспорт создается при запуске: UDP сокет или петля в памяти (transport.py)
+        self.transport_factory = transport_factory
+        self.transport = None
+        self.metrics = metrics
 
         # Структуры данных
         self.clients: Dict[Tuple[str, int], UDPClientConnection] = {}
         self.clients_by_id: Dict[int, UDPClientConnection] = {}
+        self.sessions: Dict[str, UDPClientConnection] = {}  # session_token -> клиент
+        # Таблицы клиентов меняют потоки приема и очистки, читают тик и GUI
+        self.clients_lock = threading.RLock()
 
         # Очереди
         self.incoming_queue = []
         self.outgoing_queue = []
         self.queue_lock = threading.Lock()
+        self.message_event = threading.Event()  # есть входящие сообщения
 
         # Счетчики и настройки
         self.client_counter = 1
@@ -66,6 +77,18 @@ class UDPServer:
         self.packet_timeout = 2.0
         self.client_timeout = 30.0
         self.max_packet_size = 1400
+        self.stats_lock = threading.Lock()  # packets_sent пишут потоки отправки и приема
+
+        # Сжатие и фрагментация больших сообщений
+        self.encoder = PacketEncoder(self.max_packet_size)
+        self.reassembler = PacketReassembler()
+
+        # Запись входящих сообщений для воспроизведения
+        self.capture = None
+
+        # Состояние игры для ответов на heartbeat/ping (обновляет ServerCore)
+        self.server_tick = 0
+        self.world_time = None
 
         # Потоки
         self.receive_thread = None
@@ -75,10 +98,10 @@ class UDPServer:
     def start(self):
         """Запуск UDP сервера"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.socket.bind((self.host, self.port))
-            self.socket.setblocking(False)
+            if self.transport_factory:
+                self.transport = self.transport_factory((self.host, self.port))
+            else:
+                self.transport = UDPTransport((self.host, self.port), reuse_address=True)
 
             self.running = True
             self._start_threads()
@@ -117,11 +140,18 @@ class UDPServer:
             'timestamp': time.time()
         }
 
-        for client in list(self.clients.values()):
-            self.send_to_address(client.address, disconnect_msg)
+        with self.clients_lock:
+            addresses = [client.address for client in self.clients.values()]
+        for address in addresses:
+            self.send_to_address(address, disconnect_msg)
+
+        if self.transport:
+            self.transport.close()
+
+        self.stop_capture()
 
-        if self.socket:
-            self.socket.close()
+        # Будим главный цикл, если он в простое
+        self.message_event.set()
 
         print(f"[UDP SERVER] Сервер остановлен")
 
@@ -131,9 +161,10 @@ class UDPServer:
 
         while self.running:
             try:
-                ready_to_read, _, _ = select.select([self.socket], [], [], 0.1)
-                if ready_to_read:
-                    self._receive_packet()
+                self._receive_packet()
+
+                # Сборщик фрагментов работает только в потоке приема
+                self.reassembler.cleanup()
             except Exception as e:
                 if self.running:
                     print(f"[UDP SERVER] Ошибка в цикле приема: {e}")
@@ -141,53 +172,94 @@ class UDPServer:
     def _receive_packet(self):
         """Прием и обработка одного пакета"""
         try:
-            data, address = self.socket.recvfrom(self.max_packet_size)
-            if data:
+            packet = self.transport.recvfrom(self.max_packet_size, timeout=0.1)
+            if packet and packet[0]:
+                data, address = packet
                 self.packets_received += 1
                 self._process_packet_data(data, address)
-        except socket.error as e:
+        except OSError as e:
             if self.running:
                 print(f"[UDP SERVER] Ошибка приема: {e}")
 
     def _process_packet_data(self, data: bytes, address: Tuple[str, int]):
         """Обработка данных пакета"""
         try:
-            json_str = data.decode('utf-8', errors='ignore').strip()
-            if not json_str:
+            payload = self.reassembler.feed(data, address)
+            if payload is None:
                 return
 
-            message = json.loads(json_str)
+            if not payload.strip():
+                return
+
+            message = json_codec.loads(payload)
             message['client_address'] = address
+            session_token = message.pop('session_token', None)
+            msg_type = message.get('type', 'unknown')
+
+            if self.metrics:
+                self.metrics.inc('udp_packets_received_total', type=str(msg_type))
+                self.metrics.inc('udp_bytes_received_total', len(payload), type=str(msg_type))
 
-            client = self.get_or_create_client(address)
+            client = self.get_or_create_client(address, session_token)
             if client:
                 client.update_activity()
                 message['client_id'] = client.id
 
-                with self.queue_lock:
-                    self.incoming_queue.append(message)
+                # Keepalive отвечаем сразу, без очереди и тика; в запись они все равно попадают
+                if msg_type in KEEPALIVE_TYPES:
+                    capture = self.capture
+                    if capture:
+                        capture.write(message)
+                    self._answer_keepalive(client, msg_type)
+                    return
+
+                self.add_to_incoming_queue(message)
 
                 # Логирование (только для отладки)
-                msg_type = message.get('type', 'unknown')
-                if msg_type not in ['heartbeat', 'ping']:
-                    print(f"[UDP SERVER] Получено от {client.id}: {msg_type}")
+                print(f"[UDP SERVER] Получено от {client.id}: {msg_type}")
 
-        except json.JSONDecodeError:
+        except json_codec.DecodeError:
             print(f"[UDP SERVER] Неверный JSON от {address}")
         except Exception as e:
             print(f"[UDP SERVER] Ошибка обработки пакета: {e}")
 
+    def _answer_keepalive(self, client: UDPClientConnection, msg_type: str):
+        """Ответ на heartbeat/ping из потока приема"""
+        if msg_type == 'heartbeat':
+            response = {
+                'type': 'heartbeat_response',
+                'timestamp': time.time(),
+                'server_tick': self.server_tick
+            }
+        else:
+            response = {
+                'type': 'pong',
+                'timestamp': time.time(),
+                'server_time': self.world_time,
+                'game_tick': self.server_tick,
+                'protocol': 'udp'
+            }
+        self._send_packet(client.address, response)
+
+    def get_last_activity(self, client_id: int) -> Optional[float]:
+        """Время последнего пакета от клиента"""
+        with self.clients_lock:
+            client = self.clients_by_id.get(client_id)
+        return client.last_activity if client else None
+
     def send_loop(self):
         """Цикл отправки UDP пакетов"""
         print(f"[UDP SERVER] Цикл отправки запущен")
 
         while self.running:
             try:
+                # Забираем всю очередь и отправляем без блокировки; спим, только если пусто
                 with self.queue_lock:
-                    if self.outgoing_queue:
-                        address, data = self.outgoing_queue.pop(0)
-                        self._send_packet(address, data)
-                time.sleep(0.001)
+                    batch, self.outgoing_queue = self.outgoing_queue, []
+                for address, data in batch:
+                    self._send_packet(address, data)
+                if not batch:
+                    time.sleep(0.001)
             except Exception as e:
                 if self.running:
                     print(f"[UDP SERVER] Ошибка в цикле отправки: {e}")
@@ -195,15 +267,24 @@ class UDPServer:
     def _send_packet(self, address: Tuple[str, int], data: dict):
         """Отправка одного пакета"""
         try:
-            json_str = json.dumps(data, ensure_ascii=False)
-            packet = json_str.encode('utf-8')
+            payload = json_codec.dumps(data)
+            packets = self.encoder.encode(payload)
 
-            if len(packet) > self.max_packet_size:
-                print(f"[UDP SERVER] Пакет слишком большой: {len(packet)} байт")
+            if not packets:
+                print(f"[UDP SERVER] Сообщение слишком большое даже для фрагментации: {len(payload)} байт")
+                if self.metrics:
+                    self.metrics.inc('udp_packets_dropped_total', type=str(data.get('type', 'unknown')))
                 return
 
-            self.socket.sendto(packet, address)
-            self.packets_sent += 1
+            for packet in packets:
+                self.transport.sendto(packet, address)
+            with self.stats_lock:
+                self.packets_sent += len(packets)
+
+            if self.metrics:
+                msg_type = str(data.get('type', 'unknown'))
+                self.metrics.inc('udp_packets_sent_total', len(packets), type=msg_type)
+                self.metrics.inc('udp_bytes_sent_total', sum(len(packet) for packet in packets), type=msg_type)
         except Exception as e:
             print(f"[UDP SERVER] Ошибка отправки: {e}")
 
@@ -222,19 +303,29 @@ class UDPServer:
         current_time = time.time()
         clients_to_remove = []
 
-        for address, client in list(self.clients.items()):
-            if current_time - client.last_activity > self.client_timeout:
-                clients_to_remove.append((address, client))
+        with self.clients_lock:
+            for address, client in self.clients.items():
+                if current_time - client.last_activity > self.client_timeout:
+                    clients_to_remove.append((address, client))
 
         for address, client in clients_to_remove:
             self.remove_client_by_address(address)
             print(f"[UDP SERVER] Клиент удален по таймауту: {client}")
 
-    def get_or_create_client(self, address: Tuple[str, int]) -> Optional[UDPClientConnection]:
+    def get_or_create_client(self, address: Tuple[str, int],
+                             session_token: Optional[str] = None) -> Optional[UDPClientConnection]:
         """Получение или создание клиента"""
+        with self.clients_lock:
+            return self._get_or_create_client(address, session_token)
+
+    def _get_or_create_client(self, address, session_token):
         if address in self.clients:
             return self.clients[address]
 
+        # Клиент с действующей сессией сменил адрес (NAT rebinding, новый порт)
+        if session_token and session_token in self.sessions:
+            return self._migrate_client(self.sessions[session_token], address)
+
         if len(self.clients) >= self.max_clients:
             print(f"[UDP SERVER] Достигнут лимит клиентов")
             return None
@@ -242,9 +333,10 @@ class UDPServer:
         client_id = self.client_counter
         self.client_counter += 1
 
-        client = UDPClientConnection(address, client_id)
+        client = UDPClientConnection(address, client_id, secrets.token_hex(16))
         self.clients[address] = client
         self.clients_by_id[client_id] = client
+        self.sessions[client.session_token] = client
 
         print(f"[UDP SERVER] Новый клиент: {client}")
 
@@ -252,6 +344,7 @@ class UDPServer:
         self.send_to_address(address, {
             'type': 'welcome',
             'client_id': client_id,
+            'session_token': client.session_token,
             'message': 'Connected to DPP2 UDP Server',
             'timestamp': time.time(),
             'server_info': {
@@ -271,6 +364,22 @@ class UDPServer:
 
         return client
 
+    def _migrate_client(self, client: UDPClientConnection, address: Tuple[str, int]) -> UDPClientConnection:
+        """Перенос сессии клиента на новый адрес без повторного входа"""
+        old_address = client.address
+        self.clients.pop(old_address, None)
+        client.address = address
+        self.clients[address] = client
+
+        print(f"[UDP SERVER] Клиент {client.id} сменил адрес: {old_address} -> {address}")
+
+        self.send_to_address(address, {
+            'type': 'session_resumed',
+            'client_id': client.id,
+            'timestamp': time.time()
+        })
+        return client
+
     # Вспомогательные методы (без изменений)
     def send_to_address(self, address: Tuple[str, int], data: dict):
         """Отправка данных на конкретный адрес"""
@@ -279,38 +388,52 @@ class UDPServer:
 
     def send_to_client(self, client_id: int, data: dict):
         """Отправка данных клиенту по ID"""
-        client = self.clients_by_id.get(client_id)
-        if client:
-            self.send_to_address(client.address, data)
+        with self.clients_lock:
+            client = self.clients_by_id.get(client_id)
+            address = client.address if client else None
+        if address:
+            self.send_to_address(address, data)
             return True
         return False
 
     def broadcast(self, data: dict, exclude_client_id: int = None):
         """Широковещательная рассылка"""
-        for client_id, client in self.clients_by_id.items():
-            if exclude_client_id and client_id == exclude_client_id:
-                continue
-            self.send_to_address(client.address, data)
+        with self.clients_lock:
+            addresses = [client.address for client_id, client in self.clients_by_id.items()
+                         if not (exclude_client_id and client_id == exclude_client_id)]
+        with self.queue_lock:
+            self.outgoing_queue.extend((address, data) for address in addresses)
 
     def get_messages(self):
         """Получение всех сообщений из очереди"""
         with self.queue_lock:
             messages = self.incoming_queue.copy()
             self.incoming_queue.clear()
+            self.message_event.clear()
             return messages
 
     def add_to_incoming_queue(self, message: dict):
         """Добавление сообщения во входящую очередь"""
+        # Запись в gzip - до блокировки очереди: тик не ждет сжатия
+        capture = self.capture
+        if capture:
+            capture.write(message)
         with self.queue_lock:
             self.incoming_queue.append(message)
+            self.message_event.set()
 
     def remove_client_by_address(self, address: Tuple[str, int]):
         """Удаление клиента по адресу"""
+        with self.clients_lock:
+            self._remove_client(address)
+
+    def _remove_client(self, address):
         if address in self.clients:
             client = self.clients.pop(address)
 
             if client.id in self.clients_by_id:
                 del self.clients_by_id[client.id]
+            self.sessions.pop(client.session_token, None)
 
             self.add_to_incoming_queue({
                 'type': 'client_disconnected',
@@ -324,13 +447,15 @@ class UDPServer:
 
     def remove_client_by_id(self, client_id: int):
         """Удаление клиента по ID"""
-        client = self.clients_by_id.get(client_id)
-        if client:
-            self.remove_client_by_address(client.address)
+        with self.clients_lock:
+            client = self.clients_by_id.get(client_id)
+            if client:
+                self._remove_client(client.address)
 
     def get_client_info(self, client_id: int):
         """Получение информации о клиенте"""
-        client = self.clients_by_id.get(client_id)
+        with self.clients_lock:
+            client = self.clients_by_id.get(client_id)
         if client:
             return {
                 'id': client.id,
@@ -346,6 +471,8 @@ class UDPServer:
 
     def get_all_clients_info(self):
         """Получение информации обо всех клиентах"""
+        with self.clients_lock:
+            clients = list(self.clients.values())
         return [{
             'id': client.id,
             'address': client.address,
@@ -355,25 +482,59 @@ class UDPServer:
             'character_id': client.character_id,
             'last_activity': client.last_activity,
             'ping': client.ping
-        } for client in self.clients.values()]
+        } for client in clients]
 
     def update_client_data(self, client_id: int, updates: dict):
         """Обновление данных клиента"""
-        client = self.clients_by_id.get(client_id)
+        with self.clients_lock:
+            client = self.clients_by_id.get(client_id)
         if client:
             for key, value in updates.items():
-                setattr(client, key, value)
+                # Поля соединения фиксированы (__slots__), прочие ключи пропускаем
+                if key in UDPClientConnection.__slots__:
+                    setattr(client, key, value)
             return True
         return False
 
+    def get_queue_depths(self):
+        """Размеры входящей и исходящей очередей"""
+        return len(self.incoming_queue), len(self.outgoing_queue)
+
+    def start_capture(self, path):
+        """Начало записи входящих сообщений в файл"""
+        try:
+            capture = CaptureWriter(path)
+        except OSError as e:
+            print(f"[UDP SERVER] Не удалось начать запись в {path}: {e}")
+            return False
+
+        with self.queue_lock:
+            old_capture, self.capture = self.capture, capture
+        if old_capture:
+            old_capture.close()
+        print(f"[UDP SERVER] Запись входящих сообщений: {path}")
+        return True
+
+    def stop_capture(self):
+        """Остановка записи входящих сообщений"""
+        with self.queue_lock:
+            capture, self.capture = self.capture, None
+        if capture:
+            capture.close()
+            print(f"[UDP SERVER] Запись остановлена, сообщений: {capture.count}")
+
     def get_stats(self):
         """Получение статистики сервера"""
+        incoming, outgoing = self.get_queue_depths()
         return {
             'running': self.running,
             'clients_count': len(self.clients),
             'packets_received': self.packets_received,
             'packets_sent': self.packets_sent,
+            'incoming_queue': incoming,
+            'outgoing_queue': outgoing,
             'packet_loss': self.packet_loss,
+            'fragments_dropped': self.reassembler.dropped,
             'max_clients': self.max_clients,
             'uptime': time.time() - (getattr(self, 'start_time', time.time()))
         }
\ No newline at end of file
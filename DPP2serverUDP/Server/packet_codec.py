@@ -0,0 +1,187 @@
+"""
+Сжатие больших сообщений и фрагментация/сборка UDP датаграмм.
+
+Формат датаграммы определяется первым байтом:
+  '{'  - обычный JSON (как раньше)
+  'Z'  - JSON, сжатый zlib
+  'F'  - фрагмент: заголовок FRAGMENT_HEADER + часть тела ('{...' или 'Z...')
+
+Одинаковая копия лежит в Server/ и Client/ (проверяет Server/tests/test_shared_modules.py).
+"""
+
+import struct
+import time
+import zlib
+
+COMPRESSED_PREFIX = b'Z'
+FRAGMENT_PREFIX = b'F'
+FRAGMENT_HEADER = struct.Struct('!cIHH')  # префикс, id сообщения, номер, всего
+
+
+class PacketEncoder:
+    """Кодирование сообщения в одну или несколько датаграмм"""
+
+    def __init__(self, max_packet_size=1400, compress_threshold=512, max_fragments=64):
+        self.max_packet_size = max_packet_size
+        self.compress_threshold = compress_threshold
+        self.max_fragments = max_fragments
+        self.message_counter = 0
+
+    def encode(self, payload: bytes):
+        """Список датаграмм для JSON payload (пустой, если сообщение слишком большое)"""
+        body = payload
+        if len(payload) > self.compress_threshold:
+            compressed = COMPRESSED_PREFIX + zlib.compress(payload, 6)
+            if len(compressed) < len(payload):
+                body = compressed
+
+        if len(body) <= self.max_packet_size:
+            return [body]
+
+        chunk_size = self.max_packet_size - FRAGMENT_HEADER.size
+        count = (len(body) + chunk_size - 1) // chunk_size
+        if count > self.max_fragments:
+            return []
+
+        self.message_counter = (self.message_counter + 1) & 0xFFFFFFFF
+        message_id = self.message_counter
+        return [
+            FRAGMENT_HEADER.pack(FRAGMENT_PREFIX, message_id, index, count)
+            + body[index * chunk_size:(index + 1) * chunk_size]
+            for index in range(count)
+        ]
+
+
+class _PendingMessage:
+    """Частично собранное сообщение"""
+
+    def __init__(self, count, now):
+        self.count = count
+        self.parts = {}
+        self.size = 0
+        self.created = now
+
+
+class PacketReassembler:
+    """Сборка фрагментов с таймаутом и ограничениями по памяти"""
+
+    def __init__(self, timeout=5.0, max_fragments=64, max_pending_per_peer=8,
+                 max_bytes_per_peer=256 * 1024, max_total_bytes=8 * 1024 * 1024,
+                 max_message_size=1024 * 1024):
+        self.timeout = timeout
+        self.max_fragments = max_fragments
+        self.max_pending_per_peer = max_pending_per_peer
+        self.max_bytes_per_peer = max_bytes_per_peer
+        self.max_total_bytes = max_total_bytes
+        self.max_message_size = max_message_size
+
+        self.pending = {}  # peer -> {message_id: _PendingMessage}
+        self.peer_bytes = {}  # peer -> байты в буферах
+        self.total_bytes = 0
+        self.dropped = 0
+
+    def feed(self, data: bytes, peer=None):
+        """Прием датаграммы; возвращает JSON сообщения целиком или None"""
+        if not data:
+            return None
+
+        prefix = data[:1]
+        if prefix == FRAGMENT_PREFIX:
+            body = self._add_fragment(data, peer)
+            if body is None:
+                return None
+        else:
+            body = data
+
+        return self._decode_body(body)
+
+    def _decode_body(self, body: bytes):
+        if body[:1] != COMPRESSED_PREFIX:
+            return body
+
+        decompressor = zlib.decompressobj()
+        try:
+            payload = decompressor.decompress(body[1:], self.max_message_size)
+        except zlib.error:
+            self.dropped += 1
+            return None
+        if decompressor.unconsumed_tail:
+            # Сообщение больше допустимого после распаковки
+            self.dropped += 1
+            return None
+        return payload
+
+    def _add_fragment(self, data: bytes, peer):
+        if len(data) < FRAGMENT_HEADER.size:
+            self.dropped += 1
+            return None
+
+        _, message_id, index, count = FRAGMENT_HEADER.unpack_from(data)
+        chunk = data[FRAGMENT_HEADER.size:]
+        if count == 0 or count > self.max_fragments or index >= count:
+            self.dropped += 1
+            return None
+
+        now = time.time()
+        messages = self.pending.setdefault(peer, {})
+        message = messages.get(message_id)
+        if message is None:
+            if len(messages) >= self.max_pending_per_peer:
+                self._drop_oldest(peer)
+                messages = self.pending.setdefault(peer, {})
+            message = _PendingMessage(count, now)
+            messages[message_id] = message
+        elif message.count != count:
+            self._discard(peer, message_id)
+            self.dropped += 1
+            return None
+
+        if index in message.parts:
+            return None
+
+        if (self.peer_bytes.get(peer, 0) + len(chunk) > self.max_bytes_per_peer
+                or self.total_bytes + len(chunk) > self.max_total_bytes):
+            self._discard(peer, message_id)
+            self.dropped += 1
+            return None
+
+        message.parts[index] = chunk
+        message.size += len(chunk)
+        self.peer_bytes[peer] = self.peer_bytes.get(peer, 0) + len(chunk)
+        self.total_bytes += len(chunk)
+
+        if len(message.parts) < message.count:
+            return None
+
+        body = b''.join(message.parts[i] for i in range(message.count))
+        self._discard(peer, message_id)
+        return body
+
+    def _discard(self, peer, message_id):
+        messages = self.pending.get(peer)
+        if not messages or message_id not in messages:
+            return
+
+        message = messages.pop(message_id)
+        self.peer_bytes[peer] = self.peer_bytes.get(peer, 0) - message.size
+        self.total_bytes -= message.size
+
+        if not messages:
+            del self.pending[peer]
+            self.peer_bytes.pop(peer, None)
+
+    def _drop_oldest(self, peer):
+        messages = self.pending.get(peer)
+        if messages:
+            oldest_id = min(messages, key=lambda mid: messages[mid].created)
+            self._discard(peer, oldest_id)
+            self.dropped += 1
+
+    def cleanup(self, now=None):
+        """Удаление незавершенных сообщений старше таймаута"""
+        now = now or time.time()
+        for peer, messages in list(self.pending.items()):
+            for message_id, message in list(messages.items()):
+                if now - message.created > self.timeout:
+                    self._discard(peer, message_id)
+                    self.dropped += 1
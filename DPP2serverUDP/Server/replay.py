@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записи входящих сообщений через ServerCore без сокетов.
+Сообщения раскладываются по тикам по времени приема, время игры - виртуальное.
+
+Использование:
+    python replay.py capture.jsonl.gz [--config config.json] [--db game_server_db.json] [--json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from capture import read_capture
+from network import KEEPALIVE_TYPES
+
+
+class VirtualClock:
+    """Часы, которые двигает воспроизведение"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ReplayNetwork:
+    """Сеть без сокетов: отдает сообщения тика и считает исходящие"""
+
+    def __init__(self):
+        self.clients = {}
+        self.pending = []
+        self.packets_received = 0
+        self.packets_sent = 0
+
+    def feed(self, messages):
+        """Сообщения следующего тика"""
+        self.packets_received += len(messages)
+        for message in messages:
+            msg_type = message.get('type')
+            if msg_type in KEEPALIVE_TYPES:
+                # На живом сервере их отвечает поток приема, в тик они не попадают
+                self.packets_sent += 1
+                continue
+            if msg_type == 'client_connected':
+                self.clients[message.get('client_id')] = message
+            elif msg_type == 'client_disconnected':
+                self.clients.pop(message.get('client_id'), None)
+            self.pending.append(message)
+
+    def get_messages(self):
+        messages, self.pending = self.pending, []
+        return messages
+
+    def send_to_client(self, client_id, data):
+        self.packets_sent += 1
+
+    def broadcast(self, data, exclude_client_id=None):
+        self.packets_sent += sum(1 for client_id in self.clients if client_id != exclude_client_id)
+
+    def get_queue_depths(self):
+        return len(self.pending), 0
+
+    def get_last_activity(self, client_id):
+        return None
+
+    def get_stats(self):
+        return {
+            'packets_received': self.packets_received,
+            'packets_sent': self.packets_sent,
+            'clients_count': len(self.clients)
+        }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def replay(capture_path, config_file='config.json', db_path=None, verbose=False, seed=0):
+    """Воспроизведение записи; возвращает отчет о длительности тиков"""
+    from server_core import ServerCore
+
+    header, records = read_capture(capture_path)
+
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+
+    # Работаем с копией базы, чтобы не менять рабочие данные
+    workdir = tempfile.mkdtemp(prefix='dpp2_replay_')
+    source_db = db_path or config.get('database', {}).get('path', 'game_server_db.json')
+    replay_db = os.path.join(workdir, 'replay_db.json')
+    if os.path.exists(source_db):
+        shutil.copyfile(source_db, replay_db)
+
+    config.setdefault('database', {})['path'] = replay_db
+    config.setdefault('zones', {})['enabled'] = False
+    config.setdefault('metrics', {})['enabled'] = False
+    # Операции аккаунтов - прямо в тике, чтобы результат не зависел от потоков
+    config.setdefault('server', {})['account_workers'] = 0
+    replay_config = os.path.join(workdir, 'config.json')
+    with open(replay_config, 'w') as f:
+        json.dump(config, f)
+
+    random.seed(seed)
+    started = header['started']
+    clock = VirtualClock(started)
+    network = ReplayNetwork()
+    timings = []  # (тик, длительность, сообщений)
+
+    output = sys.stdout if verbose else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(output):
+            core = ServerCore(replay_config, network=network, clock=clock)
+            tick_interval = core.tick_interval
+
+            next_record = next(records, None)
+            tick = 0
+            while next_record is not None or network.pending:
+                # Сервер без клиентов простаивает - переходим к следующему сообщению
+                if not network.clients and not network.pending and next_record is not None:
+                    tick = max(tick, int(next_record[0] // tick_interval))
+
+                tick_end = (tick + 1) * tick_interval
+                batch = []
+                while next_record is not None and next_record[0] < tick_end:
+                    batch.append(next_record[1])
+                    next_record = next(records, None)
+                network.feed(batch)
+
+                clock.now = started + tick * tick_interval
+                tick += 1
+                tick_start = time.perf_counter()
+                core._process_tick(tick)
+                timings.append((tick, time.perf_counter() - tick_start, len(batch)))
+
+            core.game._auto_save_characters()
+            core.db.save()
+            handler_stats = core.handler_stats.snapshot() if core.handler_stats else {}
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    durations = sorted(duration for _, duration, _ in timings)
+    slowest = sorted(timings, key=lambda item: item[1], reverse=True)[:5]
+    return {
+        'capture': capture_path,
+        'ticks': len(timings),
+        'messages': sum(count for _, _, count in timings),
+        'packets_sent': network.packets_sent,
+        'total_ms': sum(durations) * 1000,
+        'mean_ms': (sum(durations) / len(durations) * 1000) if durations else 0.0,
+        'p50_ms': _percentile(durations, 0.50) * 1000,
+        'p95_ms': _percentile(durations, 0.95) * 1000,
+        'p99_ms': _percentile(durations, 0.99) * 1000,
+        'max_ms': durations[-1] * 1000 if durations else 0.0,
+        'slowest': [{'tick': tick, 'ms': duration * 1000, 'messages': count}
+                    for tick, duration, count in slowest],
+        'handlers': handler_stats.get('handlers', [])[:10],
+    }
+
+
+def print_report(report):
+    """Вывод отчета воспроизведения"""
+    print(f"Запись: {report['capture']}")
+    print(f"Тиков: {report['ticks']}, сообщений: {report['messages']}, "
+          f"исходящих пакетов: {report['packets_sent']}")
+    print(f"Всего: {report['total_ms']:.1f} мс, среднее: {report['mean_ms']:.3f} мс")
+    print(f"p50: {report['p50_ms']:.3f} мс, p95: {report['p95_ms']:.3f} мс, "
+          f"p99: {report['p99_ms']:.3f} мс, макс: {report['max_ms']:.3f} мс")
+    print("Самые медленные тики:")
+    for item in report['slowest']:
+        print(f"  тик {item['tick']}: {item['ms']:.3f} мс, сообщений: {item['messages']}")
+    if report['handlers']:
+        print("Обработчики по общему времени:")
+        for item in report['handlers']:
+            print(f"  {item['type']}: вызовов {item['calls']}, всего {item['total_ms']:.1f} мс, "
+                  f"среднее {item['avg_ms']:.3f} мс, макс {item['max_ms']:.3f} мс, "
+                  f"байт ответов {item['bytes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записи UDP сервера')
+    parser.add_argument('capture', help='файл записи (.jsonl.gz)')
+    parser.add_argument('--config', default='config.json', help='конфигурация сервера')
+    parser.add_argument('--db', default=None, help='исходная база данных (копируется)')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных чисел')
+    parser.add_argument('--verbose', action='store_true', help='показывать вывод сервера')
+    parser.add_argument('--json', action='store_true', help='отчет в формате JSON')
+    args = parser.parse_args()
+
+    report = replay(args.capture, args.config, args.db, args.verbose, args.seed)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
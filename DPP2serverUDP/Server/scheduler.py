@@ -0,0 +1,64 @@
+"""
+Планировщик тиков с фиксированным шагом на монотонных часах
+"""
+
+import time
+
+
+class TickScheduler:
+    """Фиксированный шаг без дрейфа, ограниченный догон и режим простоя"""
+
+    def __init__(self, tick_interval, max_catch_up=5, max_idle_wait=1.0, clock=time.monotonic):
+        self.tick_interval = tick_interval
+        self.max_catch_up = max(1, int(max_catch_up))
+        self.max_idle_wait = max_idle_wait
+        self.clock = clock
+
+        self.next_tick = clock()
+        self.ticks_skipped = 0
+        self.idle = False
+
+    def reset(self):
+        """Начать отсчет тиков с текущего момента"""
+        self.next_tick = self.clock()
+
+    def due_ticks(self):
+        """Количество тиков, которые нужно выполнить сейчас (с ограничением догона)"""
+        now = self.clock()
+        if now < self.next_tick:
+            return 0
+
+        due = int((now - self.next_tick) // self.tick_interval) + 1
+        if due > self.max_catch_up:
+            # Слишком сильно отстали - пропускаем лишние тики, а не догоняем их
+            self.ticks_skipped += due - self.max_catch_up
+            self.next_tick = now - (self.max_catch_up - 1) * self.tick_interval
+            due = self.max_catch_up
+        return due
+
+    def tick_done(self):
+        """Отметка выполненного тика"""
+        self.next_tick += self.tick_interval
+
+    def wait_next_tick(self):
+        """Сон до следующего тика"""
+        self.idle = False
+        delay = self.next_tick - self.clock()
+        if delay > 0:
+            time.sleep(delay)
+
+    def wait_idle(self, wake_event, timer_delay=None):
+        """Простой: ожидание пакета или таймера мира; True, если есть работа"""
+        timeout = self.max_idle_wait
+        if timer_delay is not None:
+            timeout = min(timeout, max(0.0, timer_delay))
+
+        self.idle = True
+        woken = wake_event.wait(timeout)
+        if not woken and (timer_delay is None or timer_delay > timeout):
+            return False
+
+        # После простоя начинаем с нового тика, пропущенные не догоняем
+        self.idle = False
+        self.reset()
+        return True
@@ -1,31 +1,59 @@
+import sys
 import time
 import threading
 import json
 from colorama import init, Fore, Style
 
+from metrics import Timer
+from scheduler import TickScheduler
+from concurrency import gil_enabled
+
 init(autoreset=True)
 
+# Обновления позиции, из которых за тик применяется только последнее
+POSITION_MESSAGE_TYPES = ('position_update', 'character_move')
+
 
 class ServerCore:
     """Ядро UDP сервера"""
 
-    def __init__(self, config_file='config.json'):
+    def __init__(self, config_file='config.json', network=None, clock=None, transport_factory=None):
         self.config = self.load_config(config_file)
 
         from database import Database
         from network import UDPServer
         from game_logic import GameLogic
-
-        self.db = Database()
-        self.network = UDPServer(
+        from metrics import MetricsRegistry
+
+        # Без выдачи метрик реестр не создается: счетчики на каждый пакет не считаются
+        metrics_enabled = self.config.get('metrics', {}).get('enabled', False)
+        self.metrics = MetricsRegistry() if metrics_enabled else None
+        self.metrics_server = None
+
+        db_path = self.config.get('database', {}).get('path', 'game_server_db.json')
+        self.db = Database(db_path, metrics=self.metrics)
+        # Воспроизведение записи подставляет свою сеть без сокетов и виртуальные часы,
+        # бенчмарк - транспорт-петлю в памяти (transport.LoopbackNetwork.endpoint)
+        self.network = network or UDPServer(
             host=self.config['server']['host'],
             port=self.config['server']['port'],
-            max_clients=self.config['server']['max_players']
+            max_clients=self.config['server']['max_players'],
+            metrics=self.metrics,
+            transport_factory=transport_factory
         )
-        self.game = GameLogic(self.db)
+        if self.config.get('zones', {}).get('enabled', False):
+            from zone_cluster import ZoneGateway
+            self.game = ZoneGateway(self.db, self.config)
+        else:
+            self.game = GameLogic(self.db, self.config, clock=clock)
 
         self.running = False
         self.tick_interval = 1.0 / self.config['server']['tick_rate']
+        self.scheduler = TickScheduler(
+            self.tick_interval,
+            max_catch_up=self.config['server'].get('max_catch_up_ticks', 5),
+            max_idle_wait=self.config['server'].get('max_idle_wait', 1.0)
+        )
 
         self.stats = {
             'start_time': time.time(),
@@ -37,8 +65,16 @@ class ServerCore:
             'udp_packets_sent': 0
         }
 
+        # Время последней активности клиентов сохраняется при автосохранении
+        self.game.liveness_source = self.network.get_last_activity
+
+        self._init_handler_stats()
+
+        self._init_metrics()
+
         print(f"{Fore.GREEN}DPP2 UDP Character Server Core initialized")
         print(f"{Fore.CYAN}Protocol: UDP, Port: {self.config['server']['port']}")
+        print(f"{Fore.CYAN}Python {sys.version.split()[0]}, GIL: {'enabled' if gil_enabled() else 'disabled'}")
 
     def load_config(self, config_file):
         """Загрузка конфигурации"""
@@ -62,6 +98,79 @@ class ServerCore:
             }
         }
 
+    def _init_metrics(self):
+        """Описание метрик и регистрация сборщика gauge-значений"""
+        if self.metrics is None:
+            return
+
+        descriptions = {
+            'udp_packets_received_total': 'Принятые UDP пакеты по типу сообщения',
+            'udp_bytes_received_total': 'Принятые байты по типу сообщения',
+            'udp_packets_sent_total': 'Отправленные UDP пакеты по типу сообщения',
+            'udp_bytes_sent_total': 'Отправленные байты по типу сообщения',
+            'udp_packets_dropped_total': 'Отброшенные слишком большие пакеты',
+            'tick_duration_seconds': 'Длительность обработки тика',
+            'ticks_skipped_total': 'Тики, пропущенные из-за перегрузки',
+            'db_flush_duration_seconds': 'Длительность сохранения базы данных',
+            'db_flush_errors_total': 'Ошибки сохранения базы данных',
+            'db_load_duration_seconds': 'Длительность загрузки базы данных',
+            'messages_processed_total': 'Обработанные игровые сообщения',
+            'position_updates_coalesced_total': 'Обновления позиции, замененные более новыми в том же тике',
+            'handler_duration_seconds': 'Длительность обработчика по типу сообщения',
+            'handler_responses_total': 'Ответы обработчиков по типу сообщения',
+            'handler_response_bytes_total': 'Байты ответов обработчиков по типу сообщения',
+            'handler_errors_total': 'Исключения в обработчиках по типу сообщения',
+            'queue_depth': 'Размер очереди сообщений',
+            'active_characters': 'Персонажи в мире',
+            'connected_clients': 'Подключенные UDP клиенты',
+            'game_tick': 'Текущий игровой тик',
+        }
+        for name, text in descriptions.items():
+            self.metrics.describe(name, text)
+
+        self.metrics.add_collector(self._collect_metrics)
+
+    def _init_handler_stats(self):
+        """Замер обработчиков сообщений по типам"""
+        settings = self.config.get('metrics', {}).get('handler_stats', {})
+        if not settings.get('enabled', True):
+            self.handler_stats = None
+            return
+
+        from handler_stats import HandlerStats
+        self.handler_stats = HandlerStats(
+            metrics=self.metrics,
+            slow_threshold=settings.get('slow_threshold_ms', 20) / 1000.0,
+            slow_samples=settings.get('slow_samples', 50),
+            count_bytes=settings.get('count_bytes', False)
+        )
+        self.game.handler_stats = self.handler_stats
+
+    def _collect_metrics(self):
+        """Обновление gauge-значений перед выдачей метрик"""
+        incoming, outgoing = self.network.get_queue_depths()
+        self.metrics.set_gauge('queue_depth', incoming, queue='incoming')
+        self.metrics.set_gauge('queue_depth', outgoing, queue='outgoing')
+        self.metrics.set_gauge('active_characters', self.game.get_player_count())
+        self.metrics.set_gauge('connected_clients', len(self.network.clients))
+        self.metrics.set_gauge('game_tick', self.game.game_tick)
+
+    def _start_metrics_server(self):
+        """Запуск HTTP эндпоинта метрик, если он включен в конфигурации"""
+        metrics_config = self.config.get('metrics', {})
+        if not metrics_config.get('enabled', False):
+            return
+
+        from metrics import MetricsServer
+
+        self.metrics_server = MetricsServer(
+            self.metrics,
+            host=metrics_config.get('host', '127.0.0.1'),
+            port=metrics_config.get('port', 9108)
+        )
+        if not self.metrics_server.start():
+            self.metrics_server = None
+
     def start(self):
         """Запуск UDP сервера"""
         print(f"{Fore.YELLOW}Запуск UDP сервера персонажей...")
@@ -70,8 +179,13 @@ class ServerCore:
             print(f"{Fore.RED}Не удалось запустить UDP сервер")
             return False
 
+        capture_config = self.config.get('network', {}).get('capture', {})
+        if capture_config.get('enabled', False):
+            self.network.start_capture(capture_config.get('path', 'capture.jsonl.gz'))
+
         self.running = True
         self._start_worker_threads()
+        self._start_metrics_server()
 
         print(f"{Fore.GREEN}UDP сервер запущен на {self.config['server']['host']}:{self.config['server']['port']}")
         print(f"{Fore.CYAN}Нажмите Ctrl+C для остановки")
@@ -96,12 +210,19 @@ class ServerCore:
 
     def _shutdown_sequence(self):
         """Последовательность завершения работы"""
+        # Операции аккаунтов из пула завершаются до сохранения
+        self._send_responses(self.game.shutdown() or [])
+
         print(f"{Fore.YELLOW}Сохранение данных персонажей...")
         self.game._auto_save_characters()
 
         self.network.stop()
         self.db.save()
 
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
         if hasattr(self, 'main_thread'):
             self.main_thread.join(timeout=5)
 
@@ -110,13 +231,28 @@ class ServerCore:
         print(f"{Fore.CYAN}Главный UDP цикл запущен")
 
         tick_counter = 0
+        self.scheduler.reset()
         while self.running:
             try:
-                loop_start = time.time()
-                tick_counter += 1
-
-                self._process_tick(tick_counter)
-                self._maintain_tick_rate(loop_start)
+                if self._is_idle():
+                    if not self.scheduler.wait_idle(self.network.message_event,
+                                                    self.game.seconds_until_world_update()):
+                        continue
+
+                skipped = self.scheduler.ticks_skipped
+                for _ in range(self.scheduler.due_ticks()):
+                    tick_counter += 1
+                    with Timer(self.metrics, 'tick_duration_seconds'):
+                        self._process_tick(tick_counter)
+                    self.scheduler.tick_done()
+
+                if self.scheduler.ticks_skipped > skipped:
+                    skipped = self.scheduler.ticks_skipped - skipped
+                    if self.metrics:
+                        self.metrics.inc('ticks_skipped_total', skipped)
+                    print(f"[UDP TICK] ⚠️ Задержка! Пропущено тиков: {skipped}")
+
+                self.scheduler.wait_next_tick()
 
             except Exception as e:
                 print(f"{Fore.RED}Ошибка в главном UDP цикле: {e}")
@@ -140,18 +276,19 @@ class ServerCore:
         if world_updates:
             self._handle_world_updates(world_updates)
 
+        # Для ответов на heartbeat/ping в потоке приема
+        self.network.server_tick = self.game.game_tick
+        self.network.world_time = self.game.world['time']
+
         # Обновление статистики
         self.stats['ticks_processed'] += 1
         self._update_network_stats()
 
     def _handle_world_updates(self, updates):
         """Обработка обновлений мира"""
-        if isinstance(updates, list):
-            for update in updates:
-                if update and 'data' in update:
-                    self.handle_broadcast(update['data'])
-        elif updates and 'data' in updates:
-            self.handle_broadcast(updates['data'])
+        if not isinstance(updates, list):
+            updates = [updates]
+        self._send_responses([update for update in updates if update and 'data' in update])
 
     def _update_network_stats(self):
         """Обновление сетевой статистики"""
@@ -160,21 +297,49 @@ class ServerCore:
             self.stats['udp_packets_received'] = network_stats.get('packets_received', 0)
             self.stats['udp_packets_sent'] = network_stats.get('packets_sent', 0)
 
-    def _maintain_tick_rate(self, loop_start):
-        """Поддержание заданного тикрейта"""
-        loop_time = time.time() - loop_start
-        sleep_time = max(0, self.tick_interval - loop_time)
-
-        if sleep_time > 0:
-            time.sleep(sleep_time)
-        else:
-            print(f"[UDP TICK] ⚠️ Задержка! Loop: {loop_time:.3f}s")
+    def _is_idle(self):
+        """Нет подключенных клиентов и входящих сообщений"""
+        return not self.network.clients and not self.network.message_event.is_set()
+
+    def _coalesce_position_updates(self, messages):
+        """Слияние обновлений позиции клиента внутри тика (побеждает последнее).
+        Любое другое сообщение клиента - барьер: обновления до и после него не сливаются."""
+        latest = {}  # client_id -> индекс последнего обновления позиции
+        dropped = set()
+
+        for index, message in enumerate(messages):
+            client_id = message.get('client_id')
+            if message.get('type') not in POSITION_MESSAGE_TYPES:
+                latest.pop(client_id, None)
+                continue
+
+            previous = latest.get(client_id)
+            if previous is not None:
+                dropped.add(previous)
+                # Смена карты из отброшенного сообщения не должна потеряться
+                old_position = messages[previous].get('position')
+                new_position = message.get('position')
+                if isinstance(old_position, dict) and isinstance(new_position, dict):
+                    for key in ('map', 'zone'):
+                        if key in old_position and key not in new_position:
+                            new_position[key] = old_position[key]
+            latest[client_id] = index
+
+        if not dropped:
+            return messages
+
+        if self.metrics:
+            self.metrics.inc('position_updates_coalesced_total', len(dropped))
+        return [message for index, message in enumerate(messages) if index not in dropped]
 
     def process_messages(self, messages):
         """Обработка входящих UDP сообщений"""
+        messages = self._coalesce_position_updates(messages)
         for message in messages:
             try:
                 self.stats['messages_processed'] += 1
+                if self.metrics:
+                    self.metrics.inc('messages_processed_total')
                 self._process_single_message(message)
             except Exception as e:
                 print(f"{Fore.RED}Ошибка обработки UDP сообщения: {e}")
@@ -273,5 +438,6 @@ class ServerCore:
             'world': self.game.get_world_state(),
             'gifct_settings': self.db.get_gifct_settings(),
             'network_stats': self.network.get_stats() if hasattr(self.network, 'get_stats') else {},
+            'handler_stats': self.handler_stats.snapshot() if self.handler_stats else {},
             'protocol': 'udp'
         }
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Сессия персонажа в мире: только горячие поля, полная запись - в базе
+"""
+
+DEFAULT_POSITION = {'x': 0, 'y': 0, 'z': 0}
+
+
+class CharacterSession:
+    """Персонаж в мире. Инвентарь, квесты и прочие поля записи не копируются -
+    запись загружается из базы по обращению к record"""
+
+    __slots__ = ('client_id', 'id', 'name', 'character_type', 'position', 'skin_hash', 'db')
+
+    def __init__(self, client_id, record, db):
+        self.client_id = client_id
+        self.id = record['id']
+        self.name = record.get('name') or f"Character_{record['id']}"
+        self.character_type = record.get('character_type', 'default')
+        self.position = record.get('position') or dict(DEFAULT_POSITION)
+        self.skin_hash = None  # хэш текущего скина, сбрасывается при смене скина
+        self.db = db
+
+    @property
+    def record(self):
+        """Полная запись персонажа из базы (пустой словарь, если ее нет)"""
+        return self.db.get_character(self.id) or {}
+
+    @property
+    def current_skin(self):
+        return self.record.get('current_skin')
+
+    def __repr__(self):
+        return f"CharacterSession({self.id!r}, {self.name!r}, client={self.client_id!r})"
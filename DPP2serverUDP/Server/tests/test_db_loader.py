@@ -0,0 +1,98 @@
+import json
+import random
+
+import pytest
+
+from db_loader import stream_database
+
+CHUNK_SIZES = [1, 2, 3, 5, 7, 10, 25, 50, 1024, 1 << 20]
+
+
+def rebuild(path, chunk_size):
+    """Данные из потока записей в том виде, в каком их вернул бы json.load"""
+    data = {}
+    for section, key, value in stream_database(path, chunk_size=chunk_size):
+        if key is None:
+            data[section] = value
+        else:
+            data.setdefault(section, {})[key] = value
+    return data
+
+
+def write(tmp_path, data, bom=False, **dump_options):
+    path = tmp_path / 'db.json'
+    text = json.dumps(data, **dump_options)
+    path.write_bytes((b'\xef\xbb\xbf' if bom else b'') + text.encode('utf-8'))
+    return path
+
+
+def random_value(rng, depth=0):
+    kinds = ['int', 'float', 'exp', 'str', 'bool', 'null']
+    if depth < 3:
+        kinds += ['list', 'dict']
+    kind = rng.choice(kinds)
+    if kind == 'int':
+        return rng.randint(-10 ** 12, 10 ** 12)
+    if kind == 'float':
+        return round(rng.uniform(-1e6, 1e6), rng.randint(0, 6))
+    if kind == 'exp':
+        return rng.uniform(-1, 1) * 10 ** rng.randint(-30, 30)
+    if kind == 'str':
+        return ''.join(rng.choice('ab "\\/\n\té€🐴') for _ in range(rng.randint(0, 8)))
+    if kind == 'bool':
+        return rng.random() < 0.5
+    if kind == 'null':
+        return None
+    if kind == 'list':
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f'k{i}"\\': random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+def random_database(rng):
+    return {
+        'players': {f'p{i}': {'username': f'user{i}', 'score': random_value(rng)}
+                    for i in range(rng.randint(0, 5))},
+        'characters': {f'c{i}': {'name': f'Имя{i}', 'position': {'x': rng.uniform(-100, 100),
+                                                                'y': rng.uniform(-100, 100)},
+                                 'extra': random_value(rng)}
+                       for i in range(rng.randint(0, 5))},
+        'world': random_value(rng),
+        'uptime': random_value(rng),
+    }
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_float_at_chunk_boundary(tmp_path, chunk_size):
+    path = write(tmp_path, {'players': {}, 'characters': {}, 'uptime': 12345.5, 'scale': -2.5e-3})
+    assert rebuild(path, chunk_size) == json.loads(path.read_text())
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('dump_options', [
+    {},
+    {'indent': 2},
+    {'indent': 4, 'ensure_ascii': False},
+    {'indent': '\t'},
+    {'separators': (',', ':')},
+])
+def test_matches_json_load(tmp_path, chunk_size, dump_options):
+    rng = random.Random(chunk_size)
+    for _ in range(20):
+        path = write(tmp_path, random_database(rng), bom=rng.random() < 0.3, **dump_options)
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            expected = json.load(f)
+        assert rebuild(path, chunk_size) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+@pytest.mark.parametrize('text', [
+    '{"players": {"a": 1.}}',
+    '{"players": {}, "uptime": 12345.}',
+    '{"players": {"a": {"x": 1}}',
+    '{"players": {}} trailing',
+])
+def test_rejects_invalid_json(tmp_path, chunk_size, text):
+    path = tmp_path / 'db.json'
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        rebuild(path, chunk_size)
@@ -0,0 +1,48 @@
+import copy
+
+import pytest
+
+from message_registry import (JoinWorldPayload, MessageRegistry, Position,
+                              PositionUpdatePayload, Velocity)
+
+
+@pytest.fixture
+def registry():
+    return MessageRegistry()
+
+
+def test_decode_returns_dataclass(registry):
+    message = {'type': 'join_world', 'client_id': 'a', 'character_id': 'c1',
+               'position': {'x': 1, 'y': 2, 'map': 'forest'}}
+    original = copy.deepcopy(message)
+
+    payload, error = registry.decode(message)
+
+    assert error is None
+    assert payload == JoinWorldPayload('c1', position=Position(1.0, 2.0, 0.0, 'forest'))
+    assert message == original  # исходный словарь не меняется
+
+
+def test_nested_velocity(registry):
+    payload, error = registry.decode({'type': 'position_update', 'position': {'x': 0, 'y': 0},
+                                      'velocity': {'x': 2}})
+    assert error is None
+    assert payload == PositionUpdatePayload(position=Position(0.0, 0.0), velocity=Velocity(2.0))
+
+
+@pytest.mark.parametrize('message, error', [
+    ({'type': 'join_world'}, 'Не указано поле character_id'),
+    ({'type': 'join_world', 'character_id': 'c1', 'position': {'x': 1}},
+     'Не указано поле position.y'),
+    ({'type': 'position_update', 'position': {'x': 1, 'y': 'a'}},
+     'Неверное значение поля position.y'),
+    ({'type': 'position_update', 'velocity': {'z': True}}, 'Неверное значение поля velocity.z'),
+    ({'type': 'position_update', 'position': [1, 2]}, 'Неверное значение поля position'),
+])
+def test_error_reports_field_path(registry, message, error):
+    assert registry.decode(message) == (None, error)
+
+
+def test_unknown_and_schemaless_types(registry):
+    assert registry.decode({'type': 'nope'}) == (None, None)
+    assert registry.decode({'type': 'heartbeat'}) == (None, None)
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модули, которые сервер и клиент держат одинаковыми копиями
+SHARED_MODULES = (
+    'packet_codec.py',
+    'json_codec.py',
+    'transport.py',
+)
+
+
+@pytest.mark.parametrize('name', SHARED_MODULES)
+def test_server_and_client_copies_match(name):
+    with open(os.path.join(ROOT, 'Server', name), 'rb') as f:
+        server_copy = f.read()
+    with open(os.path.join(ROOT, 'Client', name), 'rb') as f:
+        client_copy = f.read()
+    assert server_copy == client_copy, f"Server/{name} и Client/{name} разошлись"
@@ -0,0 +1,165 @@
+"""
+Транспорт датаграмм для UDPServer и NetworkClient: UDP сокет или петля в памяти.
+Петля нужна для тестов и бенчмарков сервера и клиентов в одном процессе без сокетов;
+задержку, джиттер и потери задает LoopbackNetwork (случайность - с зерном).
+
+Интерфейс транспорта:
+    sendto(data, address)
+    recvfrom(bufsize, timeout) -> (data, address) или None по таймауту
+    close()
+    address - локальный адрес
+
+Одинаковая копия лежит в Server/ и Client/ (проверяет Server/tests/test_shared_modules.py).
+"""
+
+import heapq
+import itertools
+import random
+import select
+import socket
+import threading
+import time
+
+
+class UDPTransport:
+    """Транспорт поверх UDP сокета"""
+
+    def __init__(self, bind_address=None, reuse_address=False):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_address:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if bind_address:
+            self.socket.bind(bind_address)
+        self.socket.setblocking(False)
+
+    @property
+    def address(self):
+        return self.socket.getsockname()
+
+    def sendto(self, data, address):
+        self.socket.sendto(data, address)
+
+    def recvfrom(self, bufsize, timeout=None):
+        """Следующая датаграмма или None, если за timeout ничего не пришло"""
+        ready, _, _ = select.select([self.socket], [], [], timeout)
+        if not ready:
+            return None
+        try:
+            return self.socket.recvfrom(bufsize)
+        except BlockingIOError:
+            return None
+
+    def close(self):
+        self.socket.close()
+
+
+class LoopbackNetwork:
+    """Сеть в памяти: датаграммы между конечными точками с задержкой, джиттером и потерями"""
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=None, clock=time.monotonic):
+        self.latency = latency  # секунды
+        self.jitter = jitter  # секунды, добавка равномерно от 0 до jitter
+        self.loss = loss  # доля потерянных датаграмм
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.endpoints = {}  # адрес -> LoopbackTransport
+        self.port_counter = itertools.count(40000)
+
+        # Счетчики
+        self.sent = 0
+        self.lost = 0
+        self.unreachable = 0
+
+    def endpoint(self, address=None):
+        """Новая конечная точка; без адреса - ('loopback', свободный порт)"""
+        with self.lock:
+            if address is None:
+                address = ('loopback', next(self.port_counter))
+                while address in self.endpoints:
+                    address = ('loopback', next(self.port_counter))
+            address = tuple(address)
+            if address in self.endpoints:
+                raise OSError(f"Адрес уже занят: {address}")
+            transport = LoopbackTransport(self, address)
+            self.endpoints[address] = transport
+            return transport
+
+    def _route(self, data, source, destination):
+        """Доставка датаграммы; потерянные и без получателя молча отбрасываются, как в UDP"""
+        with self.lock:
+            self.sent += 1
+            target = self.endpoints.get(tuple(destination))
+            if target is None:
+                self.unreachable += 1
+                return
+            if self.loss and self.random.random() < self.loss:
+                self.lost += 1
+                return
+            delay = self.latency + (self.random.uniform(0.0, self.jitter) if self.jitter else 0.0)
+        target._deliver(self.clock() + delay, data, source)
+
+    def _unregister(self, transport):
+        with self.lock:
+            if self.endpoints.get(transport.address) is transport:
+                del self.endpoints[transport.address]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'endpoints': len(self.endpoints),
+                'sent': self.sent,
+                'lost': self.lost,
+                'unreachable': self.unreachable,
+            }
+
+
+class LoopbackTransport:
+    """Конечная точка LoopbackNetwork; датаграммы выдаются по времени доставки"""
+
+    def __init__(self, network, address):
+        self.network = network
+        self.address = address
+        self.condition = threading.Condition()
+        self.inbox = []  # (время доставки, номер, данные, отправитель)
+        self.counter = itertools.count()
+        self.closed = False
+
+    def sendto(self, data, address):
+        if self.closed:
+            raise OSError("Транспорт закрыт")
+        self.network._route(bytes(data), self.address, address)
+
+    def _deliver(self, deliver_at, data, source):
+        with self.condition:
+            if self.closed:
+                return
+            heapq.heappush(self.inbox, (deliver_at, next(self.counter), data, source))
+            self.condition.notify()
+
+    def recvfrom(self, bufsize, timeout=None):
+        """Следующая доставленная датаграмма (обрезается до bufsize, как в UDP) или None"""
+        clock = self.network.clock
+        deadline = None if timeout is None else clock() + timeout
+        with self.condition:
+            while not self.closed:
+                now = clock()
+                if self.inbox and self.inbox[0][0] <= now:
+                    _, _, data, source = heapq.heappop(self.inbox)
+                    return data[:bufsize], source
+
+                wait = self.inbox[0][0] - now if self.inbox else None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.condition.wait(wait)
+            return None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.inbox.clear()
+            self.condition.notify_all()
+        self.network._unregister(self)
@@ -0,0 +1,66 @@
+"""
+Таймеры мира на куче: срабатывают только когда наступило время
+"""
+
+import heapq
+import itertools
+
+
+class WorldTimers:
+    """Очередь с приоритетом для часов, погоды, автосохранения и событий мира"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.heap = []  # (время срабатывания, порядковый номер, имя)
+        self.timers = {}  # имя -> (callback, интервал, порядковый номер)
+        self.counter = itertools.count()
+
+    def schedule(self, name, delay, callback, interval=None):
+        """Таймер через delay секунд; с interval - повторяющийся. Имя заменяет старый таймер"""
+        seq = next(self.counter)
+        self.timers[name] = (callback, interval, seq)
+        heapq.heappush(self.heap, (self.clock() + delay, seq, name))
+
+    def cancel(self, name):
+        """Отмена таймера (запись в куче удаляется лениво)"""
+        return self.timers.pop(name, None) is not None
+
+    def next_due(self):
+        """Время ближайшего таймера или None"""
+        while self.heap:
+            due, seq, name = self.heap[0]
+            timer = self.timers.get(name)
+            if timer is not None and timer[2] == seq:
+                return due
+            heapq.heappop(self.heap)
+        return None
+
+    def seconds_until_next(self):
+        due = self.next_due()
+        if due is None:
+            return None
+        return max(0.0, due - self.clock())
+
+    def run_due(self):
+        """Выполнение наступивших таймеров; возвращает их результаты"""
+        now = self.clock()
+        results = []
+        while True:
+            due = self.next_due()
+            if due is None or due > now:
+                return results
+
+            _, seq, name = heapq.heappop(self.heap)
+            callback, interval, _ = self.timers[name]
+            if interval:
+                # Следующее срабатывание от запланированного времени - без накопления сдвига
+                next_time = due + interval
+                if next_time <= now:
+                    next_time = now + interval
+                heapq.heappush(self.heap, (next_time, seq, name))
+            else:
+                del self.timers[name]
+
+            result = callback()
+            if result:
+                results.extend(result if isinstance(result, list) else [result])
@@ -0,0 +1,578 @@
+"""
+Зональный режим UDP сервера: шлюз и обработчики карт в процессах или потоках
+"""
+
+import copy
+import dataclasses
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from chat import ChatChannels, GLOBAL_CHANNEL, PARTY_PREFIX
+from concurrency import gil_enabled
+from session import CharacterSession
+
+# Сообщения, которые обрабатывает зона игрока (остальные - шлюз)
+ZONE_MESSAGE_TYPES = {
+    'join_world', 'position_update', 'character_move', 'chat_message',
+    'leave_world', 'skin_update', 'request_skin', 'save_character',
+    'character_action', 'get_world_info', 'gifct_activation',
+}
+
+# Каналы чата в пределах карты - их ведет зона; глобальный чат, шепот и группы - шлюз
+ZONE_CHAT_CHANNELS = ('proximity', 'zone')
+
+# Рассылки зоны, которые и в обычном режиме получают все игроки мира
+WORLD_BROADCAST_TYPES = {'player_joined', 'player_left', 'skin_update'}
+
+# Интервал отправки изменений персонажей из зоны в шлюз
+PERSIST_INTERVAL = 1.0
+
+
+class ThreadQueue(queue.Queue):
+    """Очередь между потоками с передачей копий, как между процессами:
+    у зоны и шлюза не бывает общих изменяемых объектов"""
+
+    def put(self, item, block=True, timeout=None):
+        super().put(copy.deepcopy(item), block, timeout)
+
+
+class ZoneStore:
+    """Хранилище зоны в памяти с интерфейсом Database для GameLogic"""
+
+    def __init__(self, world_data, gifct_settings=None):
+        self.world_data = dict(world_data)
+        self.gifct_settings = gifct_settings or {}
+        self.characters = {}
+        self.dirty = {}  # character_id -> накопленные изменения
+
+    def add_character(self, character):
+        """Добавление записи персонажа, переданной шлюзом"""
+        self.characters[character['id']] = character
+
+    def pop_dirty(self):
+        """Забрать накопленные изменения персонажей"""
+        dirty, self.dirty = self.dirty, {}
+        return dirty
+
+    def get_character(self, character_id):
+        return self.characters.get(character_id)
+
+    def create_character(self, player_id, character_data):
+        # Запасной путь: шлюз создает персонажа до передачи в зону
+        character = dict(character_data, player_id=player_id)
+        self.characters[character['id']] = character
+        self.dirty.setdefault(character['id'], {}).update(character)
+        return character['id'], character
+
+    def update_character(self, character_id, updates):
+        character = self.characters.get(character_id)
+        if character is None:
+            return False
+
+        character.update(updates)
+        character['last_played'] = datetime.now().isoformat()
+        self.dirty.setdefault(character_id, {}).update(updates)
+        return True
+
+    def update_characters(self, batch):
+        return sum(1 for character_id, updates in batch.items()
+                   if self.update_character(character_id, updates))
+
+    def get_world_data(self):
+        return self.world_data
+
+    def update_world_data(self, updates):
+        # Мир сохраняет шлюз
+        self.world_data.update(updates)
+
+    def flush(self):
+        # Изменения уходят шлюзу через pop_dirty
+        pass
+
+    def get_gifct_settings(self):
+        return self.gifct_settings
+
+    def get_server_stats(self):
+        return {'total_characters': len(self.characters)}
+
+    def increment_online_players(self):
+        pass
+
+    def decrement_online_players(self):
+        pass
+
+
+def _zone_only(responses):
+    """Смена карты - не вход и не выход из мира: рассылки только игрокам зоны"""
+    for response in responses:
+        response['zone_only'] = True
+    return responses
+
+
+def run_zone_worker(zone_id, config, world_data, gifct_settings, inbox, outbox):
+    """Главный цикл процесса зоны"""
+    from game_logic import GameLogic
+
+    store = ZoneStore(world_data, gifct_settings)
+    logic = GameLogic(store, config)
+    tick_interval = 1.0 / config.get('server', {}).get('tick_rate', 60)
+    last_persist = time.time()
+
+    print(f"[ZONE {zone_id}] Зона запущена")
+
+    running = True
+    while running:
+        tick_deadline = time.time() + tick_interval
+        responses = []
+
+        while True:
+            timeout = tick_deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                command = inbox.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            try:
+                op = command['op']
+                if op == 'stop':
+                    running = False
+                    break
+                elif op == 'join':
+                    store.add_character(command['character'])
+                    joined = logic.handle_message(command['message'], validated=True,
+                                                  payload=command['payload']) or []
+                    if command.get('handoff'):
+                        _zone_only(joined)
+                    responses.extend(joined)
+                elif op == 'message':
+                    responses.extend(logic.handle_message(command['message'], validated=True,
+                                                          payload=command['payload']) or [])
+                elif op == 'remove':
+                    responses.extend(logic.remove_player(command['client_id']) or [])
+                elif op == 'handoff_out':
+                    client_id = command['client_id']
+                    session = logic.active_characters.get(client_id)
+                    responses.extend(_zone_only(logic.remove_player(client_id) or []))
+                    # После выхода позиция уже в записи зоны - передаем запись, не сессию
+                    character = store.get_character(session.id) if session else None
+                    outbox.put(('handoff', client_id, character))
+                elif op == 'world':
+                    logic.sync_world(command['world'])
+                elif op == 'flush':
+                    # Автосохранение по команде шлюза: изменения уходят в этом же тике
+                    logic._auto_save_characters()
+                    last_persist = 0.0
+            except Exception as e:
+                print(f"[ZONE {zone_id}] Ошибка обработки команды: {e}")
+
+        # Эффекты и таймеры зоны рассылаем; время и погоду ведет шлюз - их world_update отбрасываем
+        responses.extend(response for response in logic.update_world() or ()
+                         if response.get('data', {}).get('type') != 'world_update')
+
+        if responses:
+            outbox.put(('responses', zone_id, responses))
+
+        if time.time() - last_persist >= PERSIST_INTERVAL or not running:
+            last_persist = time.time()
+            dirty = store.pop_dirty()
+            if dirty:
+                outbox.put(('persist', dirty))
+
+    logic._auto_save_characters()
+    dirty = store.pop_dirty()
+    if dirty:
+        outbox.put(('persist', dirty))
+    outbox.put(('stopped', zone_id))
+    print(f"[ZONE {zone_id}] Зона остановлена")
+
+
+class ZoneGateway:
+    """Шлюз: аккаунты обрабатывает сам, игровой мир - зоны по картам (процессы или потоки)"""
+
+    def __init__(self, database, config):
+        from game_logic import GameLogic
+
+        self.db = database
+        self.config = config
+        self.local = GameLogic(database, config)
+        # Отложенные до завершения операции аккаунта сообщения снова идут через шлюз
+        self.local.message_router = self.handle_message
+        # Пакеты игроков видит только шлюз - время их активности сохраняет он
+        self.local.schedule_event('liveness', self.local.auto_save_interval, self._save_liveness,
+                                  interval=self.local.auto_save_interval)
+
+        zones_config = config.get('zones', {})
+        self.worker_count = max(1, int(zones_config.get('workers', 2)))
+        self.map_zones = zones_config.get('maps', {})  # map -> номер зоны
+
+        self.client_zones = {}  # client_id -> номер зоны
+        # Персонажи всех зон: для чата между зонами и запросов скина
+        self.characters = {}  # client_id -> CharacterSession
+        self.character_clients = {}  # character_id -> client_id
+        self.chat = ChatChannels()
+        self.pending_handoffs = {}  # client_id -> (новая зона, отложенные сообщения)
+        self.stopped_zones = 0
+
+        # Потоки дают параллельность только без GIL (python3.13t), иначе - процессы
+        self.backend = zones_config.get('backend', 'auto')
+        if self.backend == 'auto':
+            self.backend = 'process' if gil_enabled() else 'thread'
+
+        if self.backend == 'thread':
+            make_queue, make_worker = ThreadQueue, threading.Thread
+        else:
+            context = multiprocessing.get_context('spawn')
+            make_queue, make_worker = context.Queue, context.Process
+
+        # Аккаунты обрабатывает только шлюз - пул потоков в зонах не нужен
+        zone_config = copy.deepcopy(config)
+        zone_config.setdefault('server', {})['account_workers'] = 0
+
+        self.outbox = make_queue()
+        self.inboxes = []
+        self.workers = []
+        for zone_id in range(self.worker_count):
+            inbox = make_queue()
+            worker = make_worker(
+                target=run_zone_worker,
+                args=(zone_id, zone_config, copy.deepcopy(self.local.world),
+                      copy.deepcopy(database.get_gifct_settings()), inbox, self.outbox),
+                daemon=True,
+                name=f"Zone-{zone_id}"
+            )
+            worker.start()
+            self.inboxes.append(inbox)
+            self.workers.append(worker)
+
+        kind = 'потоков' if self.backend == 'thread' else 'процессов'
+        print(f"[ZONE GATEWAY] Запущено зон: {self.worker_count} ({kind})")
+
+    @property
+    def game_tick(self):
+        return self.local.game_tick
+
+    @property
+    def world(self):
+        return self.local.world
+
+    @property
+    def handler_stats(self):
+        # Замеряются обработчики шлюза; сообщения зон выполняются в их процессах/потоках
+        return self.local.handler_stats
+
+    @handler_stats.setter
+    def handler_stats(self, stats):
+        self.local.handler_stats = stats
+
+    def zone_for_map(self, map_name):
+        """Номер зоны для карты (явное назначение или стабильный хэш)"""
+        map_name = map_name or self.local.default_map
+        if map_name in self.map_zones:
+            return int(self.map_zones[map_name]) % self.worker_count
+        return zlib.crc32(map_name.encode('utf-8')) % self.worker_count
+
+    # Маршрутизация сообщений
+    def handle_message(self, message):
+        """Маршрутизация входящего сообщения в шлюз или зону"""
+        msg_type = message.get('type')
+        client_id = message.get('client_id')
+
+        # Пока операция аккаунта клиента в пуле, его сообщения (вход в мир, выход) ждут ее завершения
+        backlog = self.local.account_backlog.get(client_id)
+        if backlog is not None:
+            backlog.append(message)
+            return None
+
+        if client_id in self.pending_handoffs:
+            self.pending_handoffs[client_id][1].append(message)
+            return None
+
+        # Разбор один раз: дальше шлюз и зоны получают готовую полезную нагрузку
+        payload, error = self.local.decode_message(message)
+        if error:
+            return self.local.error_response(client_id, error)
+
+        if msg_type in ('client_disconnect', 'logout'):
+            return self.remove_player(client_id)
+
+        if msg_type == 'join_world':
+            return self._route_join(client_id, message, payload)
+
+        if msg_type in ('chat_join', 'chat_leave') or (
+                msg_type == 'chat_message' and payload.channel not in ZONE_CHAT_CHANNELS):
+            return self._handle_chat(client_id, msg_type, payload)
+
+        zone_id = self.client_zones.get(client_id)
+        if msg_type == 'request_skin':
+            # Запрос идет в зону того, чей скин нужен
+            target_client_id = self.character_clients.get(payload.target_character_id)
+            zone_id = self.client_zones.get(target_client_id, zone_id)
+        if msg_type not in ZONE_MESSAGE_TYPES or zone_id is None:
+            return self.local.handle_message(message, validated=True, payload=payload)
+
+        if msg_type in ('position_update', 'character_move') and payload.position is not None:
+            new_map = payload.position.map
+            if new_map and self.zone_for_map(new_map) != zone_id:
+                self._start_handoff(client_id, self.zone_for_map(new_map), message)
+                return None
+
+        self._send(zone_id, {'op': 'message', 'message': message, 'payload': payload})
+
+        if msg_type == 'leave_world':
+            del self.client_zones[client_id]
+            self._forget_character(client_id)
+        return None
+
+    def _route_join(self, client_id, message, payload):
+        """Передача входа в мир зоне, отвечающей за карту персонажа"""
+        if client_id in self.client_zones:
+            return self.local.error_response(client_id, 'Уже в мире с другим персонажем')
+
+        character_id, character = self.local.load_or_create_character(
+            client_id, payload.character_id, payload.character_name)
+
+        if payload.position is not None:
+            map_name = payload.position.map
+        else:
+            map_name = (character.get('position') or {}).get('map')
+        zone_id = self.zone_for_map(map_name)
+
+        self.client_zones[client_id] = zone_id
+        self.characters[client_id] = CharacterSession(client_id, character, self.db)
+        self.character_clients[character_id] = client_id
+        self.chat.subscribe(client_id, GLOBAL_CHANNEL)
+        self._send(zone_id, {
+            'op': 'join',
+            'character': copy.deepcopy(character),
+            'message': dict(message, character_id=character_id),
+            'payload': dataclasses.replace(payload, character_id=character_id)
+        })
+        return None
+
+    def _forget_character(self, client_id):
+        session = self.characters.pop(client_id, None)
+        if session and self.character_clients.get(session.id) == client_id:
+            del self.character_clients[session.id]
+        self.chat.remove_client(client_id)
+        self.local.flushed_activity.pop(client_id, None)
+
+    @property
+    def liveness_source(self):
+        return self.local.liveness_source
+
+    @liveness_source.setter
+    def liveness_source(self, source):
+        self.local.liveness_source = source
+
+    def _save_liveness(self):
+        """Время последнего пакета игроков всех зон - одной записью"""
+        batch = {}
+        for client_id, session in self.characters.items():
+            last_activity = self.local._pending_activity(client_id)
+            if last_activity:
+                batch[session.id] = {'last_activity': last_activity}
+        if batch:
+            self.db.update_characters(batch)
+
+    def _handle_chat(self, client_id, msg_type, payload):
+        """Глобальный чат, шепот и каналы групп: участники могут быть в разных зонах"""
+        character = self.characters.get(client_id)
+        if character is None:
+            return self.local.error_response(client_id, 'Не в мире')
+
+        channel = payload.channel or GLOBAL_CHANNEL
+        if msg_type in ('chat_join', 'chat_leave'):
+            if not channel.startswith(PARTY_PREFIX) or len(channel) == len(PARTY_PREFIX):
+                return self.local.error_response(client_id, f'Нельзя войти в канал: {channel}'
+                                                 if msg_type == 'chat_join' else
+                                                 f'Нельзя выйти из канала: {channel}')
+            if msg_type == 'chat_leave':
+                self.chat.unsubscribe(client_id, channel)
+                return self.local._create_client_response(client_id, 'chat_channel_left',
+                                                          success=True, channel=channel)
+            self.chat.subscribe(client_id, channel)
+            return self.local._create_client_response(client_id, 'chat_channel_joined',
+                                                      success=True, channel=channel,
+                                                      members=len(self.chat.members(channel)))
+
+        if channel == GLOBAL_CHANNEL:
+            recipients = self.chat.members(GLOBAL_CHANNEL)
+        elif channel == 'whisper':
+            target_client_id = self.character_clients.get(payload.target_character_id)
+            if target_client_id is None:
+                return self.local.error_response(client_id, 'Игрок не найден')
+            recipients = (target_client_id,)
+        elif channel.startswith(PARTY_PREFIX):
+            if not self.chat.is_member(client_id, channel):
+                return self.local.error_response(client_id, 'Вы не в этом канале')
+            recipients = self.chat.members(channel)
+        else:
+            return self.local.error_response(client_id, f'Неизвестный канал: {channel}')
+
+        chat_msg = self.local._create_broadcast_message('chat_message',
+                                                        character=character,
+                                                        text=payload.text,
+                                                        channel=channel)
+        return [{'target': 'client', 'client_id': recipient_id, 'data': chat_msg}
+                for recipient_id in recipients if recipient_id != client_id]
+
+    def _start_handoff(self, client_id, new_zone_id, message):
+        """Начало передачи игрока в другую зону при смене карты"""
+        old_zone_id = self.client_zones[client_id]
+        self.pending_handoffs[client_id] = (new_zone_id, [message])
+        self._send(old_zone_id, {'op': 'handoff_out', 'client_id': client_id})
+        print(f"[ZONE GATEWAY] Передача клиента {client_id}: зона {old_zone_id} -> {new_zone_id}")
+
+    def _finish_handoff(self, client_id, character):
+        """Вход игрока в новую зону и отправка отложенных сообщений"""
+        new_zone_id, messages = self.pending_handoffs.pop(client_id, (None, []))
+        if new_zone_id is None or character is None or client_id not in self.client_zones:
+            self.client_zones.pop(client_id, None)
+            self._forget_character(client_id)
+            return []
+
+        # Последняя позиция из отложенных обновлений (некорректные обновления пропускаются)
+        position = dict(character.get('position') or {})
+        for message in messages:
+            if message.get('type') in ('position_update', 'character_move'):
+                payload, error = self.local.decode_message(message)
+                if not error and payload.position is not None:
+                    position.update(payload.position.to_dict())
+
+        join_message = {
+            'type': 'join_world',
+            'client_id': client_id,
+            'character_id': character['id'],
+            'character_name': character.get('name'),
+            'position': position
+        }
+        payload, error = self.local.decode_message(join_message)
+        if error:
+            # Позиция записи не прошла схему - вход без нее, зона возьмет позицию из записи
+            print(f"[ZONE GATEWAY] Позиция {client_id} при передаче отброшена: {error}")
+            del join_message['position']
+            payload, _ = self.local.decode_message(join_message)
+
+        self.client_zones[client_id] = new_zone_id
+        self._send(new_zone_id, {
+            'op': 'join',
+            'handoff': True,
+            'character': dict(character, position=position),
+            'message': join_message,
+            'payload': payload
+        })
+
+        responses = []
+        for message in messages:
+            if message.get('type') not in ('position_update', 'character_move'):
+                responses.extend(self.handle_message(message) or [])
+        return responses
+
+    def _send(self, zone_id, command):
+        self.inboxes[zone_id].put(command)
+
+    # Интерфейс GameLogic для ServerCore
+    def update_world(self):
+        """Тик шлюза: мир, результаты зон и сохранение изменений"""
+        responses = []
+
+        world_updates = self.local.update_world()
+        if world_updates:
+            responses.extend(world_updates)
+            for zone_id in range(self.worker_count):
+                self._send(zone_id, {'op': 'world', 'world': dict(self.local.world)})
+
+        responses.extend(self._drain_zone_results())
+        return responses or None
+
+    def seconds_until_world_update(self):
+        return self.local.seconds_until_world_update()
+
+    def _drain_zone_results(self, timeout=0.0):
+        """Разбор результатов, пришедших от процессов зон"""
+        responses = []
+        while True:
+            try:
+                result = self.outbox.get(timeout=timeout) if timeout else self.outbox.get_nowait()
+            except queue.Empty:
+                return responses
+
+            kind = result[0]
+            if kind == 'responses':
+                zone_id = result[1]
+                for response in result[2]:
+                    responses.extend(self._expand_zone_response(zone_id, response))
+            elif kind == 'persist':
+                self.db.update_characters(result[1])
+            elif kind == 'handoff':
+                responses.extend(self._finish_handoff(result[1], result[2]))
+            elif kind == 'stopped':
+                self.stopped_zones += 1
+
+    def _expand_zone_response(self, zone_id, response):
+        """Рассылка зоны уходит клиентам этой зоны; вход, выход и смена скина - всем в мире"""
+        if response.get('target') != 'broadcast':
+            return [response]
+
+        exclude_client_id = response.get('exclude_client_id')
+        everyone = (response['data'].get('type') in WORLD_BROADCAST_TYPES
+                    and not response.get('zone_only'))
+        return [{'target': 'client', 'client_id': client_id, 'data': response['data']}
+                for client_id, client_zone in self.client_zones.items()
+                if (everyone or client_zone == zone_id) and client_id != exclude_client_id]
+
+    def remove_player(self, client_id):
+        """Отключение игрока в шлюзе и в его зоне"""
+        if client_id in self.local.account_backlog:
+            # Отключение после незавершенной операции аккаунта - по порядку, после нее
+            return self.local.remove_player(client_id)
+
+        zone_id = self.client_zones.pop(client_id, None)
+        self.pending_handoffs.pop(client_id, None)
+        self._forget_character(client_id)
+        if zone_id is not None:
+            self._send(zone_id, {'op': 'remove', 'client_id': client_id})
+        return self.local.remove_player(client_id)
+
+    def _auto_save_characters(self):
+        """Автосохранение: шлюз сохраняет сразу, зоны - по команде (изменения придут в update_world)"""
+        self.local._auto_save_characters()
+        self._save_liveness()
+        for zone_id in range(len(self.workers)):
+            self._send(zone_id, {'op': 'flush'})
+
+    def shutdown(self):
+        """Остановка процессов зон и прием последних изменений; возвращает последние ответы"""
+        responses = self.local.shutdown()
+        if not self.workers:
+            return responses
+
+        for zone_id in range(self.worker_count):
+            self._send(zone_id, {'op': 'stop'})
+
+        deadline = time.time() + 5
+        while self.stopped_zones < self.worker_count and time.time() < deadline:
+            responses.extend(self._drain_zone_results(timeout=0.2))
+
+        for worker in self.workers:
+            worker.join(timeout=1)
+            if worker.is_alive() and self.backend == 'process':
+                worker.terminate()
+        self.workers = []
+        return responses
+
+    def get_player_count(self):
+        return len(self.client_zones)
+
+    def get_world_state(self):
+        state = self.local.get_world_state()
+        state['online_players'] = len(self.client_zones)
+        state['zones'] = {zone_id: sum(1 for z in self.client_zones.values() if z == zone_id)
+                          for zone_id in range(self.worker_count)}
+        return state